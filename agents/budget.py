@@ -0,0 +1,263 @@
+"""Бюджет одного запроса: токены, число вызовов LLM и время.
+
+RequestBudget активируется на время crew.kickoff() и через хуки вызовов LLM
+CrewAI считает расход. Когда любой из лимитов израсходован на soft_ratio,
+агентам добавляется указание сразу дать финальный ответ, а итерации их
+исполнителей ограничиваются - crew завершается штатно, с ответом по уже
+собранной информации, а не обрывается. После hard_ratio новые шаги
+блокируются, но каждый исполнитель (включая вложенных при делегировании)
+ещё может сделать FINAL_CALLS вызовов на финальный ответ: иначе ошибка
+вложенного агента обрывает весь crew и ответ теряется.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from crewai.hooks.llm_hooks import register_after_llm_call_hook, register_before_llm_call_hook
+
+from utils.file_utils import load_config
+from utils.memory import estimate_tokens
+
+DEFAULT_LIMITS = {
+    "max_input_tokens": 200_000,
+    "max_output_tokens": 20_000,
+    "max_llm_calls": 40,
+    "max_seconds": 300.0,
+}
+SOFT_RATIO = 0.8
+HARD_RATIO = 1.25
+# Вызовов после hard_ratio на исполнителя: ответ на указание завершиться и принудительный финальный
+FINAL_CALLS = 2
+
+FINISH_NOW = (
+    "Бюджет запроса почти исчерпан ({reason}). Не вызывай инструменты и не делегируй: "
+    "сразу дай Final Answer по уже собранной информации, отметив, что не успел проверить."
+)
+
+_current: contextvars.ContextVar[Optional["RequestBudget"]] = contextvars.ContextVar("request_budget", default=None)
+
+
+class RequestBudget:
+    """Лимиты и расход одного запроса (потокобезопасно)."""
+
+    def __init__(self, max_input_tokens: int = DEFAULT_LIMITS["max_input_tokens"],
+                 max_output_tokens: int = DEFAULT_LIMITS["max_output_tokens"],
+                 max_llm_calls: int = DEFAULT_LIMITS["max_llm_calls"],
+                 max_seconds: float = DEFAULT_LIMITS["max_seconds"],
+                 soft_ratio: float = SOFT_RATIO, hard_ratio: float = HARD_RATIO):
+        """
+        Args:
+            max_input_tokens: Максимум токенов промптов за запрос.
+            max_output_tokens: Максимум токенов ответов за запрос.
+            max_llm_calls: Максимум вызовов LLM за запрос.
+            max_seconds: Ограничение времени выполнения запроса.
+            soft_ratio: Доля лимита, после которой агентов просят завершаться.
+            hard_ratio: Доля лимита, после которой вызовы LLM блокируются.
+        """
+        self.limits = {
+            "input_tokens": max_input_tokens,
+            "output_tokens": max_output_tokens,
+            "llm_calls": max_llm_calls,
+            "seconds": max_seconds,
+        }
+        self.soft_ratio = soft_ratio
+        self.hard_ratio = hard_ratio
+        self.usage = {"input_tokens": 0, "output_tokens": 0, "llm_calls": 0, "seconds": 0.0}
+        self.finish_reason: Optional[str] = None
+        self.blocked_calls = 0
+        self._started: Optional[float] = None
+        self._llms: Dict[int, Any] = {}
+        self._estimated = {"input_tokens": 0, "output_tokens": 0}
+        self._wrapped_up: set = set()
+        self._final_calls: Dict[int, int] = {}
+        self._direct_final_calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, project_info: Optional[Dict] = None, config_path: str = "config.yaml") -> "RequestBudget":
+        """Бюджет из секции `budget` config.yaml, переопределённой секцией `budget` проекта."""
+        try:
+            config = load_config(config_path).get("budget") or {}
+        except FileNotFoundError:
+            config = {}
+        config = {**config, **((project_info or {}).get("budget") or {})}
+        return cls(**{k: v for k, v in config.items() if k in DEFAULT_LIMITS or k in ("soft_ratio", "hard_ratio")})
+
+    @contextmanager
+    def activate(self):
+        """Делает бюджет текущим для вызовов LLM внутри блока (crew.kickoff())."""
+        self._started = time.monotonic()
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+            self._refresh()
+
+    def _refresh(self):
+        with self._lock:
+            if self._started is not None:
+                self.usage["seconds"] = round(time.monotonic() - self._started, 3)
+            prompt, completion = self._estimated["input_tokens"], self._estimated["output_tokens"]
+            for llm in self._llms.values():
+                summary = llm.get_token_usage_summary()
+                prompt += summary.prompt_tokens
+                completion += summary.completion_tokens
+            self.usage["input_tokens"] = prompt
+            self.usage["output_tokens"] = completion
+
+    def ratio(self) -> Dict[str, float]:
+        """Доля израсходованного по каждому лимиту."""
+        self._refresh()
+        return {key: self.usage[key] / limit for key, limit in self.limits.items() if limit}
+
+    def exceeded(self, ratio: float) -> Optional[str]:
+        """Лимит, израсходованный не меньше чем на ratio, или None."""
+        spent = self.ratio()
+        key = max(spent, key=spent.get, default=None)
+        return key if key is not None and spent[key] >= ratio else None
+
+    def near_limit(self) -> bool:
+        return self.exceeded(self.soft_ratio) is not None
+
+    def before_call(self, context) -> Optional[bool]:
+        hard = self.exceeded(self.hard_ratio)
+        if hard and not self._allow_final(context):
+            with self._lock:
+                self.blocked_calls += 1
+                self.finish_reason = self.finish_reason or hard
+            return False
+        with self._lock:
+            self.usage["llm_calls"] += 1
+            llm = context.llm
+            if hasattr(llm, "get_token_usage_summary"):
+                self._llms[id(llm)] = llm
+            else:
+                self._estimated["input_tokens"] += sum(estimate_tokens(str(m.get("content", ""))) for m in context.messages)
+        soft = self.exceeded(self.soft_ratio)
+        if soft:
+            self._wrap_up(context, soft)
+        return None
+
+    def _allow_final(self, context) -> bool:
+        """Разрешает исполнителю завершиться финальным ответом после hard_ratio."""
+        executor = context.executor
+        with self._lock:
+            if executor is None:
+                # Принудительный финальный ответ CrewAI (по max_iter) - прямой вызов LLM без исполнителя:
+                # по одному на каждого исполнителя, которого попросили завершиться
+                if self._direct_final_calls >= len(self._wrapped_up):
+                    return False
+                self._direct_final_calls += 1
+                return True
+            calls = self._final_calls.get(id(executor), 0)
+            if calls >= FINAL_CALLS:
+                return False
+            self._final_calls[id(executor)] = calls + 1
+        return True
+
+    def after_call(self, context):
+        if not hasattr(context.llm, "get_token_usage_summary") and context.response:
+            with self._lock:
+                self._estimated["output_tokens"] += estimate_tokens(str(context.response))
+
+    def _wrap_up(self, context, reason: str):
+        executor = context.executor
+        with self._lock:
+            self.finish_reason = self.finish_reason or reason
+            if id(executor) in self._wrapped_up:
+                return
+            self._wrapped_up.add(id(executor))
+        context.messages.append({"role": "user", "content": FINISH_NOW.format(reason=reason)})
+        if executor is not None and hasattr(executor, "max_iter"):
+            # Следующая итерация исполнителя - принудительный финальный ответ CrewAI
+            executor.max_iter = min(executor.max_iter, context.iterations + 1)
+
+    def report(self) -> Dict[str, Any]:
+        """Расход и лимиты запроса для метаданных ответа."""
+        self._refresh()
+        return {
+            "usage": dict(self.usage),
+            "limits": dict(self.limits),
+            "finished_early": self.finish_reason is not None,
+            "finish_reason": self.finish_reason,
+            "blocked_calls": self.blocked_calls,
+        }
+
+
+def current_budget() -> Optional[RequestBudget]:
+    """Бюджет запроса, выполняющегося в текущем контексте."""
+    return _current.get()
+
+
+def run_with_budget(fn: Callable[[], Any], project_info: Optional[Dict] = None,
+                    config_path: str = "config.yaml") -> Tuple[Any, Dict[str, Any]]:
+    """Выполняет fn (crew.kickoff, llm.call) под собственным бюджетом.
+
+    Контекстные переменные не переходят в потоки ThreadPoolExecutor, поэтому
+    шаги конвейеров создают и активируют бюджет в потоке, где идут вызовы LLM.
+
+    Args:
+        fn: Работа с вызовами LLM.
+        project_info: Описание проекта (секция budget переопределяет общую).
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        (результат fn, отчёт бюджета).
+    """
+    budget = RequestBudget.from_config(project_info, config_path)
+    with budget.activate():
+        result = fn()
+    return result, budget.report()
+
+
+def combine_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Сводный отчёт бюджетов шагов конвейера (модулей, файлов, проектов)."""
+    usage = {"input_tokens": 0, "output_tokens": 0, "llm_calls": 0, "seconds": 0.0}
+    for report in reports:
+        for key in usage:
+            usage[key] += report["usage"].get(key, 0)
+    usage["seconds"] = round(usage["seconds"], 3)
+    early = [report for report in reports if report.get("finished_early")]
+    return {
+        "runs": len(reports),
+        "usage": usage,
+        "finished_early": bool(early),
+        "finished_early_runs": len(early),
+        "finish_reason": early[0]["finish_reason"] if early else None,
+        "blocked_calls": sum(report.get("blocked_calls", 0) for report in reports),
+    }
+
+
+def format_budget(report: Dict[str, Any]) -> str:
+    """Строка о досрочном завершении для текстового ответа (пустая, если бюджета хватило)."""
+    if not report.get("finished_early"):
+        return ""
+    usage = report["usage"]
+    if "runs" in report:
+        return (f"Досрочно завершено шагов: {report['finished_early_runs']} из {report['runs']} "
+                f"(исчерпан бюджет: {report['finish_reason']}); вызовов LLM: {usage['llm_calls']}, "
+                f"токенов: {usage['input_tokens']}/{usage['output_tokens']}")
+    return (f"Ответ сформирован досрочно: исчерпан бюджет ({report['finish_reason']}); "
+            f"вызовов LLM: {usage['llm_calls']}, токенов: {usage['input_tokens']}/{usage['output_tokens']}, "
+            f"время: {usage['seconds']:.0f} с")
+
+
+def _before_llm_call(context) -> Optional[bool]:
+    budget = _current.get()
+    return budget.before_call(context) if budget is not None else None
+
+
+def _after_llm_call(context) -> None:
+    budget = _current.get()
+    if budget is not None:
+        budget.after_call(context)
+    return None
+
+
+# Хуки глобальные для CrewAI; без активного бюджета они ничего не делают
+register_before_llm_call_hook(_before_llm_call)
+register_after_llm_call_hook(_after_llm_call)
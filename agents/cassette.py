@@ -0,0 +1,280 @@
+"""Запись и воспроизведение вызовов LLM (кассеты) для регрессионных бенчмарков.
+
+В режиме записи каждый вызов LLM, созданной через get_llm, сохраняется в
+кассету: агент, сообщения, ответ, задержка. Провайдер "replay" (ReplayLLM)
+отдаёт ответы из активной кассеты без обращения к модели: сначала ищется
+вызов с теми же сообщениями, а если оркестрация изменила промпт - следующий
+неиспользованный ответ того же агента. В обоих режимах кассета считает
+вызовы и токены промптов по агентам, что позволяет сравнивать изменения
+оркестрации (промпты, состав агентов, размер контекста) детерминированно и
+бесплатно.
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, List, Optional, Tuple
+
+from crewai.llms.base_llm import BaseLLM
+from crewai.utilities.agent_utils import extract_tool_call_info
+
+from utils.memory import estimate_tokens
+
+# Версия формата кассеты; кассеты другой версии нужно перезаписать
+CASSETTE_VERSION = 1
+MISSING_RESPONSE = (
+    "Thought: В кассете нет записи для этого вызова.\n"
+    "Final Answer: (ответ отсутствует в кассете)"
+)
+
+_WS_RE = re.compile(r"\s+")
+_active: contextvars.ContextVar[Optional[Tuple["Cassette", str]]] = contextvars.ContextVar("llm_cassette", default=None)
+
+
+def _message_text(messages: Any) -> List[Tuple[str, str]]:
+    if isinstance(messages, str):
+        return [("user", messages)]
+    return [(str(m.get("role", "")), str(m.get("content") or "")) for m in messages]
+
+
+def messages_key(messages: Any) -> str:
+    """Ключ вызова: хэш сообщений без учёта различий в пробелах."""
+    normalized = [(role, _WS_RE.sub(" ", content).strip()) for role, content in _message_text(messages)]
+    return hashlib.sha256(json.dumps(normalized, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _agent_name(kwargs: Dict) -> str:
+    agent = kwargs.get("from_agent")
+    return getattr(agent, "role", None) or "direct"
+
+
+def _serialize_response(response: Any) -> Any:
+    """Ответ для JSON: текст или список вызовов инструментов в формате OpenAI."""
+    if isinstance(response, str):
+        return response
+    if not isinstance(response, list):
+        return str(response)
+    calls = []
+    for tool_call in response:
+        info = extract_tool_call_info(tool_call)
+        if info is None:
+            return str(response)
+        call_id, name, arguments = info
+        if not isinstance(arguments, str):
+            arguments = json.dumps(arguments, ensure_ascii=False)
+        calls.append({"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}})
+    return calls
+
+
+class CassetteError(Exception):
+    """Кассета отсутствует, повреждена или записана в другой версии формата."""
+
+
+class Cassette:
+    """Записанные вызовы LLM одного сценария и метрики текущего прогона."""
+
+    def __init__(self, path: str, scenario: str = "", strict: bool = False):
+        """
+        Args:
+            path: Путь к JSON файлу кассеты.
+            scenario: Имя сценария (для записи).
+            strict: При воспроизведении - ошибка вместо заглушки, если ответа нет.
+        """
+        self.path = path
+        self.scenario = scenario
+        self.strict = strict
+        self.meta: Dict[str, Any] = {}
+        self.interactions: List[Dict[str, Any]] = []
+        self._used: set = set()
+        self._lock = threading.Lock()
+        self.reset_metrics()
+
+    @classmethod
+    def load(cls, path: str, strict: bool = False) -> "Cassette":
+        """Загружает кассету для воспроизведения.
+
+        Raises:
+            CassetteError: Если файла нет, он повреждён или версия формата другая.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise CassetteError(f"Кассета не найдена: {path}")
+        except (json.JSONDecodeError, OSError) as e:
+            raise CassetteError(f"Кассета повреждена: {path}: {e}")
+        if data.get("version") != CASSETTE_VERSION:
+            raise CassetteError(
+                f"Кассета {path} записана в версии {data.get('version')}, нужна {CASSETTE_VERSION} - перезапишите её"
+            )
+        cassette = cls(path, data.get("scenario", ""), strict)
+        cassette.meta = data.get("meta") or {}
+        cassette.interactions = data.get("interactions") or []
+        return cassette
+
+    def reset_metrics(self):
+        self.metrics: Dict[str, Any] = {
+            "llm_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "llm_seconds": 0.0,
+            "by_agent": {},
+            "diverged": 0,
+            "missing": 0,
+        }
+
+    def _count(self, agent: str, messages: Any, response: Any, seconds: float):
+        prompt = sum(estimate_tokens(content) for _, content in _message_text(messages))
+        completion = estimate_tokens(response) if isinstance(response, str) else 0
+        with self._lock:
+            self.metrics["llm_calls"] += 1
+            self.metrics["prompt_tokens"] += prompt
+            self.metrics["completion_tokens"] += completion
+            self.metrics["llm_seconds"] += seconds
+            per_agent = self.metrics["by_agent"].setdefault(agent, {"llm_calls": 0, "prompt_tokens": 0})
+            per_agent["llm_calls"] += 1
+            per_agent["prompt_tokens"] += prompt
+        return prompt, completion
+
+    @contextmanager
+    def recording(self, **meta):
+        """Записывает вызовы LLM внутри блока; кассета сохраняется при выходе."""
+        self.interactions = []
+        self.meta = {**meta, "recorded_at": time.time()}
+        self.reset_metrics()
+        token = _active.set((self, "record"))
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+            self.save()
+
+    @contextmanager
+    def replaying(self):
+        """Отдаёт ответы кассеты вызовам ReplayLLM внутри блока."""
+        self._used = set()
+        self.reset_metrics()
+        token = _active.set((self, "replay"))
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def record(self, agent: str, messages: Any, response: Any, seconds: float):
+        response = _serialize_response(response)
+        prompt, completion = self._count(agent, messages, response, seconds)
+        with self._lock:
+            self.interactions.append({
+                "agent": agent,
+                "key": messages_key(messages),
+                "messages": [{"role": role, "content": content} for role, content in _message_text(messages)],
+                "response": response,
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "latency_s": round(seconds, 3),
+            })
+
+    def replay(self, agent: str, messages: Any) -> Any:
+        """Ответ для вызова: совпадение по сообщениям, иначе следующий ответ агента."""
+        key = messages_key(messages)
+        with self._lock:
+            index = next((i for i, item in enumerate(self.interactions)
+                          if i not in self._used and item["key"] == key), None)
+            if index is None:
+                index = next((i for i, item in enumerate(self.interactions)
+                              if i not in self._used and item["agent"] == agent), None)
+                self.metrics["diverged" if index is not None else "missing"] += 1
+            if index is not None:
+                self._used.add(index)
+        if index is None:
+            if self.strict:
+                raise CassetteError(f"В кассете {self.path} нет ответа для агента {agent}")
+            response = MISSING_RESPONSE
+        else:
+            response = self.interactions[index]["response"]
+        self._count(agent, messages, response, 0.0)
+        return response
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {
+            "version": CASSETTE_VERSION,
+            "scenario": self.scenario,
+            "meta": self.meta,
+            "metrics": self.metrics,
+            "interactions": self.interactions,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def record_llm(llm):
+    """Записывает вызовы llm.call в кассету, если в контексте активна запись.
+
+    Args:
+        llm: Экземпляр LLM CrewAI.
+
+    Returns:
+        Тот же экземпляр с обёрнутым call.
+    """
+    call = llm.call
+
+    @wraps(call)
+    def recorded_call(messages, *args, **kwargs):
+        active = _active.get()
+        if active is None or active[1] != "record":
+            return call(messages, *args, **kwargs)
+        # Сообщения копируются до вызова: исполнитель агента дополняет список дальше
+        snapshot = [dict(m) for m in messages] if isinstance(messages, list) else messages
+        # Воспроизведение должно идти тем же путём исполнителя: нативные инструменты или ReAct
+        active[0].meta.setdefault("function_calling", bool(llm.supports_function_calling()))
+        started = time.perf_counter()
+        response = call(messages, *args, **kwargs)
+        active[0].record(_agent_name(kwargs), snapshot, response, time.perf_counter() - started)
+        return response
+
+    llm.call = recorded_call
+    return llm
+
+
+class ReplayLLM(BaseLLM):
+    """Провайдер "replay": ответы из активной кассеты вместо модели."""
+
+    def __init__(self, temperature: Optional[float] = None, **kwargs):
+        super().__init__(model="replay", temperature=temperature, provider="replay", **kwargs)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None):
+        active = _active.get()
+        if active is None or active[1] != "replay":
+            raise CassetteError("Провайдер replay работает только внутри Cassette.replaying()")
+        if not self._invoke_before_llm_call_hooks(messages, from_agent):
+            raise ValueError("LLM call blocked by hook")
+        response = active[0].replay(_agent_name({"from_agent": from_agent}), messages)
+        self._track_token_usage_internal({
+            "prompt_tokens": sum(estimate_tokens(content) for _, content in _message_text(messages)),
+            "completion_tokens": estimate_tokens(response) if isinstance(response, str) else 0,
+        })
+        if isinstance(response, list):
+            return response
+        return self._invoke_after_llm_call_hooks(messages, response, from_agent)
+
+    def supports_function_calling(self) -> bool:
+        # Как у записанной модели, иначе исполнитель пойдёт другим путём
+        active = _active.get()
+        return bool(active and active[0].meta.get("function_calling"))
+
+    def supports_stop_words(self) -> bool:
+        return False
+
+    def get_context_window_size(self) -> int:
+        return 128_000
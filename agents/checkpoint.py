@@ -0,0 +1,187 @@
+"""Контрольные точки выполнения crew для продолжения после сбоя.
+
+RunCheckpoint хранит результаты завершённых задач и делегирований одного
+запроса в `.cache/crew/runs/<run_id>.json`. Пока контрольная точка активна
+(как бюджет - на время crew.kickoff()), CheckpointedTask и контролируемые
+инструменты делегирования сначала ищут готовый результат и сохраняют новый
+сразу после получения. Повтор того же запроса после таймаута провайдера
+или перезапуска Streamlit продолжается с последней контрольной точки, а
+после успешного ответа контрольная точка удаляется.
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from crewai import Task
+from crewai.tasks.task_output import TaskOutput
+from crewai.utilities.i18n import get_i18n
+
+from utils.cache import JsonStore, cache_dir
+
+# Контрольные точки старше этого не используются: проект и контекст могли измениться
+CHECKPOINT_TTL_SECONDS = 24 * 3600
+
+_current: contextvars.ContextVar[Optional["RunCheckpoint"]] = contextvars.ContextVar("run_checkpoint", default=None)
+
+
+def _digest(*parts: Optional[str]) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()[:24]
+
+
+class RunCheckpoint:
+    """Результаты задач и делегирований одного запроса, сохраняемые по мере выполнения."""
+
+    def __init__(self, run_id: str, ttl: float = CHECKPOINT_TTL_SECONDS):
+        """
+        Args:
+            run_id: Идентификатор запуска (одинаковый у повторов одного запроса).
+            ttl: Срок годности контрольной точки в секундах.
+        """
+        self.run_id = run_id
+        self.resumed = {"tasks": 0, "delegations": 0}
+        self._lock = threading.Lock()
+        path = os.path.join(cache_dir("runs"), f"{run_id}.json")
+        self.store = JsonStore(path)
+        created = self.store.get("created_at")
+        if created is not None and time.time() - created > ttl:
+            self.clear()
+            self.store = JsonStore(path)
+            created = None
+        if created is None:
+            self.store.set("created_at", time.time())
+        self._attempt = self.store.get("attempts", 0) + 1
+
+    @property
+    def has_progress(self) -> bool:
+        """Есть ли сохранённые результаты от прошлых попыток."""
+        return bool(self.store.get("tasks") or self.store.get("delegations"))
+
+    @contextmanager
+    def activate(self):
+        """Делает контрольную точку текущей для задач и делегирований внутри блока."""
+        self.store.set("attempts", self._attempt)
+        self.store.save()
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def _put(self, section: str, key: str, value: Dict[str, Any]):
+        # Параллельные делегирования не должны затирать записи друг друга
+        with self._lock:
+            items = dict(self.store.get(section) or {})
+            items[key] = {**value, "saved_at": time.time()}
+            self.store.set(section, items)
+            self.store.save()
+
+    def task_output(self, task: Task) -> Optional[TaskOutput]:
+        """Сохранённый результат задачи или None."""
+        stored = (self.store.get("tasks") or {}).get(_task_key(task))
+        if stored is None:
+            return None
+        pydantic = None
+        if stored.get("pydantic") is not None and task.output_pydantic is not None:
+            pydantic = task.output_pydantic.model_validate(stored["pydantic"])
+        self.resumed["tasks"] += 1
+        return TaskOutput(
+            description=stored["description"],
+            expected_output=stored.get("expected_output"),
+            raw=stored["raw"],
+            pydantic=pydantic,
+            json_dict=stored.get("json_dict"),
+            agent=stored["agent"],
+            output_format=stored["output_format"],
+        )
+
+    def save_task(self, task: Task, output: TaskOutput):
+        self._put("tasks", _task_key(task), {
+            "description": output.description,
+            "expected_output": output.expected_output,
+            "raw": output.raw,
+            "pydantic": output.pydantic.model_dump(mode="json") if output.pydantic is not None else None,
+            "json_dict": output.json_dict,
+            "agent": output.agent,
+            "output_format": output.output_format.value,
+        })
+
+    def delegation_result(self, owner: str, target: str, kind: str, task: str, context: Optional[str]) -> Optional[str]:
+        """Сохранённый ответ коллеги на то же поручение или None."""
+        stored = (self.store.get("delegations") or {}).get(_digest(owner, target, kind, task, context))
+        if stored is None:
+            return None
+        self.resumed["delegations"] += 1
+        return stored["result"]
+
+    def save_delegation(self, owner: str, target: str, kind: str, task: str, context: Optional[str], result: str):
+        # Ошибку выполнения коллеги CrewAI возвращает текстом - такие ответы не сохраняются
+        error_prefix = get_i18n().errors("agent_tool_execution_error").split("{")[0]
+        if error_prefix and result.startswith(error_prefix):
+            return
+        self._put("delegations", _digest(owner, target, kind, task, context),
+                  {"from": owner, "to": target, "result": result})
+
+    def clear(self):
+        """Удаляет контрольную точку после успешного ответа."""
+        try:
+            os.remove(self.store.path)
+        except FileNotFoundError:
+            pass
+
+    def report(self) -> Dict[str, Any]:
+        """Сведения о продолжении для метаданных ответа."""
+        return {
+            "run_id": self.run_id,
+            "attempt": self._attempt,
+            "resumed_tasks": self.resumed["tasks"],
+            "resumed_delegations": self.resumed["delegations"],
+        }
+
+
+def _task_key(task: Task) -> str:
+    role = task.agent.role if task.agent is not None else ""
+    # Описание задачи включает историю чата, а в истории повтора уже есть сообщение об ошибке
+    # прошлой попытки: задача с именем ищется по имени (контрольная точка и так своя у запуска)
+    if task.name:
+        return _digest("name", task.name, role)
+    return _digest(task.key, role)
+
+
+def current_checkpoint() -> Optional[RunCheckpoint]:
+    """Контрольная точка запроса, выполняющегося в текущем контексте."""
+    return _current.get()
+
+
+def format_resume(report: Dict[str, Any]) -> str:
+    """Строка о продолжении для текстового ответа (пустая, если ничего не переиспользовано)."""
+    if not report.get("resumed_tasks") and not report.get("resumed_delegations"):
+        return ""
+    return (f"Продолжено с контрольной точки (попытка {report['attempt']}): "
+            f"задач из контрольной точки: {report['resumed_tasks']}, "
+            f"делегирований: {report['resumed_delegations']}")
+
+
+class CheckpointedTask(Task):
+    """Task, результат которой сохраняется в текущую контрольную точку и берётся из неё при повторе.
+
+    Задачам, в описание которых подставляется история чата, нужно имя (name):
+    без него ключом служит хэш описания, и повтор с другой историей не находит результат.
+    """
+
+    def execute_sync(self, agent=None, context: Optional[str] = None, tools=None) -> TaskOutput:
+        checkpoint = _current.get()
+        if checkpoint is None:
+            return super().execute_sync(agent, context, tools)
+        output = checkpoint.task_output(self)
+        if output is not None:
+            self.output = output
+            return output
+        output = super().execute_sync(agent, context, tools)
+        checkpoint.save_task(self, output)
+        return output
@@ -0,0 +1,233 @@
+"""Контроль делегирования внутри DWH команды.
+
+Цели агентов ссылаются друг на друга по кругу (Python Developer -> SQL
+Developer -> Architect -> Python Developer), и каждый переход - полноценный
+диалог с LLM. DelegationController подменяет стандартные инструменты
+делегирования CrewAI на контролируемые: они ведут цепочку делегирования
+запроса, блокируют циклы, ограничивают число переходов и глубину, а граф
+делегирования возвращается в метаданных ответа.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from crewai import Agent
+from crewai.tools.agent_tools.ask_question_tool import AskQuestionTool
+from crewai.tools.agent_tools.delegate_work_tool import DelegateWorkTool
+from crewai.utilities.i18n import get_i18n
+
+from agents.budget import current_budget
+from agents.checkpoint import current_checkpoint
+
+DEFAULT_MAX_HOPS = 4
+# 1 - делегирует только руководитель (как стандартный CrewAI), больше - исполнители тоже
+DEFAULT_MAX_DEPTH = 1
+DEFAULT_MAX_ITER = {
+    "manager": 15,
+    "researcher": 10,
+    "architect": 8,
+    "python_dev": 8,
+    "sql_dev": 8,
+    "tester": 8,
+}
+
+# Текущая цепочка делегирования (роли от корня) в контексте выполнения запроса
+_chain: contextvars.ContextVar[Tuple[str, ...]] = contextvars.ContextVar("delegation_chain", default=())
+
+
+class DelegationController:
+    """Цепочка, лимиты и граф делегирования одного запроса."""
+
+    def __init__(self, max_hops: int = DEFAULT_MAX_HOPS, max_depth: int = DEFAULT_MAX_DEPTH,
+                 max_iter: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            max_hops: Максимум выполненных делегирований за запрос.
+            max_depth: Максимальная длина цепочки делегирования от руководителя.
+            max_iter: Ключ агента -> max_iter (поверх DEFAULT_MAX_ITER).
+        """
+        self.max_hops = max_hops
+        self.max_depth = max_depth
+        self.max_iter = {**DEFAULT_MAX_ITER, **(max_iter or {})}
+        self.edges: List[Dict[str, Any]] = []
+        self._hops = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict] = None) -> "DelegationController":
+        """Создаёт контроллер из секции `delegation` проекта в config.yaml."""
+        config = config or {}
+        return cls(
+            max_hops=config.get("max_hops", DEFAULT_MAX_HOPS),
+            max_depth=config.get("max_depth", DEFAULT_MAX_DEPTH),
+            max_iter=config.get("max_iter"),
+        )
+
+    def attach(self, agents: Dict[str, Agent], root: str = "manager"):
+        """Применяет max_iter и заменяет делегирование агентов контролируемым.
+
+        Args:
+            agents: Ключ агента -> Agent (как в create_dwh_agents).
+            root: Ключ агента, выполняющего задачу crew.
+        """
+        for key, agent in agents.items():
+            if key in self.max_iter:
+                agent.max_iter = self.max_iter[key]
+            if not agent.allow_delegation:
+                continue
+            # Стандартные инструменты CrewAI не добавятся: crew смотрит на allow_delegation
+            agent.allow_delegation = False
+            if key != root and self.max_depth < 2:
+                continue
+            coworkers = [a for k, a in agents.items() if k != key]
+            if coworkers:
+                agent.tools = list(agent.tools or []) + self.tools(agent.role, coworkers)
+
+    def tools(self, owner: str, coworkers: List[Agent]) -> List:
+        """Контролируемые инструменты делегирования для агента owner."""
+        # Описания как у стандартных инструментов CrewAI, чтобы промпт агента не менялся
+        i18n = get_i18n()
+        names = ", ".join(a.role for a in coworkers)
+        return [
+            ControlledDelegateWorkTool(agents=coworkers, controller=self, owner=owner, i18n=i18n,
+                                       description=i18n.tools("delegate_work").format(coworkers=names)),
+            ControlledAskQuestionTool(agents=coworkers, controller=self, owner=owner, i18n=i18n,
+                                      description=i18n.tools("ask_question").format(coworkers=names)),
+        ]
+
+    def check(self, owner: str, target: str) -> Optional[str]:
+        """Возвращает причину блокировки делегирования или None, если оно разрешено."""
+        chain = _chain.get() or (owner,)
+        if target in chain:
+            return "cycle"
+        if len(chain) > self.max_depth:
+            return "depth"
+        with self._lock:
+            if self._hops >= self.max_hops:
+                return "hops"
+            # Переход резервируется сразу, чтобы параллельные делегирования не превысили лимит
+            self._hops += 1
+        return None
+
+    @contextmanager
+    def hop(self, owner: str, target: str, kind: str):
+        """Выполняет переход owner -> target, записывая его в граф."""
+        chain = (_chain.get() or (owner,)) + (target,)
+        token = _chain.set(chain)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            _chain.reset(token)
+            self._record(owner, target, kind, status, len(chain) - 1, time.perf_counter() - started)
+
+    def block(self, owner: str, target: str, kind: str, reason: str) -> str:
+        """Записывает заблокированный переход и возвращает сообщение для агента."""
+        self._record(owner, target, kind, f"blocked_{reason}", len(_chain.get() or (owner,)), 0.0)
+        messages = {
+            "cycle": f"Делегирование {target} заблокировано: он уже участвует в цепочке "
+                     f"({' -> '.join(_chain.get() or (owner,))}).",
+            "depth": f"Делегирование заблокировано: превышена глубина цепочки ({self.max_depth}).",
+            "hops": f"Делегирование заблокировано: исчерпан лимит переходов ({self.max_hops}) на запрос.",
+            "budget": "Делегирование заблокировано: бюджет запроса почти исчерпан.",
+        }
+        return f"{messages[reason]} Заверши задачу сам по уже собранной информации."
+
+    def resume(self, owner: str, target: str, kind: str):
+        """Записывает переход, ответ которого взят из контрольной точки (лимит не расходуется)."""
+        self._record(owner, target, kind, "resumed", len(_chain.get() or (owner,)), 0.0)
+
+    def _record(self, owner: str, target: str, kind: str, status: str, depth: int, duration: float):
+        with self._lock:
+            self.edges.append({
+                "from": owner,
+                "to": target,
+                "kind": kind,
+                "status": status,
+                "depth": depth,
+                "duration_s": round(duration, 3),
+            })
+
+    def report(self) -> Dict[str, Any]:
+        """Граф делегирования запроса для метаданных ответа."""
+        with self._lock:
+            edges = list(self.edges)
+        graph: Dict[str, Dict[str, int]] = {}
+        for edge in edges:
+            if not edge["status"].startswith("blocked"):
+                targets = graph.setdefault(edge["from"], {})
+                targets[edge["to"]] = targets.get(edge["to"], 0) + 1
+        return {
+            "hops": sum(e["status"] in ("ok", "error") for e in edges),
+            "blocked": sum(e["status"].startswith("blocked") for e in edges),
+            "resumed": sum(e["status"] == "resumed" for e in edges),
+            "limits": {"max_hops": self.max_hops, "max_depth": self.max_depth},
+            "graph": graph,
+            "edges": edges,
+        }
+
+
+def format_delegation(report: Dict[str, Any]) -> str:
+    """Краткая строка о делегировании для текстового ответа (пустая, если его не было)."""
+    if not report.get("edges"):
+        return ""
+    pairs = [f"{src} → {dst}" + (f" ×{n}" if n > 1 else "")
+             for src, targets in report["graph"].items() for dst, n in targets.items()]
+    line = f"Делегирование: {', '.join(pairs) or 'нет'} (переходов: {report['hops']}"
+    if report["blocked"]:
+        line += f", заблокировано: {report['blocked']}"
+    if report.get("resumed"):
+        line += f", из контрольной точки: {report['resumed']}"
+    return line + ")"
+
+
+def _execute_controlled(tool, agent_name: Optional[str], task: str, context: Optional[str], parent_execute) -> str:
+    target = next(
+        (a.role for a in tool.agents if tool.sanitize_agent_name(a.role) == tool.sanitize_agent_name(agent_name or "")),
+        None,
+    )
+    if target is None:
+        # Неизвестный коллега: стандартное сообщение CrewAI со списком доступных
+        return parent_execute(agent_name, task, context)
+    checkpoint = current_checkpoint()
+    if checkpoint is not None:
+        # Повтор запроса: ответ коллеги на то же поручение уже получен прошлой попыткой
+        stored = checkpoint.delegation_result(tool.owner, target, tool.name, task, context)
+        if stored is not None:
+            tool.controller.resume(tool.owner, target, tool.name)
+            return stored
+    budget = current_budget()
+    # При почти исчерпанном бюджете запроса новые переходы не начинаются
+    reason = "budget" if budget is not None and budget.near_limit() else tool.controller.check(tool.owner, target)
+    if reason:
+        return tool.controller.block(tool.owner, target, tool.name, reason)
+    with tool.controller.hop(tool.owner, target, tool.name):
+        result = parent_execute(agent_name, task, context)
+    if checkpoint is not None:
+        checkpoint.save_delegation(tool.owner, target, tool.name, task, context, result)
+    return result
+
+
+class ControlledDelegateWorkTool(DelegateWorkTool):
+    """Delegate work to coworker с проверками DelegationController."""
+    controller: Any
+    owner: str
+
+    def _execute(self, agent_name: Optional[str], task: str, context: Optional[str] = None) -> str:
+        return _execute_controlled(self, agent_name, task, context, super()._execute)
+
+
+class ControlledAskQuestionTool(AskQuestionTool):
+    """Ask question to coworker с проверками DelegationController."""
+    controller: Any
+    owner: str
+
+    def _execute(self, agent_name: Optional[str], task: str, context: Optional[str] = None) -> str:
+        return _execute_controlled(self, agent_name, task, context, super()._execute)
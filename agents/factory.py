@@ -65,7 +65,7 @@ def create_tester(llm, project_path: Optional[str] = None, tools: Optional[List]
     return Agent(
         role="QA Tester",
         goal="Обеспечивать качество кода и данных через тестирование и проверку на русском языке. Используй доступные инструменты для чтения файлов и директорий проекта. Делегируй задачи Python Developer если нужно написать тесты.",
-        backstory="Ты QA инженер специализирующийся на тестировании DWH и data pipelines. Знаешь pytest, dbt tests, data quality checks. Умеешь находить аномалии в данных и проблемы производительности. Всегда отвечай на русском языке.",
+        backstory="Ты QA инженер специализирующийся на тестировании DWH и data pipelines. Знаешь pytest, dbt tests, data quality checks. Тесты проекта запускаешь инструментом \"Run project tests\" и опираешься на их реальные результаты, а не на предположения. Умеешь находить аномалии в данных и проблемы производительности. Всегда отвечай на русском языке.",
         verbose=verbose,
         llm=llm,
         allow_delegation=True,
@@ -8,9 +8,23 @@ os.environ["CREWAI_TELEMETRY_OPT_OUT"] = "true"
 os.environ["OTEL_SDK_DISABLED"] = "true"
 os.environ["LITELLM_LOG"] = "ERROR"
 
+import hashlib
+import re
+import threading
+import time
+import uuid
 import streamlit as st
-from crew import create_crew, create_dwh_crew
 from utils.file_utils import get_project_list, get_project_info, is_path_valid
+from utils.project_index import get_project_index
+from utils.project_watcher import start_project_watcher
+from pipelines.code_review import REVIEW_PROMPT, run_code_review
+from pipelines.docs import DOCS_PROMPT, generate_docs
+from pipelines.cross_project import list_project_tags, run_cross_project
+from utils.sql_lint import SQL_LINT_PROMPT, format_lint_report, lint_project
+from utils.llm_limiter import limiter_stats
+from utils.memory import ConversationMemory
+from utils.session_store import SessionBuffer, answer_key, get_session_store
+from utils.singleflight import get_single_flight
 
 
 # === PAGE CONFIG ===
@@ -187,12 +201,51 @@ hr {
 
 
 # === SESSION STATE ===
+HISTORY_PAGE_SIZE = 20      # Сколько последних сообщений показывать и догружать за раз
+COLLAPSE_CODE_LINES = 40    # Длинные блоки кода в старых сообщениях сворачиваются
+PROGRESS_POLL_SECONDS = 0.5  # Как часто обновляется прогресс выполняющегося запроса
+PROGRESS_LINES = 5          # Сколько последних шагов запроса показывать
+
+
+def get_session_id() -> str:
+    """Id сессии из параметра ?sid= в URL.
+
+    Состояние хранится во внешнем хранилище, поэтому по ссылке с sid сессию
+    восстанавливает любая реплика приложения.
+    """
+    sid = st.query_params.get("sid")
+    if not sid:
+        sid = uuid.uuid4().hex
+        st.query_params["sid"] = sid
+    return sid
+
+
+def load_session():
+    """Лениво загружает сообщения сессии из хранилища (один раз на подключение)."""
+    store = get_session_store()
+    session_id = get_session_id()
+    messages = store.load_messages(session_id)
+    memory = ConversationMemory()
+    for msg in messages:
+        memory.add(msg["role"], msg["content"])
+    st.session_state.session_id = session_id
+    st.session_state.messages = messages
+    st.session_state.memory = memory
+    st.session_state.session_buffer = SessionBuffer(store, session_id)
+    # Запросы, оборванные перезапуском или выполняющиеся на другой реплике
+    st.session_state.running_jobs = [
+        job for job in store.get_jobs(session_id).values() if job.get("status") == "running"
+    ]
+
+
 def init_session_state():
+    if "session_id" not in st.session_state:
+        load_session()
     defaults = {
-        "messages": [],
         "team_mode": "research",
         "connected": False,
         "selected_project": None,
+        "history_window": HISTORY_PAGE_SIZE,
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -202,7 +255,66 @@ def init_session_state():
 init_session_state()
 
 
+# === LAZY CREW STACK ===
+# crew тянет crewai, crewai_tools, litellm и dotenv - это секунды холодного старта.
+# Импортируем его только при первом запросе (или в фоне, пока открыт пустой чат).
+WARMUP_ENABLED = os.getenv("APP_WARMUP", "1") not in ("0", "false", "False")
+# Наблюдатель держит индексы проектов актуальными в фоне (PROJECT_WATCH=0 - отключить)
+WATCH_ENABLED = os.getenv("PROJECT_WATCH", "1") not in ("0", "false", "False")
+
+
+def crew_api():
+    """Возвращает модуль crew, импортируя его при первом обращении."""
+    import crew
+    return crew
+
+
+def _warmup(provider: str):
+    crew = crew_api()
+    try:
+        projects = get_project_list()
+    except FileNotFoundError:
+        projects = []
+    for name in projects:
+        info = get_project_info(name)
+        if info and is_path_valid(info.get("path", "")):
+            get_project_index(info["path"])
+    try:
+        # Создание клиента подгружает модули провайдера в litellm
+        crew.get_llm(provider)
+    except ValueError:
+        pass
+
+
+@st.cache_resource(show_spinner=False)
+def start_warmup(provider: str) -> threading.Thread:
+    """Запускает фоновый прогрев один раз на процесс и провайдера."""
+    thread = threading.Thread(target=_warmup, args=(provider,), name=f"warmup-{provider}", daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource(show_spinner=False)
+def start_watcher():
+    """Запускает наблюдатель за файлами проектов один раз на процесс."""
+    thread = threading.Thread(target=start_project_watcher, name="project-watcher-start", daemon=True)
+    thread.start()
+    return thread
+
+
+if WATCH_ENABLED:
+    start_watcher()
+
+
 # === HELPER FUNCTIONS ===
+QUICK_ACTIONS = {
+    "📊 Анализ архитектуры": "Проанализируй архитектуру проекта",
+    "🔍 Code Review": REVIEW_PROMPT,
+    "📝 Документация": DOCS_PROMPT,
+    "⚡ SQL анализ": SQL_LINT_PROMPT,
+}
+
+
 def get_status_chip(connected: bool, team: str) -> str:
     if connected:
         return f'<span class="chip"><span class="dot ok"></span> {team}</span>'
@@ -221,145 +333,463 @@ def render_empty_state():
     """, unsafe_allow_html=True)
 
 
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+CODE_BLOCK_RE = re.compile(r"```([\w+#.-]*)[^\n]*\n(.*?)```", re.DOTALL)
+
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def split_message(msg_hash: str, _content: str) -> list:
+    """Разбивает сообщение на сегменты markdown/code.
+
+    Кэшируется по хэшу содержимого (_content не хэшируется Streamlit),
+    поэтому разбор больших ответов выполняется один раз.
+    """
+    segments = []
+    pos = 0
+    for match in CODE_BLOCK_RE.finditer(_content):
+        text = _content[pos:match.start()].strip()
+        if text:
+            segments.append(("markdown", text, None))
+        segments.append(("code", match.group(2).rstrip("\n"), match.group(1) or None))
+        pos = match.end()
+    tail = _content[pos:].strip()
+    if tail:
+        segments.append(("markdown", tail, None))
+    return segments
+
+
+def render_message(msg: dict, collapse_code: bool):
+    msg_hash = msg.get("hash") or content_hash(msg["content"])
+    avatar = "🧑‍💻" if msg["role"] == "user" else "🤖"
+    with st.chat_message(msg["role"], avatar=avatar):
+        for kind, text, language in split_message(msg_hash, msg["content"]):
+            if kind == "markdown":
+                st.markdown(text)
+                continue
+            line_count = text.count("\n") + 1
+            if collapse_code and line_count > COLLAPSE_CODE_LINES:
+                with st.expander(f"📄 {language or 'code'} — {line_count} строк"):
+                    st.code(text, language=language)
+            else:
+                st.code(text, language=language)
+
+
+def load_more_history():
+    st.session_state.history_window += HISTORY_PAGE_SIZE
+
+
+@st.fragment
+def render_history():
+    """История чата с оконной отрисовкой: последние K сообщений + догрузка старых.
+
+    Кнопка догрузки перезапускает только этот fragment.
+    """
+    messages = st.session_state.messages
+    window = st.session_state.history_window
+    hidden = max(0, len(messages) - window)
+    if hidden:
+        st.button(f"⬆️ Показать ещё ({hidden} скрыто)", use_container_width=True, on_click=load_more_history)
+    visible = messages[hidden:]
+    for i, msg in enumerate(visible):
+        # Код сворачивается везде, кроме двух последних сообщений
+        render_message(msg, collapse_code=i < len(visible) - 2)
+
+
 def add_message(role: str, content: str):
-    st.session_state.messages.append({"role": role, "content": content})
+    """Добавляет сообщение в сессию; в хранилище оно попадёт при flush_messages."""
+    message = {"role": role, "content": content, "hash": content_hash(content)}
+    st.session_state.messages.append(message)
+    st.session_state.memory.add(role, content)
+    st.session_state.session_buffer.add(message)
+
+
+def flush_messages():
+    st.session_state.session_buffer.flush()
 
 
 def clear_chat():
+    st.session_state.session_buffer.discard()
+    get_session_store().clear_session(st.session_state.session_id)
     st.session_state.messages = []
+    st.session_state.memory.clear()
+    st.session_state.running_jobs = []
+    st.session_state.history_window = HISTORY_PAGE_SIZE
 
 
 # === SIDEBAR ===
+@st.fragment(run_every=5)
+def render_llm_load():
+    """Текущее окно параллельных вызовов и очередь по провайдерам (обновляется сам)."""
+    stats = limiter_stats()
+    if not stats:
+        return
+    with st.expander("📈 Нагрузка LLM"):
+        for provider, s in stats.items():
+            st.markdown(f"**{provider}**: окно {s['limit']} ({s['min']}–{s['max']}), "
+                        f"в работе {s['in_flight']}, в очереди {s['queued']}")
+            st.caption(f"задержка {s['latency_s'] or 0:.1f} с, ожидание {s['queue_wait_s'] or 0:.1f} с, "
+                       f"вызовов {s['calls']}, перегрузок {s['overloads']}")
+            if s["last_overload"]:
+                st.caption(f"Последнее сужение: {s['last_overload']}")
+
+
+@st.fragment
 def render_sidebar():
-    with st.sidebar:
-        st.markdown("## ⚙️ Настройки")
-        
-        # Team selector
-        st.markdown('<div class="card"><div class="card-title">👥 Команда</div></div>', 
+    """Боковая панель настроек.
+
+    Выполняется как fragment: изменения настроек перезапускают только сайдбар,
+    а не историю чата. Значения сохраняются в st.session_state.settings.
+    """
+    st.markdown("## ⚙️ Настройки")
+    
+    # Team selector
+    st.markdown('<div class="card"><div class="card-title">👥 Команда</div></div>', 
+                unsafe_allow_html=True)
+    
+    team = st.radio(
+        "Выберите команду:",
+        ["🔬 Исследовательская", "🏗️ DWH"],
+        horizontal=True,
+        label_visibility="collapsed"
+    )
+    st.session_state.team_mode = "research" if "Исследовательская" in team else "dwh"
+    
+    st.divider()
+    
+    # LLM Provider
+    st.markdown('<div class="card"><div class="card-title">🔌 Провайдер LLM</div></div>', 
+                unsafe_allow_html=True)
+    
+    provider = st.selectbox(
+        "Провайдер:",
+        ["ollama", "vllm", "zai"],
+        index=0,
+        label_visibility="collapsed",
+        help="ollama - локальный, vllm - высокопроизводительный, zai - облачный"
+    )
+    
+    verbose = st.toggle("📝 Подробные логи", value=False)
+    
+    st.divider()
+    
+    # Team-specific settings
+    if st.session_state.team_mode == "research":
+        st.markdown('<div class="card"><div class="card-title">🔬 Настройки исследования</div></div>', 
                     unsafe_allow_html=True)
         
-        team = st.radio(
-            "Выберите команду:",
-            ["🔬 Исследовательская", "🏗️ DWH"],
-            horizontal=True,
-            label_visibility="collapsed"
-        )
-        st.session_state.team_mode = "research" if "Исследовательская" in team else "dwh"
-        
-        st.divider()
+        structured = st.toggle("📋 JSON ответ", value=False)
+        selected_project = None
+        selected_agents = None
+        cross_project_tags = None
         
-        # LLM Provider
-        st.markdown('<div class="card"><div class="card-title">🔌 Провайдер LLM</div></div>', 
+    else:  # DWH
+        st.markdown('<div class="card"><div class="card-title">🏗️ Настройки DWH</div></div>', 
                     unsafe_allow_html=True)
         
-        provider = st.selectbox(
-            "Провайдер:",
-            ["ollama", "vllm", "zai"],
-            index=0,
-            label_visibility="collapsed",
-            help="ollama - локальный, vllm - высокопроизводительный, zai - облачный"
-        )
-        
-        verbose = st.toggle("📝 Подробные логи", value=False)
+        schema_labels = {
+            "Текст": None,
+            "JSON: анализ проекта": "analysis",
+            "JSON: SQL решение": "sql",
+            "JSON: Python решение": "python",
+            "JSON: архитектура": "architecture",
+            "JSON: тестирование": "tests",
+        }
+        structured = schema_labels[st.selectbox("📋 Формат ответа:", list(schema_labels))]
         
-        st.divider()
+        # Project selection
+        try:
+            projects = get_project_list()
+        except FileNotFoundError:
+            projects = []
         
-        # Team-specific settings
-        if st.session_state.team_mode == "research":
-            st.markdown('<div class="card"><div class="card-title">🔬 Настройки исследования</div></div>', 
-                        unsafe_allow_html=True)
-            
-            structured = st.toggle("📋 JSON ответ", value=False)
-            selected_project = None
-            selected_agents = None
-            
-        else:  # DWH
-            st.markdown('<div class="card"><div class="card-title">🏗️ Настройки DWH</div></div>', 
-                        unsafe_allow_html=True)
-            
-            structured = False
+        if projects:
+            selected_project = st.selectbox(
+                "📁 Проект:",
+                projects,
+                index=0,
+                label_visibility="collapsed"
+            )
             
-            # Project selection
-            try:
-                projects = get_project_list()
-            except FileNotFoundError:
-                projects = []
-            
-            if projects:
-                selected_project = st.selectbox(
-                    "📁 Проект:",
-                    projects,
-                    index=0,
-                    label_visibility="collapsed"
-                )
+            project_info = get_project_info(selected_project)
+            if project_info:
+                path_valid = is_path_valid(project_info.get("path", ""))
                 
-                project_info = get_project_info(selected_project)
-                if project_info:
-                    path_valid = is_path_valid(project_info.get("path", ""))
+                with st.expander("ℹ️ Информация о проекте"):
+                    st.markdown(f"**Описание:** {project_info.get('description', '—')}")
+                    st.markdown(f"**Стек:** {', '.join(project_info.get('tech_stack', []))}")
+                    st.markdown(f"**БД:** {project_info.get('database', {}).get('type', '—')}")
+                    st.code(project_info.get('path', ''), language=None)
                     
-                    with st.expander("ℹ️ Информация о проекте"):
-                        st.markdown(f"**Описание:** {project_info.get('description', '—')}")
-                        st.markdown(f"**Стек:** {', '.join(project_info.get('tech_stack', []))}")
-                        st.markdown(f"**БД:** {project_info.get('database', {}).get('type', '—')}")
-                        st.code(project_info.get('path', ''), language=None)
-                        
-                        if not path_valid:
-                            st.error("⚠️ Путь не существует")
-                
-                st.session_state.connected = path_valid
-                st.session_state.selected_project = selected_project
-            else:
-                st.warning("Проекты не найдены в config.yaml")
-                selected_project = None
-                st.session_state.connected = False
+                    if not path_valid:
+                        st.error("⚠️ Путь не существует")
             
-            # Agent selection
-            st.divider()
-            use_all = st.toggle("👥 Все агенты", value=True)
-            
-            selected_agents = None
-            if not use_all:
-                selected_agents = st.multiselect(
-                    "Выберите агентов:",
-                    ["Исследователь", "Architect", "Python Developer", "SQL Developer", "Tester"],
-                    default=["Исследователь", "Python Developer"]
-                )
+            st.session_state.connected = path_valid
+            st.session_state.selected_project = selected_project
+        else:
+            st.warning("Проекты не найдены в config.yaml")
+            selected_project = None
+            st.session_state.connected = False
+        
+        # Один запрос сразу по нескольким проектам
+        cross_project_tags = None
+        if len(projects) > 1 and st.toggle("🌐 По всем проектам", value=False,
+                                           help="Запрос выполняется параллельно по каждому проекту, ответы сводятся"):
+            tags = list_project_tags()
+            cross_project_tags = st.multiselect("Теги проектов:", tags, placeholder="Все проекты") if tags else []
         
+        # Agent selection
         st.divider()
+        use_all = st.toggle("👥 Все агенты", value=True)
         
-        # Actions
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🗑️ Очистить", use_container_width=True):
-                clear_chat()
-                st.rerun()
-        with col2:
-            st.metric("💬", len(st.session_state.messages))
+        selected_agents = None
+        if not use_all:
+            selected_agents = st.multiselect(
+                "Выберите агентов:",
+                ["Исследователь", "Architect", "Python Developer", "SQL Developer", "Tester"],
+                default=["Исследователь", "Python Developer"]
+            )
+    
+    st.divider()
+    
+    # Actions
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🗑️ Очистить", use_container_width=True):
+            clear_chat()
+            st.rerun()
+    with col2:
+        st.metric("💬", len(st.session_state.messages))
+    render_llm_load()
+    
+    # Quick actions for DWH
+    if st.session_state.team_mode == "dwh" and st.session_state.connected:
+        st.divider()
+        st.markdown('<div class="card"><div class="card-title">🚀 Быстрые команды</div></div>', 
+                    unsafe_allow_html=True)
         
-        # Quick actions for DWH
-        if st.session_state.team_mode == "dwh" and st.session_state.connected:
-            st.divider()
-            st.markdown('<div class="card"><div class="card-title">🚀 Быстрые команды</div></div>', 
-                        unsafe_allow_html=True)
-            
-            if st.button("📊 Анализ архитектуры", use_container_width=True):
-                add_message("user", "Проанализируй архитектуру проекта")
-                st.rerun()
-            
-            if st.button("🔍 Code Review", use_container_width=True):
-                add_message("user", "Сделай code review проекта")
-                st.rerun()
-            
-            if st.button("📝 Документация", use_container_width=True):
-                add_message("user", "Сгенерируй документацию для проекта")
+        for label, quick_prompt in QUICK_ACTIONS.items():
+            if st.button(label, use_container_width=True):
+                # Запрос выполняется в render_chat на полном перезапуске
+                st.session_state.pending_prompt = quick_prompt
                 st.rerun()
-    
-    return provider, verbose, structured, selected_project if st.session_state.team_mode == "dwh" else None, selected_agents if st.session_state.team_mode == "dwh" else None
+
+    dwh = st.session_state.team_mode == "dwh"
+    settings = {
+        "provider": provider,
+        "verbose": verbose,
+        "structured": structured,
+        "selected_project": selected_project if dwh else None,
+        "selected_agents": selected_agents if dwh else None,
+        "cross_project_tags": cross_project_tags if dwh else None,
+    }
+    prev = st.session_state.get("settings")
+    st.session_state.settings = settings
+    # Шапка чата зависит от команды, провайдера и статуса подключения:
+    # при их изменении нужен полный перезапуск, иначе достаточно fragment
+    header = (st.session_state.team_mode, provider, st.session_state.connected)
+    if prev is not None and header != st.session_state.get("header_state"):
+        st.session_state.header_state = header
+        st.rerun(scope="app")
+    st.session_state.header_state = header
 
 
 # === MAIN CHAT ===
-def render_chat(provider: str, verbose: bool, structured: bool, 
-                selected_project: str | None, selected_agents: list | None):
+def run_request(prompt: str, history: str, provider: str, verbose: bool, structured: bool | str | None,
+                selected_project: str | None, selected_agents: list | None,
+                cross_project_tags: list | None = None, checkpoint=None, team: str | None = None,
+                progress=None) -> str:
+    """Выполняет запрос командой и возвращает markdown ответа.
+
+    cross_project_tags: None - только выбранный проект, список - все проекты
+    с любым из тегов (пустой список - все проекты).
+    checkpoint: RunCheckpoint запроса - завершённые задачи и делегирования
+    прошлой неудачной попытки не выполняются повторно.
+    team: "research" | "dwh"; по умолчанию - команда текущей сессии. Передаётся
+    явно при выполнении вне потока скрипта Streamlit.
+    progress: callable(str) для сообщений о шагах агентов и завершённых задачах.
+    """
+    api = crew_api()
+    team = team or st.session_state.team_mode
+    delegation = None
+    if team == "research":
+        crew = api.create_crew(
+            prompt,
+            provider,
+            structured_output=structured,
+            verbose=verbose,
+            history=history
+        )
+    else:
+        if cross_project_tags is not None and prompt not in QUICK_ACTIONS.values():
+            return pipeline_answer(run_cross_project(
+                prompt, provider, tags=cross_project_tags or None, selected_agents=selected_agents, verbose=verbose
+            ))
+        if not selected_project:
+            raise ValueError("Выберите проект в настройках")
+        if prompt == REVIEW_PROMPT:
+            return pipeline_answer(run_code_review(selected_project, provider, verbose=verbose))
+        if prompt == DOCS_PROMPT:
+            return pipeline_answer(generate_docs(selected_project, provider, verbose=verbose))
+        # Статический анализ SQL без вызовов LLM: бюджет не нужен
+        if prompt == SQL_LINT_PROMPT:
+            project_path = get_project_info(selected_project)["path"]
+            return format_lint_report(lint_project(project_path), selected_project)
+        delegation = api.DelegationController.from_config((get_project_info(selected_project) or {}).get("delegation"))
+        crew = api.create_dwh_crew(
+            selected_project,
+            prompt,
+            provider,
+            selected_agents=selected_agents,
+            verbose=verbose,
+            history=history,
+            output_schema=structured or None,
+            delegation=delegation
+        )
+    
+    # Лимиты токенов, вызовов LLM и времени; при их исчерпании crew завершается досрочно
+    project_info = get_project_info(selected_project) if team == "dwh" else None
+    budget = api.RequestBudget.from_config(project_info)
+    checkpoint = checkpoint or api.RunCheckpoint(uuid.uuid4().hex)
+    if progress is not None:
+        crew.step_callback = lambda step: _report_step(progress, step)
+        crew.task_callback = lambda output: progress(f"✅ {output.agent}: задача выполнена")
+    with budget.activate(), checkpoint.activate():
+        result = crew.kickoff()
+    checkpoint.clear()
+    structured_output = next(
+        (t.pydantic for t in reversed(result.tasks_output) if t.pydantic is not None), None
+    )
+    metadata = {"budget": budget.report(), "checkpoint": checkpoint.report()}
+    if delegation is not None:
+        metadata["delegation"] = delegation.report()
+    if structured and structured_output is not None:
+        if hasattr(structured_output, "metadata"):
+            structured_output.metadata.update(metadata)
+        return f"```json\n{structured_output.model_dump_json(indent=2)}\n```"
+    notes = [api.format_budget(metadata["budget"]), api.format_resume(metadata["checkpoint"])]
+    if delegation is not None:
+        notes.append(api.format_delegation(metadata["delegation"]))
+    notes = [note for note in notes if note]
+    if not notes:
+        return str(result)
+    return f"{result}\n\n---\n" + "\n".join(f"_{note}_  " for note in notes)
+
+
+def pipeline_answer(result) -> str:
+    """Ответ конвейера (review, docs, запрос по проектам) с отметкой о досрочно завершённых шагах.
+
+    Каждый шаг конвейера выполняется под своим бюджетом; result.budget - их сводный отчёт.
+    """
+    note = crew_api().format_budget(result.budget)
+    if not note:
+        return result.answer
+    return f"{result.answer}\n\n---\n_{note}_  "
+
+
+def _report_step(progress, step):
+    # Шаг агента - AgentAction (вызов инструмента) или AgentFinish (ответ задачи)
+    tool = getattr(step, "tool", None)
+    if tool:
+        progress(f"🔧 {tool}")
+
+
+def project_fingerprint(project: str | None) -> str | None:
+    """Снимок структуры проекта для ключа объединения запросов (None - без проекта)."""
+    info = get_project_info(project) if project else None
+    if not info or not is_path_valid(info.get("path", "")):
+        return None
+    return get_project_index(info["path"]).fingerprint
+
+
+def render_flight_progress(placeholder, flight, joined: bool):
+    """Прогресс выполняющегося запроса: участники и последние шаги агентов."""
+    lines = []
+    if joined:
+        started = time.strftime('%H:%M:%S', time.localtime(flight.started_at))
+        lines.append(f"🔗 Такой же запрос уже выполняется (начат {started}) - ответ будет общим")
+    elif flight.waiters > 1:
+        lines.append(f"👥 К запросу присоединились другие сессии: {flight.waiters - 1}")
+    lines += flight.progress[-PROGRESS_LINES:]
+    if lines:
+        placeholder.caption("  \n".join(lines))
+
+
+def answer_request(prompt: str, history: str, provider: str, verbose: bool, structured: bool | str | None,
+                   selected_project: str | None, selected_agents: list | None,
+                   cross_project_tags: list | None = None) -> str:
+    """run_request с готовыми ответами и статусом задачи во внешнем хранилище.
+
+    Ответ переиспользуется, если тот же запрос с той же историей и настройками
+    уже выполнялся в любой сессии, а если он ещё выполняется - сессия
+    присоединяется к нему и получает тот же ответ (или ту же ошибку) без
+    повторного запуска crew. Ошибки не кэшируются.
+    """
+    store = get_session_store()
+    session_id = st.session_state.session_id
+    team = st.session_state.team_mode
+    # Снимок проекта в ключе: изменение структуры проекта не отдаёт старый ответ и без наблюдателя
+    fingerprint = project_fingerprint(selected_project)
+    key = answer_key(
+        team=team, prompt=prompt, history=history, provider=provider, structured=structured,
+        project=selected_project, fingerprint=fingerprint, agents=selected_agents, tags=cross_project_tags,
+    )
+    cached = store.get_answer(key)
+    if cached is not None:
+        return cached
+
+    # Повтор того же запроса в сессии (история не учитывается: в ней уже сообщение
+    # об ошибке) продолжает неудачную попытку с контрольной точки
+    run_id = answer_key(
+        session=session_id, team=team, prompt=prompt, provider=provider,
+        structured=structured, project=selected_project, agents=selected_agents, tags=cross_project_tags,
+    )
+    checkpoint = crew_api().RunCheckpoint(run_id)
+    # Ответы по всем проектам не привязаны к одному проекту и не инвалидируются по нему
+    project = selected_project if cross_project_tags is None else None
+
+    def execute(flight):
+        response = run_request(
+            prompt, history, provider, verbose, structured,
+            selected_project, selected_agents, cross_project_tags, checkpoint,
+            team=team, progress=flight.report
+        )
+        # Ответ сохраняет сама работа: уход начавшей её сессии не теряет его для остальных
+        store.set_answer(key, response, project=project)
+        return response
+
+    # Одинаковые одновременные запросы из разных сессий выполняются один раз
+    flight_key = answer_key(
+        team=team, prompt=" ".join(prompt.split()), history=history, provider=provider, structured=structured,
+        project=selected_project, fingerprint=fingerprint, agents=selected_agents,
+        tags=cross_project_tags,
+    )
+    flight, started = get_single_flight().start(flight_key, execute, tag=project)
+    job_id = uuid.uuid4().hex
+    job = {"status": "running", "prompt": prompt[:200], "started_at": time.time(), "run_id": run_id,
+           "coalesced": not started}
+    store.set_job(session_id, job_id, job)
+    placeholder = st.empty()
+    while not flight.wait(PROGRESS_POLL_SECONDS):
+        render_flight_progress(placeholder, flight, joined=not started)
+    placeholder.empty()
+    try:
+        response = flight.outcome()
+    except Exception as e:
+        store.set_job(session_id, job_id, {**job, "status": "error", "error": str(e), "finished_at": time.time()})
+        message = f"❌ **Ошибка:** {str(e)}"
+        if checkpoint.has_progress:
+            message += "\n\n_Промежуточные результаты сохранены: повторите запрос, чтобы продолжить с места сбоя._"
+        return message
+    store.set_job(session_id, job_id, {**job, "status": "done", "finished_at": time.time()})
+    return response
+
+
+def render_chat(provider: str, verbose: bool, structured: bool | str | None, 
+                selected_project: str | None, selected_agents: list | None,
+                cross_project_tags: list | None = None):
     
     # Header
     team_name = "Исследовательская команда" if st.session_state.team_mode == "research" else "DWH Команда"
@@ -382,16 +812,21 @@ def render_chat(provider: str, verbose: bool, structured: bool,
     chat_container = st.container(height=500)
     
     with chat_container:
+        for job in st.session_state.running_jobs:
+            st.info(f"⏳ Запрос не завершён (начат {time.strftime('%H:%M:%S', time.localtime(job['started_at']))}): "
+                    f"{job['prompt']}")
         if not st.session_state.messages:
             render_empty_state()
+            if WARMUP_ENABLED:
+                start_warmup(provider)
         else:
-            for msg in st.session_state.messages:
-                avatar = "🧑‍💻" if msg["role"] == "user" else "🤖"
-                with st.chat_message(msg["role"], avatar=avatar):
-                    st.markdown(msg["content"])
+            render_history()
     
-    # Chat input
-    if prompt := st.chat_input("💬 Введите сообщение..."):
+    # Chat input (или отложенная быстрая команда из сайдбара)
+    prompt = st.chat_input("💬 Введите сообщение...") or st.session_state.pop("pending_prompt", None)
+    if prompt:
+        # История до текущего вопроса: последние реплики + резюме старых
+        history = st.session_state.memory.render()
         add_message("user", prompt)
         
         # Show user message immediately
@@ -401,41 +836,24 @@ def render_chat(provider: str, verbose: bool, structured: bool,
             
             with st.chat_message("assistant", avatar="🤖"):
                 with st.spinner("🔄 Обрабатываю запрос..."):
-                    try:
-                        if st.session_state.team_mode == "research":
-                            crew = create_crew(
-                                prompt,
-                                provider,
-                                structured_output=structured,
-                                verbose=verbose
-                            )
-                        else:
-                            if not selected_project:
-                                raise ValueError("Выберите проект в настройках")
-                            crew = create_dwh_crew(
-                                selected_project,
-                                prompt,
-                                provider,
-                                selected_agents=selected_agents,
-                                verbose=verbose
-                            )
-                        
-                        result = crew.kickoff()
-                        response = str(result)
-                        
-                    except Exception as e:
-                        response = f"❌ **Ошибка:** {str(e)}"
+                    response = answer_request(
+                        prompt, history, provider, verbose, structured,
+                        selected_project, selected_agents, cross_project_tags
+                    )
                 
                 st.markdown(response)
                 add_message("assistant", response)
         
+        # Вопрос и ответ пишутся в хранилище одной пачкой
+        flush_messages()
         st.rerun()
 
 
 # === MAIN ===
 def main():
-    settings = render_sidebar()
-    render_chat(*settings)
+    with st.sidebar:
+        render_sidebar()
+    render_chat(**st.session_state.settings)
 
 
 if __name__ == "__main__":
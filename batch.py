@@ -0,0 +1,343 @@
+"""Headless batch runner - запуск запросов из JSONL без Streamlit.
+
+Каждая строка входного файла - JSON объект:
+    {"id": "...", "team": "dwh", "project": "cor_crewai", "prompt": "...",
+     "provider": "ollama", "agents": ["Исследователь", "SQL Developer"]}
+
+Запрос по нескольким проектам: "project": "*" (все) или "tags": ["postgres"].
+
+Результаты дописываются в выходной JSONL по мере завершения, поэтому
+повторный запуск с тем же выходным файлом пропускает уже выполненные id.
+
+Примеры:
+    python batch.py requests.jsonl -o results.jsonl --workers 4
+    python batch.py --review-all -o nightly_review.jsonl
+    python batch.py --sql-lint-all -o sql_report.jsonl
+    python batch.py --digests-all --provider vllm -o digests.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from pipelines.code_review import REVIEW_PROMPT, run_code_review
+from pipelines.cross_project import run_cross_project
+from pipelines.digests import DIGEST_PROMPT, build_digests
+from pipelines.docs import DOCS_PROMPT, generate_docs
+from utils.file_utils import get_project_info, get_project_list
+from utils.llm_limiter import limiter_stats
+from utils.session_store import answer_key
+from utils.sql_lint import SQL_LINT_PROMPT, format_lint_report, lint_project
+
+
+def record_id(record: Dict) -> str:
+    """Возвращает id записи: явный или стабильный хэш её содержимого.
+
+    Args:
+        record: Запись из входного JSONL.
+
+    Returns:
+        Идентификатор запроса.
+    """
+    if record.get("id"):
+        return str(record["id"])
+    fields = {k: record.get(k) for k in ("team", "project", "prompt", "provider", "agents")}
+    if record.get("tags"):
+        # Только при наличии, чтобы id старых записей не изменились
+        fields["tags"] = record["tags"]
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def read_records(path: str) -> List[Dict]:
+    """Читает записи из JSONL файла, пропуская пустые строки.
+
+    Args:
+        path: Путь к входному файлу.
+
+    Returns:
+        Список записей с заполненным полем id.
+
+    Raises:
+        ValueError: Если строка не является валидным JSON объектом или id повторяется.
+    """
+    records = []
+    lines: Dict[str, int] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: невалидный JSON ({e})")
+            if not isinstance(record, dict):
+                raise ValueError(f"{path}:{line_no}: ожидается JSON объект")
+            record["id"] = record_id(record)
+            if record["id"] in lines:
+                raise ValueError(f"{path}:{line_no}: id '{record['id']}' уже есть в строке {lines[record['id']]}")
+            lines[record["id"]] = line_no
+            records.append(record)
+    return records
+
+
+def project_records(kind: str, prompt: str, provider: str, config_path: str = "config.yaml") -> List[Dict]:
+    """Формирует по одной записи с заданным запросом на каждый проект из конфигурации.
+
+    Args:
+        kind: Префикс id (review, sql-lint, digests).
+        prompt: Запрос (REVIEW_PROMPT, SQL_LINT_PROMPT, DIGEST_PROMPT).
+        provider: LLM провайдер.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        Список записей для ночного прогона.
+    """
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return [
+        {
+            "id": f"{kind}-{name}-{day}",
+            "team": "dwh",
+            "project": name,
+            "prompt": prompt,
+            "provider": provider,
+        }
+        for name in get_project_list(config_path)
+    ]
+
+
+def review_all_records(provider: str, config_path: str = "config.yaml") -> List[Dict]:
+    """Формирует записи code review для всех проектов из конфигурации."""
+    return project_records("review", REVIEW_PROMPT, provider, config_path)
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Возвращает id успешно выполненных запросов из выходного файла.
+
+    Записи с ошибкой не считаются выполненными и будут перезапущены.
+
+    Args:
+        output_path: Путь к выходному JSONL.
+
+    Returns:
+        Множество id.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # Обрезанная строка после аварийного завершения
+                continue
+            if row.get("status") == "ok":
+                done.add(row.get("id"))
+    return done
+
+
+def run_record(record: Dict, verbose: bool = False, config_path: str = "config.yaml") -> Dict:
+    """Выполняет один запрос через create_crew/create_dwh_crew.
+
+    Вызывается в воркере пула, поэтому импорт crew выполняется здесь.
+
+    Args:
+        record: Запись запроса.
+        verbose: Подробный вывод CrewAI.
+        config_path: Путь к конфигурационному файлу (проекты, бюджеты).
+
+    Returns:
+        Строка результата для выходного JSONL.
+    """
+    from crew import DelegationController, RequestBudget, RunCheckpoint, create_crew, create_dwh_crew
+
+    started = time.time()
+    row = {
+        "id": record["id"],
+        "team": record.get("team", "dwh"),
+        "project": record.get("project"),
+        "provider": record.get("provider", "ollama"),
+        "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+    }
+    delegation = None
+    try:
+        if row["team"] == "research":
+            crew = create_crew(record["prompt"], row["provider"], verbose=verbose)
+        elif row["project"] == "*" or record.get("tags"):
+            # Один запрос по всем проектам (или по тегам), проекты обрабатываются параллельно
+            crew = None
+            cross = run_cross_project(record["prompt"], row["provider"], tags=record.get("tags"),
+                                      selected_agents=record.get("agents"), verbose=verbose,
+                                      config_path=config_path)
+            row.update(status="ok", result=cross.answer, token_usage=cross.token_usage, budget=cross.budget,
+                       projects={r.project: r.status for r in cross.results})
+        elif not row["project"]:
+            raise ValueError("Для DWH запроса нужно указать project")
+        elif record["prompt"] == REVIEW_PROMPT:
+            # Инкрементальный review: только файлы, изменённые с прошлого прогона
+            crew = None
+            review = run_code_review(row["project"], row["provider"], verbose=verbose, config_path=config_path)
+            row.update(status="ok", result=review.answer, token_usage=review.token_usage, budget=review.budget,
+                       reviewed_files=review.reviewed, cached_files=len(review.cached))
+        elif record["prompt"] == SQL_LINT_PROMPT:
+            # Статический анализ без LLM
+            crew = None
+            project_info = get_project_info(row["project"], config_path)
+            if not project_info:
+                raise ValueError(f"Проект '{row['project']}' не найден в конфигурации")
+            lint = lint_project(project_info["path"])
+            row.update(status="ok", result=format_lint_report(lint, row["project"]), token_usage={},
+                       findings=[asdict(f) for f in lint.findings], cached_files=len(lint.cached))
+        elif record["prompt"] == DIGEST_PROMPT:
+            # Офлайн описания файлов: заново описываются только изменённые
+            crew = None
+            digest = build_digests(row["project"], row["provider"], config_path=config_path)
+            row.update(status="ok", result=digest.answer, token_usage=digest.token_usage, budget=digest.budget,
+                       generated=len(digest.generated), cached_files=len(digest.cached))
+        elif record["prompt"] == DOCS_PROMPT:
+            crew = None
+            docs = generate_docs(row["project"], row["provider"], verbose=verbose, config_path=config_path)
+            row.update(status="ok", result=docs.answer, token_usage=docs.token_usage, budget=docs.budget,
+                       generated_modules=docs.generated, cached_modules=len(docs.cached))
+        else:
+            project_info = get_project_info(row["project"], config_path) or {}
+            delegation = DelegationController.from_config(project_info.get("delegation"))
+            crew = create_dwh_crew(
+                row["project"],
+                record["prompt"],
+                row["provider"],
+                selected_agents=record.get("agents"),
+                verbose=verbose,
+                delegation=delegation,
+                config_path=config_path,
+            )
+        if crew is not None:
+            project_info = get_project_info(row["project"], config_path) if row["team"] != "research" else None
+            budget = RequestBudget.from_config(project_info, config_path)
+            # Повторный запуск упавшей записи продолжается с контрольной точки
+            checkpoint = RunCheckpoint(answer_key(id=row["id"], team=row["team"], prompt=record["prompt"],
+                                                  project=row["project"], provider=row["provider"],
+                                                  agents=record.get("agents")))
+            with budget.activate(), checkpoint.activate():
+                result = crew.kickoff()
+            checkpoint.clear()
+            row.update(
+                status="ok",
+                result=str(result),
+                token_usage=result.token_usage.model_dump(),
+                budget=budget.report(),
+                checkpoint=checkpoint.report(),
+            )
+            if delegation is not None:
+                row["delegation"] = delegation.report()
+    except Exception as e:
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+    # Состояние окна провайдера в этом процессе (в режиме --threads окно общее для всех записей)
+    load = limiter_stats().get(row["provider"])
+    if load:
+        row["llm_load"] = load
+    row["duration_s"] = round(time.time() - started, 3)
+    return row
+
+
+def run_batch(
+    records: Iterable[Dict],
+    output_path: str,
+    workers: int = 2,
+    use_threads: bool = False,
+    verbose: bool = False,
+    config_path: str = "config.yaml",
+) -> Dict[str, int]:
+    """Выполняет записи с ограниченной параллельностью и пишет результаты.
+
+    Args:
+        records: Записи запросов.
+        output_path: Путь к выходному JSONL (дописывается).
+        workers: Максимальное число одновременных запросов.
+        use_threads: Пул потоков вместо пула процессов.
+        verbose: Подробный вывод CrewAI.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        Счётчики: ok, error, skipped, duplicate (повторные записи с уже встреченным id).
+    """
+    done = completed_ids(output_path)
+    pending = []
+    seen: Set[str] = set()
+    duplicates = 0
+    for r in records:
+        if r["id"] in seen:
+            duplicates += 1
+            print(f"[duplicate] {r['id']}: запись с таким id уже есть во входе, пропущена", file=sys.stderr)
+            continue
+        seen.add(r["id"])
+        if r["id"] not in done:
+            pending.append(r)
+    # Пропущенные - только записи этого входа, уже выполненные ранее (а не все id выходного файла)
+    stats = {"ok": 0, "error": 0, "skipped": len(done & seen), "duplicate": duplicates}
+    if not pending:
+        return stats
+
+    executor_cls = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with executor_cls(max_workers=max(1, workers)) as pool, \
+            open(output_path, "a", encoding="utf-8") as out:
+        futures = {pool.submit(run_record, r, verbose, config_path): r for r in pending}
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as e:
+                # Падение самого воркера (например, BrokenProcessPool)
+                row = {"id": futures[future]["id"], "status": "error", "error": f"{type(e).__name__}: {e}"}
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            stats[row["status"]] += 1
+            print(f"[{row['status']}] {row['id']} ({row.get('duration_s', 0)}s)", file=sys.stderr)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетный запуск запросов к командам агентов")
+    parser.add_argument("input", nargs="?", help="Входной JSONL с запросами")
+    parser.add_argument("-o", "--output", required=True, help="Выходной JSONL (дописывается, используется для resume)")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="Число одновременных запросов")
+    parser.add_argument("--threads", action="store_true", help="Пул потоков вместо процессов")
+    parser.add_argument("--review-all", action="store_true", help="Code review всех проектов из config.yaml")
+    parser.add_argument("--sql-lint-all", action="store_true", help="Статический анализ SQL всех проектов")
+    parser.add_argument("--digests-all", action="store_true", help="Дайджесты файлов всех проектов")
+    parser.add_argument("--provider", default="ollama", help="Провайдер для --review-all/--digests-all")
+    parser.add_argument("--config", default="config.yaml", help="Путь к config.yaml")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Подробные логи CrewAI")
+    args = parser.parse_args(argv)
+
+    records: List[Dict] = []
+    if args.input:
+        records.extend(read_records(args.input))
+    if args.review_all:
+        records.extend(review_all_records(args.provider, args.config))
+    if args.sql_lint_all:
+        records.extend(project_records("sql-lint", SQL_LINT_PROMPT, args.provider, args.config))
+    if args.digests_all:
+        records.extend(project_records("digests", DIGEST_PROMPT, args.provider, args.config))
+    if not records:
+        parser.error("нужен входной файл, --review-all, --sql-lint-all или --digests-all")
+
+    stats = run_batch(records, args.output, args.workers, args.threads, args.verbose, args.config)
+    print(f"Готово: ok={stats['ok']} error={stats['error']} skipped={stats['skipped']} "
+          f"duplicate={stats['duplicate']}", file=sys.stderr)
+    for provider, load in limiter_stats().items():
+        print(f"LLM {provider}: окно {load['limit']} (max {load['max']}), вызовов {load['calls']}, "
+              f"перегрузок {load['overloads']}, сужений {load['decreases']}", file=sys.stderr)
+    return 1 if stats["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Бенчмарк обхода дерева проекта на медленной (сетевой) ФС.
+
+Медленная ФС имитируется задержкой на каждый вызов os.scandir / os.listdir /
+os.stat (как round trip на NFS/SMB). Тип записи из dirent (entry.is_dir())
+задержки не получает - он приходит вместе с листингом директории.
+
+Сравниваются:
+- legacy: os.listdir + os.path.isdir на каждую запись (прежний scan_project_structure);
+- scandir: последовательный обход через os.scandir (parallel_walk, 1 поток);
+- parallel: os.scandir + пул потоков (parallel_walk, --workers потоков).
+
+Примеры:
+    python benchmarks/fs_walk.py
+    python benchmarks/fs_walk.py --delay-ms 5 --breadth 6 --depth 3 --workers 16
+    python benchmarks/fs_walk.py --path /mnt/nfs/dwh_project --delay-ms 0
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.fs_walk import parallel_walk  # noqa: E402
+
+
+def make_tree(root: str, breadth: int, depth: int, files_per_dir: int) -> int:
+    """Создаёт синтетическое дерево: breadth поддиректорий на уровень, depth уровней.
+
+    Returns:
+        Количество созданных директорий.
+    """
+    count = 0
+    level = [root]
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(breadth):
+                path = os.path.join(parent, f"dir_{i}")
+                os.mkdir(path)
+                for j in range(files_per_dir):
+                    with open(os.path.join(path, f"file_{j}.sql"), "w") as f:
+                        f.write("SELECT 1;\n")
+                next_level.append(path)
+                count += 1
+        level = next_level
+    return count
+
+
+@contextmanager
+def slow_fs(delay_s: float) -> Iterator[None]:
+    """Добавляет задержку к каждому системному вызову листинга/stat."""
+    if delay_s <= 0:
+        yield
+        return
+    originals = {name: getattr(os, name) for name in ("scandir", "listdir", "stat")}
+
+    def delayed(fn: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            time.sleep(delay_s)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    for name, fn in originals.items():
+        setattr(os, name, delayed(fn))
+    try:
+        yield
+    finally:
+        for name, fn in originals.items():
+            setattr(os, name, fn)
+
+
+def legacy_walk(root: str) -> int:
+    """Прежний обход: os.listdir и отдельный os.path.isdir на каждую запись."""
+    files = 0
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            entries = os.listdir(path)
+        except PermissionError:
+            continue
+        for entry in entries:
+            full_path = os.path.join(path, entry)
+            if os.path.isdir(full_path):
+                stack.append(full_path)
+            else:
+                files += 1
+    return files
+
+
+def walk_files(root: str, workers: int) -> int:
+    return sum(len(files) for _, _, _, files in parallel_walk(root, max_workers=workers))
+
+
+def measure(fn: Callable[[], int], runs: int) -> Dict:
+    samples: List[float] = []
+    result = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"ms": samples[len(samples) // 2], "files": result}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк обхода дерева на медленной ФС")
+    parser.add_argument("--path", default=None, help="Существующее дерево вместо синтетического")
+    parser.add_argument("--breadth", type=int, default=5, help="Поддиректорий на уровень")
+    parser.add_argument("--depth", type=int, default=3, help="Уровней вложенности")
+    parser.add_argument("--files", type=int, default=10, help="Файлов в каждой директории")
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="Задержка на системный вызов")
+    parser.add_argument("--workers", type=int, default=8, help="Потоков для parallel")
+    parser.add_argument("--runs", type=int, default=3, help="Запусков (берётся медиана)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.path
+        if root is None:
+            root = tmp
+            dirs = make_tree(root, args.breadth, args.depth, args.files)
+            print(f"Синтетическое дерево: {dirs} директорий, {dirs * args.files} файлов")
+
+        with slow_fs(args.delay_ms / 1000):
+            results = {
+                "legacy (listdir+isdir)": measure(lambda: legacy_walk(root), args.runs),
+                "scandir (1 поток)": measure(lambda: walk_files(root, 1), args.runs),
+                f"parallel ({args.workers} потоков)": measure(lambda: walk_files(root, args.workers), args.runs),
+            }
+
+    baseline = results["legacy (listdir+isdir)"]["ms"]
+    print(f"Задержка: {args.delay_ms} ms на вызов, медиана {args.runs} запусков")
+    for name, r in results.items():
+        print(f"  {name:<26} {r['ms']:10.1f} ms  x{baseline / max(r['ms'], 1e-6):6.1f}  файлов: {r['files']}")
+    counts = {r["files"] for r in results.values()}
+    if len(counts) != 1:
+        print(f"РАСХОЖДЕНИЕ: разное число файлов {sorted(counts)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
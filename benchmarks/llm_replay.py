@@ -0,0 +1,209 @@
+"""Регрессионный бенчмарк оркестрации на записанных вызовах LLM.
+
+record: сценарии выполняются на живой модели, все вызовы LLM пишутся в
+кассеты `benchmarks/cassettes/<сценарий>.json`.
+run: сценарии выполняются с провайдером replay (ответы из кассет, без
+модели и без недетерминизма) и для каждого считаются:
+- число вызовов LLM;
+- токены промптов всего и по агентам;
+- накладные расходы оркестрации: время прогона без времени ответов LLM
+  (сборка crew, контекст проекта, инструменты, разбор ответов).
+С baseline (`--update-baseline` сохраняет текущие значения) метрики
+сравниваются по порогу роста; при регрессии код выхода 1.
+
+Изменения промптов, состава агентов, температур или размера контекста
+воспроизводятся на тех же ответах: если промпт вызова изменился, агент
+получает следующий записанный ответ (счётчик diverged), если ответы агента
+закончились - заглушку с финальным ответом (счётчик missing).
+
+Примеры:
+    python benchmarks/llm_replay.py record --provider vllm
+    python benchmarks/llm_replay.py run --update-baseline
+    python benchmarks/llm_replay.py run --max-growth 0.05
+    python benchmarks/llm_replay.py run --scenario dwh_sql_optimize --strict
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agents.cassette import Cassette, CassetteError  # noqa: E402
+
+SCENARIOS_PATH = os.path.join(ROOT, "benchmarks", "scenarios.yaml")
+CASSETTE_DIR = os.path.join(ROOT, "benchmarks", "cassettes")
+MAX_GROWTH = 0.10
+MAX_OVERHEAD_GROWTH = 0.50
+# Рост накладных расходов меньше этого считается шумом измерения
+MIN_OVERHEAD_DELTA_S = 0.25
+
+
+def load_scenarios(path: str, names: Optional[List[str]] = None) -> List[Dict]:
+    """Сценарии из YAML: name, team (dwh|research), prompt, project, agents, output_schema."""
+    with open(path, "r", encoding="utf-8") as f:
+        scenarios = (yaml.safe_load(f) or {}).get("scenarios", [])
+    if names:
+        unknown = set(names) - {s["name"] for s in scenarios}
+        if unknown:
+            raise ValueError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+        scenarios = [s for s in scenarios if s["name"] in names]
+    return scenarios
+
+
+def build_crew(scenario: Dict, provider: str):
+    from crew import create_crew, create_dwh_crew
+
+    if scenario.get("team", "dwh") == "research":
+        return create_crew(scenario["prompt"], provider, structured_output=bool(scenario.get("structured")),
+                           verbose=False)
+    return create_dwh_crew(
+        scenario["project"],
+        scenario["prompt"],
+        provider,
+        selected_agents=scenario.get("agents"),
+        verbose=False,
+        output_schema=scenario.get("output_schema"),
+    )
+
+
+def run_scenario(scenario: Dict, mode: str, provider: str, cassette_dir: str, strict: bool = False) -> Dict:
+    """Выполняет сценарий с записью или воспроизведением и возвращает его метрики."""
+    path = os.path.join(cassette_dir, f"{scenario['name']}.json")
+    if mode == "record":
+        cassette = Cassette(path, scenario["name"])
+        context = cassette.recording(provider=provider, prompt=scenario["prompt"])
+    else:
+        cassette = Cassette.load(path, strict=strict)
+        context = cassette.replaying()
+        provider = "replay"
+    # Пустой кэш на сценарий: кэшированные результаты инструментов и дайджесты меняли бы промпты
+    previous_cache = os.environ.get("CREW_CACHE_DIR")
+    with tempfile.TemporaryDirectory(prefix="llm_replay_") as cache_root:
+        os.environ["CREW_CACHE_DIR"] = cache_root
+        try:
+            started = time.perf_counter()
+            with context:
+                crew = build_crew(scenario, provider)
+                build_s = time.perf_counter() - started
+                crew.kickoff()
+            wall_s = time.perf_counter() - started
+        finally:
+            if previous_cache is None:
+                os.environ.pop("CREW_CACHE_DIR", None)
+            else:
+                os.environ["CREW_CACHE_DIR"] = previous_cache
+    metrics = cassette.metrics
+    return {
+        "scenario": scenario["name"],
+        "llm_calls": metrics["llm_calls"],
+        "prompt_tokens": metrics["prompt_tokens"],
+        "completion_tokens": metrics["completion_tokens"],
+        "by_agent": metrics["by_agent"],
+        "wall_s": round(wall_s, 3),
+        "build_s": round(build_s, 3),
+        "overhead_s": round(wall_s - metrics["llm_seconds"], 3),
+        "diverged": metrics["diverged"],
+        "missing": metrics["missing"],
+    }
+
+
+def compare(current: Dict, baseline: Dict, max_growth: float, max_overhead_growth: float) -> List[str]:
+    """Регрессии сценария относительно baseline."""
+    regressions = []
+
+    def check(label: str, value: float, base: float, limit: float, min_delta: float = 0.0):
+        if base and value > base * (1 + limit) and value - base > min_delta:
+            regressions.append(f"{current['scenario']}: {label} {base:g} -> {value:g} (+{(value / base - 1) * 100:.0f}%)")
+
+    check("вызовов LLM", current["llm_calls"], baseline.get("llm_calls", 0), max_growth)
+    check("токенов промптов", current["prompt_tokens"], baseline.get("prompt_tokens", 0), max_growth)
+    for agent, usage in current["by_agent"].items():
+        base = (baseline.get("by_agent") or {}).get(agent)
+        if base is None:
+            regressions.append(f"{current['scenario']}: новый агент в вызовах LLM: {agent}")
+        else:
+            check(f"токенов промптов [{agent}]", usage["prompt_tokens"], base["prompt_tokens"], max_growth)
+    check("накладных расходов, с", current["overhead_s"], baseline.get("overhead_s", 0),
+          max_overhead_growth, MIN_OVERHEAD_DELTA_S)
+    return regressions
+
+
+def print_report(results: List[Dict], baseline: Dict):
+    print(f"{'сценарий':<28} {'вызовов':>8} {'промпт ток.':>12} {'накл. с':>8} {'diverged':>9} {'missing':>8}")
+    for r in results:
+        base = baseline.get(r["scenario"]) or {}
+        delta = f" ({r['prompt_tokens'] - base['prompt_tokens']:+d})" if base else ""
+        print(f"{r['scenario']:<28} {r['llm_calls']:>8} {r['prompt_tokens']:>12}{delta} "
+              f"{r['overhead_s']:>8.2f} {r['diverged']:>9} {r['missing']:>8}")
+        for agent, usage in sorted(r["by_agent"].items(), key=lambda x: -x[1]["prompt_tokens"]):
+            print(f"    {agent:<24} {usage['llm_calls']:>8} {usage['prompt_tokens']:>12}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Регрессионный бенчмарк оркестрации на кассетах LLM")
+    parser.add_argument("mode", choices=["record", "run"], help="record - запись на живой модели, run - воспроизведение")
+    parser.add_argument("--provider", default="ollama", help="Провайдер для record")
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH, help="YAML со сценариями")
+    parser.add_argument("--scenario", action="append", help="Только указанные сценарии (можно несколько)")
+    parser.add_argument("--cassettes", default=CASSETTE_DIR, help="Каталог кассет")
+    parser.add_argument("--max-growth", type=float, default=MAX_GROWTH, help="Порог роста вызовов и токенов")
+    parser.add_argument("--max-overhead-growth", type=float, default=MAX_OVERHEAD_GROWTH,
+                        help="Порог роста накладных расходов")
+    parser.add_argument("--update-baseline", action="store_true", help="Сохранить текущие метрики как baseline")
+    parser.add_argument("--strict", action="store_true", help="Ошибка, если в кассете не хватает ответов")
+    parser.add_argument("-o", "--output", help="JSON с метриками прогона")
+    args = parser.parse_args(argv)
+
+    # Проекты сценариев ищутся в config.yaml корня репозитория
+    os.chdir(ROOT)
+    # Импорт стека crew заранее: его время не должно попасть в накладные расходы первого сценария
+    import crew  # noqa: F401
+    baseline_path = os.path.join(args.cassettes, "baseline.json")
+    scenarios = load_scenarios(args.scenarios, args.scenario)
+    results = []
+    for scenario in scenarios:
+        try:
+            results.append(run_scenario(scenario, args.mode, args.provider, args.cassettes, args.strict))
+        except CassetteError as e:
+            print(f"{scenario['name']}: {e}", file=sys.stderr)
+            return 2
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    if args.mode == "record":
+        return 0
+    if args.update_baseline:
+        baseline.update({r["scenario"]: r for r in results})
+        os.makedirs(args.cassettes, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=1)
+        print(f"baseline обновлён: {baseline_path}")
+        return 0
+
+    regressions = []
+    for r in results:
+        if r["scenario"] in baseline:
+            regressions += compare(r, baseline[r["scenario"]], args.max_growth, args.max_overhead_growth)
+        if args.strict and r["missing"]:
+            regressions.append(f"{r['scenario']}: в кассете не хватило ответов ({r['missing']})")
+    for line in regressions:
+        print(f"РЕГРЕССИЯ: {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Бенчмарк холодного старта app.py.
+
+Измеряет:
+- разбивку `python -X importtime` по пакетам верхнего уровня для модуля;
+- time-to-first-paint: время первого прогона app.py через streamlit AppTest
+  (без тяжёлого стека crew благодаря ленивому импорту).
+
+Примеры:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --module crew --top 15
+    python benchmarks/startup.py --max-first-paint-ms 1500   # exit 1 при регрессии
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time_breakdown(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """Запускает `python -X importtime -c "import <module>"` в чистом процессе.
+
+    Args:
+        module: Импортируемый модуль.
+
+    Returns:
+        Общее время импорта в мс и список (пакет, собственное время в мс),
+        отсортированный по убыванию.
+    """
+    env = {**os.environ, "APP_WARMUP": "0"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    per_package: Dict[str, float] = defaultdict(float)
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        except ValueError:
+            continue
+        name = name.strip()
+        per_package[name.split(".")[0]] += int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} завершился с ошибкой:\n{proc.stderr[-2000:]}")
+    ranked = sorted(((pkg, us / 1000) for pkg, us in per_package.items()), key=lambda x: -x[1])
+    return total_us / 1000, ranked
+
+
+def time_to_first_paint(script: str = "app.py", runs: int = 3) -> float:
+    """Медиана времени первого прогона скрипта через streamlit AppTest в свежем процессе.
+
+    Args:
+        script: Путь к Streamlit приложению относительно корня репозитория.
+        runs: Количество запусков.
+
+    Returns:
+        Медианное время в мс.
+    """
+    code = (
+        "import time; t = time.perf_counter();"
+        "from streamlit.testing.v1 import AppTest;"
+        f"AppTest.from_file({script!r}, default_timeout=120).run();"
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    env = {**os.environ, "APP_WARMUP": "0"}
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"AppTest завершился с ошибкой:\n{proc.stderr[-2000:]}")
+        samples.append(float(proc.stdout.strip().splitlines()[-1]))
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк старта app.py")
+    parser.add_argument("--module", default="app", help="Модуль для разбивки -X importtime")
+    parser.add_argument("--top", type=int, default=10, help="Сколько пакетов показать")
+    parser.add_argument("--runs", type=int, default=3, help="Запусков для time-to-first-paint")
+    parser.add_argument("--max-first-paint-ms", type=float, default=None, help="Порог регрессии")
+    parser.add_argument("--skip-paint", action="store_true", help="Только разбивка импортов")
+    args = parser.parse_args()
+
+    total_ms, ranked = import_time_breakdown(args.module)
+    print(f"import {args.module}: {total_ms:.1f} ms")
+    for pkg, ms in ranked[:args.top]:
+        print(f"  {pkg:<30} {ms:8.1f} ms")
+
+    if args.skip_paint:
+        return 0
+    paint_ms = time_to_first_paint(runs=args.runs)
+    print(f"time-to-first-paint (AppTest, медиана {args.runs}): {paint_ms:.1f} ms")
+    if args.max_first_paint_ms is not None and paint_ms > args.max_first_paint_ms:
+        print(f"РЕГРЕССИЯ: {paint_ms:.1f} ms > {args.max_first_paint_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
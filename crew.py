@@ -1,27 +1,69 @@
+import logging
 import os
-from typing import Optional, List
+from typing import ClassVar, Optional, List, Type
 from dotenv import load_dotenv
 load_dotenv(override=True)
 os.environ["CREWAI_TELEMETRY_OPT_OUT"] = "true"
 os.environ["OTEL_SDK_DISABLED"] = "true"
 os.environ["LITELLM_LOG"] = "ERROR"
 from crewai import Agent, Task, Crew, LLM
+from crewai.utilities.converter import Converter
 from crewai_tools import FileReadTool
-from agents.factory import create_dwh_agents
-from utils.file_utils import get_project_info, is_path_valid, scan_project_structure, find_key_files
-from models.schemas import ResearchTeamResponse
+from pydantic import BaseModel
+from agents.budget import RequestBudget, format_budget
+from agents.cassette import ReplayLLM, record_llm
+from agents.checkpoint import CheckpointedTask, RunCheckpoint, format_resume
+from agents.delegation import DelegationController, format_delegation
+from agents.factory import create_architect, create_dwh_agents, create_python_developer, create_researcher, create_sql_developer, create_tester
+from utils.file_utils import get_project_info, is_path_valid
+from utils.llm_limiter import limit_llm
+from utils.project_index import get_project_index
+from utils.structured import guided_decoding_params, parse_structured, schema_prompt
+from models.schemas import DWH_OUTPUT_SCHEMAS, ResearchTeamResponse
+from pipelines.digests import relevant_digests
+from tools.batch_read import BatchReadTool
+from tools.data_profile import DataProfileTool
+from tools.project_tree import ProjectTreeTool
+from tools.sql_lint import SqlLintTool
+from tools.sql_sandbox import SqlExplainTool
+from tools.pytest_runner import PytestRunTool
 
+logger = logging.getLogger(__name__)
 
-def get_llm(provider: str, temperature: float = 0.7) -> LLM:
+# RequestBudget, RunCheckpoint, DelegationController и format_* — реэкспорт:
+# app.py и batch.py получают API запроса через модуль crew
+__all__ = [
+    "AGENT_TEMPERATURES",
+    "DelegationController",
+    "RequestBudget",
+    "RunCheckpoint",
+    "create_crew",
+    "create_cross_project_synthesis_crew",
+    "create_docs_group_crew",
+    "create_docs_synthesis_crew",
+    "create_dwh_crew",
+    "create_file_review_crew",
+    "create_module_doc_crew",
+    "format_budget",
+    "format_delegation",
+    "format_resume",
+    "get_llm",
+]
+
+
+def get_llm(provider: str, temperature: float = 0.7, response_schema: Optional[Type[BaseModel]] = None) -> LLM:
+    # Ограниченное декодирование по JSON Schema (vLLM guided_json, Ollama json_schema)
+    guided = guided_decoding_params(provider, response_schema) if response_schema else {}
     if provider == "zai":
         api_key = os.getenv("ZAI_API_KEY")
         if not api_key or api_key == "your_api_key_here":
             raise ValueError("Для провайдера 'zai' нужно указать ZAI_API_KEY в .env")
-        return LLM(
+        llm = LLM(
             model=os.getenv("ZAI_MODEL", "zai/zai-model"),
             api_key=api_key,
             api_base=os.getenv("ZAI_BASE_URL", "https://api.zai.ai/v1"),
-            temperature=temperature
+            temperature=temperature,
+            **guided
         )
     elif provider == "ollama":
         base = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")
@@ -29,27 +71,68 @@ def get_llm(provider: str, temperature: float = 0.7) -> LLM:
             base = base[:-1]
         if not base.endswith("/v1"):
             base = f"{base}/v1"
-        return LLM(
+        llm = LLM(
             model=os.getenv("OLLAMA_MODEL", "mistral"),
             api_base=base,
             api_key="dummy",
             provider="openai",
-            temperature=temperature
+            temperature=temperature,
+            **guided
         )
+    elif provider == "replay":
+        # Ответы из кассеты (benchmarks/llm_replay.py) без обращения к модели и без лимита параллельности
+        return ReplayLLM(temperature=temperature)
     elif provider == "vllm":
         base = os.getenv("VLLM_BASE_URL", "http://localhost:8000/v1")
         if base.endswith("/"):
             base = base[:-1]
         if not base.endswith("/v1"):
             base = f"{base}/v1"
-        return LLM(
+        llm = LLM(
             model=os.getenv("VLLM_MODEL", "openai/meta-llama/Llama-2-7b-chat-hf"),
             api_key=os.getenv("VLLM_API_KEY", "dummy"),
             api_base=base,
-            temperature=temperature
+            temperature=temperature,
+            **guided
         )
     else:
         raise ValueError(f"Unknown provider: {provider}")
+    # Общий на процесс адаптивный лимит параллельных вызовов провайдера
+    return limit_llm(record_llm(llm), provider)
+
+
+class GuidedConverter(Converter):
+    """Конвертер structured output без лишних LLM раундов.
+
+    Порядок: локальный ремонт JSON -> один вызов с ограниченным декодированием
+    по схеме -> стандартные повторные попытки CrewAI.
+    """
+    provider: ClassVar[str] = "ollama"
+
+    def to_pydantic(self, current_attempt: int = 1) -> BaseModel:
+        parsed = parse_structured(self.text, self.model)
+        if parsed is not None:
+            return parsed
+        if current_attempt == 1 and guided_decoding_params(self.provider, self.model):
+            try:
+                llm = get_llm(self.provider, temperature=0.0, response_schema=self.model)
+                response = llm.call([
+                    {"role": "system", "content": self.instructions},
+                    {"role": "user", "content": self.text},
+                ])
+                parsed = parse_structured(str(response), self.model)
+                if parsed is not None:
+                    return parsed
+            except Exception as e:
+                # Ошибка не фатальна (дальше повторы CrewAI), но неверная настройка декодирования должна быть видна
+                logger.warning("Ограниченное декодирование (%s) не удалось: %s: %s",
+                               self.provider, type(e).__name__, e)
+        return super().to_pydantic(current_attempt)
+
+
+def guided_converter(provider: str) -> Type[GuidedConverter]:
+    """Возвращает класс GuidedConverter, привязанный к провайдеру (Task.converter_cls)."""
+    return type(f"GuidedConverter_{provider}", (GuidedConverter,), {"provider": provider, "__module__": __name__})
 
 
 # Оптимальные температуры для разных ролей
@@ -88,24 +171,35 @@ def create_agents(provider: str, project_path: Optional[str] = None, verbose: bo
     return researcher, writer
 
 
-def create_crew(topic: str, provider: str = "ollama", structured_output: bool = False, verbose: bool = True) -> Crew:
+def format_history(history: str) -> str:
+    if not history:
+        return ""
+    return f"\nИстория диалога (используй для уточняющих вопросов):\n{history}\n"
+
+
+def create_crew(topic: str, provider: str = "ollama", structured_output: bool = False, verbose: bool = True, history: str = "") -> Crew:
     researcher, writer = create_agents(provider, verbose=verbose)
+    history_block = format_history(history)
     
     if structured_output:
-        research_task = Task(
-            description=f'Проведи исследование темы "{topic}". Верни ТОЛЬКО валидный JSON по схеме: topic, research_content, article_content, success, metadata.',
+        research_task = CheckpointedTask(
+            name="research",
+            description=f'{history_block}Проведи исследование темы "{topic}". Верни ТОЛЬКО валидный JSON по JSON Schema:\n{schema_prompt(ResearchTeamResponse)}',
             expected_output="JSON с исследованием и статьей на русском языке.",
             agent=researcher,
-            output_pydantic=ResearchTeamResponse
+            output_pydantic=ResearchTeamResponse,
+            converter_cls=guided_converter(provider)
         )
     else:
-        research_task = Task(
-            description=f'Проведи исследование темы "{topic}". Дай 7-10 пунктов: факты/идеи/термины + короткие источники (если знаешь).',
+        research_task = CheckpointedTask(
+            name="research",
+            description=f'{history_block}Проведи исследование темы "{topic}". Дай 7-10 пунктов: факты/идеи/термины + короткие источники (если знаешь).',
             expected_output="Краткое исследование по теме в виде пунктов.",
             agent=researcher
         )
     
-    write_task = Task(
+    write_task = CheckpointedTask(
+        name="write",
         description=f'Напиши короткую статью на русском по теме "{topic}" на основе исследования выше. Структура: 1) Введение 2) Основные тезисы 3) Вывод.',
         expected_output="Готовая статья, понятная и информативная.",
         agent=writer
@@ -120,8 +214,14 @@ def create_crew(topic: str, provider: str = "ollama", structured_output: bool =
     return crew
 
 
-def create_dwh_crew(project_name: str, user_request: str, provider: str = "ollama", selected_agents: Optional[List[str]] = None, verbose: bool = True) -> Crew:
-    project_info = get_project_info(project_name)
+def create_dwh_crew(project_name: str, user_request: str, provider: str = "ollama", selected_agents: Optional[List[str]] = None, verbose: bool = True, history: str = "", output_schema: Optional[str] = None, delegation: Optional[DelegationController] = None, config_path: str = "config.yaml") -> Crew:
+    output_model = None
+    if output_schema:
+        output_model = DWH_OUTPUT_SCHEMAS.get(output_schema)
+        if output_model is None:
+            raise ValueError(f"Неизвестная схема ответа: {output_schema}")
+
+    project_info = get_project_info(project_name, config_path)
     if not project_info:
         raise ValueError(f"Проект '{project_name}' не найден в конфигурации")
 
@@ -130,7 +230,14 @@ def create_dwh_crew(project_name: str, user_request: str, provider: str = "ollam
         raise ValueError(f"Путь к проекту не существует: {project_path}")
 
     file_read_tool = FileReadTool()
-    tools = [file_read_tool]
+    tools = [
+        file_read_tool,
+        BatchReadTool(project_path=project_path),
+        ProjectTreeTool(project_path=project_path),
+        DataProfileTool(project_path=project_path),
+        SqlExplainTool(project_path=project_path),
+        SqlLintTool(project_path=project_path),
+    ]
 
     # Создаём фабрику LLM с нужной температурой
     def llm_factory(temperature: float):
@@ -152,14 +259,29 @@ def create_dwh_crew(project_name: str, user_request: str, provider: str = "ollam
                 keep.add(key)
         agents = {k: v for k, v in agents.items() if k in keep}
 
+    # Запуск тестов - только у тестировщика: остальные получают реальные результаты через него
+    if "tester" in agents:
+        agents["tester"].tools = list(agents["tester"].tools or []) + [PytestRunTool(project_path=project_path)]
+
+    # Делегирование с лимитами переходов и защитой от циклов (секция delegation проекта)
+    delegation = delegation or DelegationController.from_config(project_info.get("delegation"))
+    delegation.attach(agents)
+
     manager_agent = agents["manager"]
 
-    # Автоматическое сканирование структуры проекта
-    project_structure = scan_project_structure(project_path, max_depth=2, max_files=40)
-    
-    # Автоматическое определение ключевых файлов
-    key_files = find_key_files(project_path, max_files=12)
+    # Структура и ключевые файлы берутся из кэшированного индекса проекта
+    index = get_project_index(project_path)
+    project_structure = index.structure
+    key_files = index.key_files
     key_files_list = "\n    ".join(f"- {f}" for f in key_files) if key_files else "- (не найдены)"
+    # Заранее построенные описания файлов (batch.py --digests-all): без вызовов LLM
+    digests = relevant_digests(project_name, user_request, key_files, project_path)
+    digests_block = ""
+    if digests:
+        digests_block = f"""
+    Описания файлов и директорий (дайджест, сверяй с кодом перед изменениями):
+    {digests}
+"""
 
     context = f"""
     Проект: {project_name}
@@ -171,8 +293,15 @@ def create_dwh_crew(project_name: str, user_request: str, provider: str = "ollam
     Структура проекта:
     {project_structure}
 
-    Ключевые файлы (автоматически определены, можно читать через FileReadTool):
+    Ключевые файлы (автоматически определены, можно читать через FileReadTool или "Read project files"):
     {key_files_list}
+{digests_block}
+    Остальные файлы можно просматривать постранично инструментом "Browse project directory".
+    Несколько файлов (SQL модель и её источники, модуль и тесты) читай одним вызовом "Read project files".
+    Файлы данных (CSV/Parquet) не читай целиком - смотри их схему инструментом "Profile data file".
+    Оптимизированный SQL проверяй инструментом "Explain SQL query" (план и использование индексов).
+    Очевидные проблемы SQL файлов уже находит "Lint SQL performance" - начинай с его замечаний.
+    QA Tester запускает тесты проекта ("Run project tests") - о работоспособности кода суди по их результатам.
 
     Доступные агенты:
     - Исследователь: анализирует структуру проекта и код
@@ -182,24 +311,32 @@ def create_dwh_crew(project_name: str, user_request: str, provider: str = "ollam
     - QA Tester: обеспечивает качество кода и данных
     """
 
-    main_task = Task(
+    structured_rule = ""
+    if output_model:
+        structured_rule = f"- Финальный ответ верни ТОЛЬКО валидным JSON по JSON Schema: {schema_prompt(output_model)}"
+
+    main_task = CheckpointedTask(
+        name="main",
         description=f"""
         Ты технический руководитель DWH команды. Выполни запрос пользователя максимально быстро и по делу.
 
         Контекст проекта:
         {context}
-
+        {format_history(history)}
         Запрос пользователя: {user_request}
 
         Правила:
         - Если вопрос "что это за проект" (или близко) — ответь сам кратко (5-8 пунктов), без делегирования.
         - Иначе делегируй максимум 1-2 агентам (если они доступны) и попроси их выполнить узкую часть задачи.
-        - Не перечисляй весь проект рекурсивно. Читай только 1-3 конкретных файла через FileReadTool.
+        - Не перечисляй весь проект рекурсивно. Читай только нужные файлы, несколько сразу - одним вызовом "Read project files".
         - У тебя ЕСТЬ доступ к инструментам чтения файлов. Никогда не отвечай фразами вида "I can't access files/tools".
         - Финальный ответ: на русском, структурировано, с конкретными шагами/рекомендациями.
+        {structured_rule}
         """,
         expected_output="Координированный результат работы всей команды с решениями, кодом и рекомендациями, или описание мультиагентной системы.",
-        agent=manager_agent
+        agent=manager_agent,
+        output_pydantic=output_model,
+        converter_cls=guided_converter(provider) if output_model else None
     )
 
     crew = Crew(
@@ -211,6 +348,174 @@ def create_dwh_crew(project_name: str, user_request: str, provider: str = "ollam
     return crew
 
 
+def create_file_review_crew(project_name: str, rel_path: str, content: str, provider: str = "ollama",
+                            verbose: bool = True, static_findings: str = "") -> Crew:
+    """Создаёт crew для code review одного файла (содержимое передаётся в задаче).
+
+    Args:
+        project_name: Название проекта.
+        rel_path: Путь к файлу относительно корня проекта.
+        content: Содержимое файла.
+        provider: LLM провайдер.
+        verbose: Подробный вывод.
+        static_findings: Замечания статического анализа, которые не нужно искать заново.
+    """
+    if rel_path.endswith(".sql"):
+        agent = create_sql_developer(get_llm(provider, AGENT_TEMPERATURES["sql_dev"]), verbose=verbose)
+    elif "test" in os.path.basename(rel_path):
+        agent = create_tester(get_llm(provider, AGENT_TEMPERATURES["tester"]), verbose=verbose)
+    else:
+        agent = create_python_developer(get_llm(provider, AGENT_TEMPERATURES["python_dev"]), verbose=verbose)
+    # Один агент, файл уже в контексте: делегирование и инструменты не нужны
+    agent.allow_delegation = False
+
+    static_block = ""
+    if static_findings:
+        static_block = f"""
+        Статический анализ уже нашёл (не повторяй их, предложи конкретные исправления):
+        {static_findings}
+        """
+
+    task = Task(
+        description=f"""
+        Сделай code review файла `{rel_path}` проекта {project_name}.
+
+        Содержимое файла:
+        ```
+        {content}
+        ```
+        {static_block}
+        Дай 3-7 конкретных замечаний: место (строка/фрагмент), проблема, как исправить.
+        Приоритет: ошибки, производительность, безопасность, читаемость.
+        Если существенных проблем нет - ответь "Замечаний нет".
+        """,
+        expected_output="Список замечаний по файлу на русском языке.",
+        agent=agent
+    )
+
+    return Crew(agents=[agent], tasks=[task], verbose=verbose)
+
+
+def create_module_doc_crew(project_name: str, module: str, files_content: str, provider: str = "ollama", verbose: bool = True) -> Crew:
+    """Создаёт crew для документации одного модуля (map шаг).
+
+    Args:
+        project_name: Название проекта.
+        module: Имя модуля (директория и часть файлов).
+        files_content: Содержимое файлов модуля с заголовками путей.
+        provider: LLM провайдер.
+        verbose: Подробный вывод.
+    """
+    agent = create_researcher(get_llm(provider, AGENT_TEMPERATURES["researcher"]), verbose=verbose)
+    agent.allow_delegation = False
+
+    task = Task(
+        description=f"""
+        Составь документацию модуля `{module}` проекта {project_name} по его исходному коду.
+
+        {files_content}
+
+        Формат (markdown, кратко): назначение модуля, ключевые функции/классы/таблицы
+        с одной строкой описания, входы и выходы, зависимости от других модулей.
+        """,
+        expected_output="Краткая markdown документация модуля на русском языке.",
+        agent=agent
+    )
+
+    return Crew(agents=[agent], tasks=[task], verbose=verbose)
+
+
+def create_docs_group_crew(project_name: str, module_docs: str, provider: str = "ollama", verbose: bool = True) -> Crew:
+    """Создаёт crew, сжимающий документацию группы модулей (промежуточный reduce шаг).
+
+    Args:
+        project_name: Название проекта.
+        module_docs: Документация модулей группы.
+        provider: LLM провайдер.
+        verbose: Подробный вывод.
+    """
+    agent = create_architect(get_llm(provider, AGENT_TEMPERATURES["architect"]), verbose=verbose)
+    agent.allow_delegation = False
+
+    task = Task(
+        description=f"""
+        Сведи документацию группы модулей проекта {project_name} в сжатое описание.
+
+        {module_docs}
+
+        Для каждого модуля сохрани путь и одну-две строки о назначении, затем
+        опиши связи между модулями группы и их внешние зависимости.
+        """,
+        expected_output="Сжатая markdown документация группы модулей на русском языке.",
+        agent=agent
+    )
+
+    return Crew(agents=[agent], tasks=[task], verbose=verbose)
+
+
+def create_docs_synthesis_crew(project_name: str, module_docs: str, provider: str = "ollama", verbose: bool = True) -> Crew:
+    """Создаёт crew, собирающий документацию проекта из документации модулей (reduce шаг).
+
+    Args:
+        project_name: Название проекта.
+        module_docs: Документация модулей.
+        provider: LLM провайдер.
+        verbose: Подробный вывод.
+    """
+    project_info = get_project_info(project_name) or {}
+    agent = create_architect(get_llm(provider, AGENT_TEMPERATURES["architect"]), verbose=verbose)
+    agent.allow_delegation = False
+
+    task = Task(
+        description=f"""
+        Составь обзорную документацию проекта {project_name}.
+        Описание: {project_info.get('description', 'Нет описания')}
+        Технологии: {', '.join(project_info.get('tech_stack', []))}
+
+        Документация модулей:
+        {module_docs}
+
+        Структура: 1) Назначение проекта 2) Архитектура и поток данных между модулями
+        3) Обзор модулей (по одному абзацу) 4) Как запускать и тестировать.
+        Не повторяй документацию модулей дословно.
+        """,
+        expected_output="Обзорная markdown документация проекта на русском языке.",
+        agent=agent
+    )
+
+    return Crew(agents=[agent], tasks=[task], verbose=verbose)
+
+
+def create_cross_project_synthesis_crew(user_request: str, project_answers: str, provider: str = "ollama",
+                                        verbose: bool = True) -> Crew:
+    """Создаёт crew, сводящий ответы DWH команд нескольких проектов в общий вывод.
+
+    Args:
+        user_request: Исходный запрос пользователя.
+        project_answers: Ответы по проектам с заголовками.
+        provider: LLM провайдер.
+        verbose: Подробный вывод.
+    """
+    agent = create_architect(get_llm(provider, AGENT_TEMPERATURES["architect"]), verbose=verbose)
+    agent.allow_delegation = False
+
+    task = Task(
+        description=f"""
+        Запрос пользователя был выполнен по нескольким DWH проектам: {user_request}
+
+        Ответы по проектам:
+        {project_answers}
+
+        Сформируй общий вывод (5-10 пунктов): что общего, чем проекты отличаются, где нужны действия
+        (с названием проекта). Не пересказывай ответы проектов целиком.
+        """,
+        expected_output="Сводный вывод по проектам на русском языке.",
+        agent=agent
+    )
+
+    return Crew(agents=[agent], tasks=[task], verbose=verbose)
+
+
 if __name__ == "__main__":
     topic = "Искусственный интеллект в современном мире"
     provider = "ollama"
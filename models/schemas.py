@@ -89,4 +89,13 @@ class ResearchTeamResponse(BaseModel):
     research_content: str = Field(description="Содержание исследования")
     article_content: str = Field(description="Сгенерированная статья")
     success: bool = Field(default=True, description="Успешность выполнения")
-    metadata: Dict[str, Any] = Field(default_factory=dict, description="Метаданные выполнения")
\ No newline at end of file
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Метаданные выполнения")
+
+# Схемы structured output для DWH команды (ключ -> модель финального ответа)
+DWH_OUTPUT_SCHEMAS = {
+    "analysis": DWHProjectAnalysis,
+    "python": PythonCodeSolution,
+    "sql": SQLQuerySolution,
+    "architecture": ArchitectureDesign,
+    "tests": TestRecommendations,
+}
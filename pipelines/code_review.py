@@ -0,0 +1,250 @@
+"""Инкрементальный code review проекта на основе git истории.
+
+Ревьюятся только файлы, изменённые с последнего проверенного коммита
+(плюс незакоммиченные изменения). Результаты хранятся по git blob хэшу
+содержимого, поэтому неизменённые файлы берутся из кэша, а итоговый
+ответ собирается из свежих и закэшированных замечаний.
+"""
+
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from utils.cache import JsonStore, cache_dir, file_hash, slugify
+from utils.file_utils import get_file_content, get_project_files, get_project_info, is_path_valid
+from utils.llm_limiter import pool_size
+from utils.sql_lint import SEVERITY_ICONS, LintReport, lint_project
+
+REVIEW_PROMPT = "Сделай code review проекта"
+REVIEW_EXTENSIONS = [".py", ".sql", ".yaml", ".yml", ".sh", ".toml", ".cfg", ".ini"]
+NO_FINDINGS = "Замечаний нет"
+
+
+@dataclass
+class ReviewResult:
+    """Итог инкрементального review."""
+    answer: str
+    reviewed: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    pending: List[str] = field(default_factory=list)
+    head: Optional[str] = None
+    token_usage: Dict[str, int] = field(default_factory=dict)
+    budget: Dict[str, Any] = field(default_factory=dict)
+
+
+def _git(project_path: str, *args: str) -> Optional[str]:
+    try:
+        proc = subprocess.run(
+            ["git", "-C", project_path, *args],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def git_head(project_path: str) -> Optional[str]:
+    """Возвращает sha текущего HEAD или None, если это не git репозиторий."""
+    out = _git(project_path, "rev-parse", "HEAD")
+    return out.strip() if out else None
+
+
+def _is_reviewable(rel_path: str) -> bool:
+    return any(rel_path.endswith(ext) for ext in REVIEW_EXTENSIONS)
+
+
+def list_reviewable_files(project_path: str) -> List[str]:
+    """Возвращает относительные пути файлов, подлежащих review.
+
+    В git репозитории берутся отслеживаемые и неигнорируемые новые файлы,
+    иначе - обход директории.
+    """
+    out = _git(project_path, "ls-files", "--cached", "--others", "--exclude-standard")
+    if out is not None:
+        files = out.splitlines()
+    else:
+        files = [os.path.relpath(p, project_path) for p in get_project_files(project_path, REVIEW_EXTENSIONS)]
+    return sorted(
+        {f for f in files if _is_reviewable(f) and os.path.isfile(os.path.join(project_path, f))}
+    )
+
+
+def changed_files(project_path: str, since_commit: Optional[str]) -> Optional[List[str]]:
+    """Файлы, изменённые с since_commit, включая незакоммиченные изменения.
+
+    Args:
+        project_path: Путь к проекту.
+        since_commit: Последний проверенный коммит.
+
+    Returns:
+        Список относительных путей или None, если diff получить нельзя
+        (не git репозиторий, первый запуск, коммит пропал после rebase).
+    """
+    if not since_commit:
+        return None
+    committed = _git(project_path, "diff", "--name-only", f"{since_commit}..HEAD")
+    if committed is None:
+        return None
+    worktree = _git(project_path, "diff", "--name-only", "HEAD") or ""
+    untracked = _git(project_path, "ls-files", "--others", "--exclude-standard") or ""
+    names = set(committed.splitlines()) | set(worktree.splitlines()) | set(untracked.splitlines())
+    return sorted(n for n in names if n and _is_reviewable(n))
+
+
+def _review_store(project_name: str) -> JsonStore:
+    return JsonStore(os.path.join(cache_dir("review"), f"{slugify(project_name)}.json"))
+
+
+def _lint_context(lint: Optional[LintReport], rel_path: str) -> str:
+    if lint is None:
+        return ""
+    return "\n".join(
+        f"- строка {f.line} [{f.rule}]: {f.message}" for f in lint.for_file(rel_path)
+    )
+
+
+def _review_file(project_info: Dict, rel_path: str, provider: str, verbose: bool, max_lines: int,
+                 static_findings: str = "", config_path: str = "config.yaml") -> Dict:
+    from agents.budget import run_with_budget
+    from crew import create_file_review_crew
+
+    content = get_file_content(os.path.join(project_info["path"], rel_path), max_lines=max_lines)
+    crew = create_file_review_crew(project_info["name"], rel_path, content, provider, verbose, static_findings)
+    result, report = run_with_budget(crew.kickoff, project_info, config_path)
+    return {"review": str(result), "usage": result.token_usage.model_dump(), "budget": report}
+
+
+def run_code_review(
+    project_name: str,
+    provider: str = "ollama",
+    verbose: bool = False,
+    max_files: int = 20,
+    workers: Optional[int] = None,
+    max_lines: int = 400,
+    config_path: str = "config.yaml",
+) -> ReviewResult:
+    """Выполняет инкрементальный code review проекта.
+
+    Args:
+        project_name: Название проекта из config.yaml.
+        provider: LLM провайдер.
+        verbose: Подробный вывод CrewAI.
+        max_files: Максимум файлов, отправляемых в LLM за один запуск.
+        workers: Сколько файлов ревьюить параллельно (по умолчанию - максимум окна лимитера провайдера).
+        max_lines: Сколько строк файла передавать в review.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        ReviewResult с итоговым ответом.
+
+    Raises:
+        ValueError: Если проект не найден или путь не существует.
+    """
+    from agents.budget import combine_reports
+
+    project_info = get_project_info(project_name, config_path)
+    if not project_info:
+        raise ValueError(f"Проект '{project_name}' не найден в конфигурации")
+    project_path = project_info["path"]
+    if not is_path_valid(project_path):
+        raise ValueError(f"Путь к проекту не существует: {project_path}")
+
+    store = _review_store(project_name)
+    reviews: Dict[str, str] = store.get("reviews", {})
+    head = git_head(project_path)
+
+    all_files = list_reviewable_files(project_path)
+    blobs = {}
+    for rel_path in all_files:
+        try:
+            blobs[rel_path] = file_hash(os.path.join(project_path, rel_path))
+        except OSError:
+            continue
+
+    diff = changed_files(project_path, store.get("last_commit"))
+    candidates = diff if diff is not None else all_files
+    # Даже в diff файл мог вернуться к уже проверенному содержимому
+    to_review = [f for f in candidates if f in blobs and blobs[f] not in reviews]
+    batch, pending = to_review[:max_files], to_review[max_files:]
+
+    # Детерминированные замечания по SQL: LLM получает их готовыми и не ищет заново
+    lint = lint_project(project_path) if any(f.endswith(".sql") for f in all_files) else None
+
+    usage: Dict[str, int] = {}
+    reports: List[Dict[str, Any]] = []
+    fresh: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers or pool_size(provider))) as pool:
+        futures = {
+            rel_path: pool.submit(_review_file, project_info, rel_path, provider, verbose,
+                                  max_lines, _lint_context(lint, rel_path), config_path)
+            for rel_path in batch
+        }
+        for rel_path, future in futures.items():
+            try:
+                outcome = future.result()
+            except Exception as e:
+                fresh[rel_path] = f"❌ Не удалось проверить: {e}"
+                pending.append(rel_path)
+                continue
+            fresh[rel_path] = outcome["review"]
+            reviews[blobs[rel_path]] = outcome["review"]
+            for key, value in outcome["usage"].items():
+                usage[key] = usage.get(key, 0) + value
+            reports.append(outcome["budget"])
+
+    # Храним только ревью актуальных версий файлов
+    live = set(blobs.values())
+    store.set("reviews", {h: r for h, r in reviews.items() if h in live})
+    if not pending:
+        store.set("last_commit", head)
+    store.set("updated_at", time.time())
+    store.save()
+
+    cached = [f for f in all_files if f not in fresh and blobs.get(f) in reviews]
+    answer = format_review(project_name, head, fresh, {f: reviews[blobs[f]] for f in cached}, pending, lint)
+    return ReviewResult(
+        answer=answer,
+        reviewed=sorted(fresh),
+        cached=cached,
+        pending=pending,
+        head=head,
+        token_usage=usage,
+        budget=combine_reports(reports),
+    )
+
+
+def format_review(project_name: str, head: Optional[str], fresh: Dict[str, str],
+                  cached: Dict[str, str], pending: List[str], lint: Optional[LintReport] = None) -> str:
+    """Собирает итоговый markdown из свежих и закэшированных замечаний и статического анализа SQL."""
+    lines = [f"## 🔍 Code review: {project_name}"]
+    if head:
+        lines.append(f"Коммит: `{head[:10]}`")
+    lines.append(
+        f"Проверено сейчас: {len(fresh)}, из кэша: {len(cached)}"
+        + (f", отложено: {len(pending)}" if pending else "")
+    )
+    if fresh:
+        lines.append("\n### Изменённые файлы")
+        for rel_path, review in sorted(fresh.items()):
+            lines.append(f"\n#### `{rel_path}`\n{review.strip()}")
+    with_findings = {f: r for f, r in cached.items() if NO_FINDINGS not in r}
+    if with_findings:
+        lines.append("\n### Ранее найденные замечания (файлы без изменений)")
+        for rel_path, review in sorted(with_findings.items()):
+            lines.append(f"\n#### `{rel_path}`\n{review.strip()}")
+    if pending:
+        lines.append("\n### Ещё не проверены (превышен лимит за запуск)")
+        lines.extend(f"- `{f}`" for f in pending)
+    if lint is not None and lint.findings:
+        lines.append(f"\n### Статический анализ SQL ({len(lint.findings)})")
+        lines.extend(
+            f"- {SEVERITY_ICONS[f.severity]} `{f.file}:{f.line}` [{f.rule}]: {f.message}" for f in lint.findings
+        )
+    if not fresh and not with_findings and not pending and not (lint and lint.findings):
+        lines.append("\nИзменений с последнего review нет, замечаний нет.")
+    return "\n".join(lines)
@@ -0,0 +1,214 @@
+"""Один запрос ко всем (или отмеченным тегами) проектам из config.yaml.
+
+Для каждого проекта параллельно (с ограничением по провайдеру) запускается
+DWH команда, которая использует закэшированный индекс проекта. Ответы
+сводятся в один: отдельный шаг синтеза формирует общий вывод, под ним -
+ответы по проектам.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from utils.file_utils import is_path_valid, load_config
+from utils.llm_limiter import pool_size
+from utils.project_index import get_project_index
+
+NOT_RELEVANT = "Не относится"
+
+
+@dataclass
+class ProjectAnswer:
+    """Ответ DWH команды по одному проекту."""
+    project: str
+    status: str
+    answer: str = ""
+    error: str = ""
+    duration_s: float = 0.0
+    token_usage: Dict[str, int] = field(default_factory=dict)
+    budget: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class CrossProjectResult:
+    """Сводный ответ по нескольким проектам."""
+    answer: str
+    results: List[ProjectAnswer] = field(default_factory=list)
+    token_usage: Dict[str, int] = field(default_factory=dict)
+    budget: Dict[str, Any] = field(default_factory=dict)
+
+
+def list_project_tags(config_path: str = "config.yaml") -> List[str]:
+    """Возвращает все теги проектов из конфигурации (поле tags)."""
+    try:
+        config = load_config(config_path)
+    except FileNotFoundError:
+        return []
+    return sorted({tag for p in config.get("projects", []) for tag in p.get("tags") or []})
+
+
+def select_projects(tags: Optional[List[str]] = None, names: Optional[List[str]] = None,
+                    config_path: str = "config.yaml") -> List[Dict]:
+    """Выбирает проекты из конфигурации по тегам и/или именам.
+
+    Args:
+        tags: Проект подходит, если у него есть хотя бы один из тегов; None - без фильтра.
+        names: Явный список имён проектов; None - без фильтра.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        Описания проектов из config.yaml.
+    """
+    projects = load_config(config_path).get("projects", [])
+    if tags:
+        wanted = set(tags)
+        projects = [p for p in projects if wanted & set(p.get("tags") or [])]
+    if names:
+        projects = [p for p in projects if p["name"] in names]
+    return projects
+
+
+def _add_usage(total: Dict[str, int], usage: Dict[str, int]):
+    for key, value in usage.items():
+        total[key] = total.get(key, 0) + value
+
+
+def _is_relevant(result: ProjectAnswer) -> bool:
+    return result.status == "ok" and NOT_RELEVANT.lower() not in result.answer.strip().lower()[:60]
+
+
+def _per_project_request(user_request: str) -> str:
+    return (
+        f"{user_request}\n\n"
+        "Ответ войдёт в сводку по нескольким проектам: отвечай кратко и только по этому проекту, "
+        f"с путями файлов. Если вопрос к проекту не относится - ответь одной фразой \"{NOT_RELEVANT}\"."
+    )
+
+
+def _run_project(project_info: Dict, user_request: str, provider: str,
+                 selected_agents: Optional[List[str]], verbose: bool, config_path: str) -> ProjectAnswer:
+    from agents.budget import run_with_budget
+    from crew import create_dwh_crew
+
+    project_name = project_info["name"]
+    started = time.time()
+    try:
+        crew = create_dwh_crew(project_name, _per_project_request(user_request), provider,
+                               selected_agents=selected_agents, verbose=verbose, config_path=config_path)
+        # Свой бюджет на проект: контекст запроса не переходит в поток пула
+        result, report = run_with_budget(crew.kickoff, project_info, config_path)
+    except Exception as e:
+        return ProjectAnswer(project=project_name, status="error", error=f"{type(e).__name__}: {e}",
+                             duration_s=round(time.time() - started, 3))
+    return ProjectAnswer(
+        project=project_name,
+        status="ok",
+        answer=str(result),
+        duration_s=round(time.time() - started, 3),
+        token_usage=result.token_usage.model_dump(),
+        budget=report,
+    )
+
+
+def run_cross_project(
+    user_request: str,
+    provider: str = "ollama",
+    tags: Optional[List[str]] = None,
+    projects: Optional[List[str]] = None,
+    selected_agents: Optional[List[str]] = None,
+    verbose: bool = False,
+    workers: Optional[int] = None,
+    synthesize: bool = True,
+    config_path: str = "config.yaml",
+) -> CrossProjectResult:
+    """Выполняет запрос по нескольким проектам параллельно и сводит ответы.
+
+    Args:
+        user_request: Запрос пользователя.
+        provider: LLM провайдер.
+        tags: Фильтр проектов по тегам.
+        projects: Фильтр проектов по именам.
+        selected_agents: Агенты DWH команды.
+        verbose: Подробный вывод CrewAI.
+        workers: Сколько проектов обрабатывать одновременно (по умолчанию - максимум окна лимитера провайдера).
+        synthesize: Сформировать общий вывод отдельным LLM шагом.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        CrossProjectResult со сводным ответом.
+
+    Raises:
+        ValueError: Если под фильтр не попал ни один проект.
+    """
+    selected = select_projects(tags, projects, config_path)
+    if not selected:
+        raise ValueError("Под фильтр не попал ни один проект из config.yaml")
+
+    results: List[ProjectAnswer] = []
+    runnable = []
+    for project in selected:
+        if is_path_valid(project.get("path", "")):
+            runnable.append(project)
+        else:
+            results.append(ProjectAnswer(project=project["name"], status="skipped",
+                                         error=f"Путь не существует: {project.get('path')}"))
+
+    workers = workers or pool_size(provider)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(runnable) or 1))) as pool:
+        # Индексы строятся заранее и параллельно: crew каждого проекта берёт их из кэша
+        list(pool.map(lambda p: get_project_index(p["path"]), runnable))
+        futures = [
+            pool.submit(_run_project, p, user_request, provider, selected_agents, verbose, config_path)
+            for p in runnable
+        ]
+        results.extend(f.result() for f in futures)
+
+    from agents.budget import combine_reports, run_with_budget
+
+    usage: Dict[str, int] = {}
+    reports = [r.budget for r in results if r.budget]
+    for r in results:
+        _add_usage(usage, r.token_usage)
+
+    relevant = [r for r in results if _is_relevant(r)]
+    summary = ""
+    if synthesize and len(relevant) > 1:
+        from crew import create_cross_project_synthesis_crew
+
+        sections = "\n\n".join(f"## {r.project}\n{r.answer.strip()}" for r in relevant)
+        try:
+            crew = create_cross_project_synthesis_crew(user_request, sections, provider, verbose)
+            result, report = run_with_budget(crew.kickoff, config_path=config_path)
+            summary = str(result).strip()
+            _add_usage(usage, result.token_usage.model_dump())
+            reports.append(report)
+        except Exception as e:
+            summary = f"⚠️ Не удалось сформировать общий вывод: {e}"
+
+    return CrossProjectResult(answer=format_cross_project(user_request, results, summary),
+                              results=results, token_usage=usage, budget=combine_reports(reports))
+
+
+def format_cross_project(user_request: str, results: List[ProjectAnswer], summary: str = "") -> str:
+    """Собирает сводный markdown: общий вывод и ответы по проектам."""
+    ok = [r for r in results if r.status == "ok"]
+    lines = [
+        "## 🌐 Запрос по проектам",
+        f"> {user_request}",
+        f"Проектов: {len(results)} (успешно: {len(ok)}, ошибок: {sum(r.status == 'error' for r in results)}, "
+        f"пропущено: {sum(r.status == 'skipped' for r in results)})",
+    ]
+    if summary:
+        lines.append(f"\n### Общий вывод\n{summary}")
+    irrelevant = [r.project for r in ok if not _is_relevant(r)]
+    for r in sorted(ok, key=lambda r: r.project):
+        if _is_relevant(r):
+            lines.append(f"\n### 📁 {r.project}\n{r.answer.strip()}")
+    if irrelevant:
+        lines.append(f"\n**Не относится к:** {', '.join(sorted(irrelevant))}")
+    failed = [r for r in results if r.status != "ok"]
+    if failed:
+        lines.append("\n### Не обработаны")
+        lines.extend(f"- `{r.project}`: {r.error}" for r in sorted(failed, key=lambda r: r.project))
+    return "\n".join(lines)
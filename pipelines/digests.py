@@ -0,0 +1,343 @@
+"""Офлайн дайджесты файлов и директорий проекта.
+
+Для каждого файла проекта LLM один раз составляет краткое описание
+(2-4 строки), ключ - хэш содержимого, поэтому повторный прогон описывает
+только изменённые файлы. Описания директорий собираются снизу вверх из
+описаний их файлов и поддиректорий. Всё хранится в локальной SQLite базе.
+
+create_dwh_crew подставляет в контекст дайджесты, относящиеся к запросу,
+вместо того чтобы агенты заново читали и пересказывали большие файлы.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from pipelines.docs import DOC_EXTENSIONS
+from utils.cache import cache_dir, file_hash
+from utils.file_utils import get_file_content, get_project_files, get_project_info, is_path_valid
+from utils.llm_limiter import pool_size
+
+DIGEST_PROMPT = "Построй дайджест файлов проекта"
+DIGEST_CONTEXT_CHARS = 4000
+_WORD_RE = re.compile(r"\w{3,}")
+
+
+@dataclass
+class DigestResult:
+    """Итог построения дайджестов проекта."""
+    answer: str
+    generated: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    token_usage: Dict[str, int] = field(default_factory=dict)
+    budget: Dict[str, Any] = field(default_factory=dict)
+
+
+class DigestStore:
+    """SQLite база дайджестов: описания по хэшу содержимого и раскладка файлов проектов."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS file_digests (
+            hash TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS project_files (
+            project TEXT NOT NULL,
+            rel_path TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (project, rel_path)
+        );
+        CREATE TABLE IF NOT EXISTS dir_digests (
+            project TEXT NOT NULL,
+            rel_dir TEXT NOT NULL,
+            key TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            PRIMARY KEY (project, rel_dir)
+        );
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(cache_dir("digests"), "digests.db")
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self._SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._local.conn = conn
+        return conn
+
+    def file_summaries(self, hashes: List[str]) -> Dict[str, str]:
+        conn = self._connect()
+        found = {}
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i + 500]
+            rows = conn.execute(
+                f"SELECT hash, summary FROM file_digests WHERE hash IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def put_file(self, file_hash_: str, summary: str):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO file_digests (hash, summary, created_at) VALUES (?, ?, ?)",
+                         (file_hash_, summary, time.time()))
+
+    def set_project_files(self, project: str, files: Dict[str, str]):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM project_files WHERE project = ?", (project,))
+            conn.executemany("INSERT INTO project_files (project, rel_path, hash) VALUES (?, ?, ?)",
+                             [(project, rel_path, h) for rel_path, h in files.items()])
+
+    def dir_digests(self, project: str) -> Dict[str, Tuple[str, str]]:
+        rows = self._connect().execute(
+            "SELECT rel_dir, key, summary FROM dir_digests WHERE project = ?", (project,)
+        ).fetchall()
+        return {rel_dir: (key, summary) for rel_dir, key, summary in rows}
+
+    def set_dir_digests(self, project: str, digests: Dict[str, Tuple[str, str]]):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM dir_digests WHERE project = ?", (project,))
+            conn.executemany("INSERT INTO dir_digests (project, rel_dir, key, summary) VALUES (?, ?, ?, ?)",
+                             [(project, d, key, summary) for d, (key, summary) in digests.items()])
+
+    def project_digests(self, project: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Дайджесты проекта: (файл -> описание, директория -> описание)."""
+        rows = self._connect().execute(
+            "SELECT p.rel_path, d.summary FROM project_files p JOIN file_digests d ON d.hash = p.hash "
+            "WHERE p.project = ?", (project,)
+        ).fetchall()
+        return dict(rows), {d: summary for d, (_, summary) in self.dir_digests(project).items()}
+
+
+_store: Optional[DigestStore] = None
+_store_lock = threading.Lock()
+
+
+def get_digest_store() -> DigestStore:
+    """База дайджестов процесса (в кэше, .cache/crew/digests/digests.db)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DigestStore()
+        return _store
+
+
+def _summarize(provider: str, prompt: str, project_info: Dict,
+               config_path: str) -> Tuple[str, Dict[str, int], Dict[str, Any]]:
+    from agents.budget import run_with_budget
+    from crew import AGENT_TEMPERATURES, get_llm
+
+    # Своя LLM на вызов: бюджет считает токены по LLM, общая между потоками смешала бы их
+    llm = get_llm(provider, temperature=AGENT_TEMPERATURES["researcher"])
+    response, report = run_with_budget(
+        lambda: llm.call([{"role": "user", "content": prompt}]), project_info, config_path
+    )
+    usage = llm.get_token_usage_summary().model_dump() if hasattr(llm, "get_token_usage_summary") else {}
+    return str(response).strip(), usage, report
+
+
+def _file_prompt(rel_path: str, content: str) -> str:
+    return (
+        f"Опиши файл `{rel_path}` в 2-4 строках на русском: назначение, ключевые функции/классы/таблицы, "
+        f"с чем связан. Без вступлений и markdown заголовков.\n\n```\n{content}\n```"
+    )
+
+
+def _dir_prompt(rel_dir: str, children: List[str]) -> str:
+    listing = "\n".join(children)
+    return (
+        f"Опиши директорию `{rel_dir or '.'}` в 2-3 строках на русском по описаниям её содержимого: "
+        f"за что она отвечает и как связаны части. Без вступлений.\n\n{listing}"
+    )
+
+
+def _dir_keys(files: Dict[str, str]) -> Dict[str, Tuple[List[str], List[str]]]:
+    """Директория -> (файлы, поддиректории) для всех директорий с файлами дайджеста."""
+    tree: Dict[str, Tuple[List[str], List[str]]] = {}
+    for rel_path in files:
+        parent = os.path.dirname(rel_path)
+        tree.setdefault(parent, ([], []))[0].append(rel_path)
+        while parent:
+            grand = os.path.dirname(parent)
+            subdirs = tree.setdefault(grand, ([], []))[1]
+            if parent in subdirs:
+                break
+            subdirs.append(parent)
+            parent = grand
+    return tree
+
+
+def build_digests(
+    project_name: str,
+    provider: str = "ollama",
+    workers: Optional[int] = None,
+    max_lines: int = 200,
+    store: Optional[DigestStore] = None,
+    config_path: str = "config.yaml",
+) -> DigestResult:
+    """Строит (инкрементально) дайджесты файлов и директорий проекта.
+
+    Args:
+        project_name: Название проекта из config.yaml.
+        provider: LLM провайдер.
+        workers: Параллельность вызовов LLM (по умолчанию - максимум окна лимитера провайдера).
+        max_lines: Сколько строк файла передавать в LLM.
+        store: База дайджестов (по умолчанию в кэше).
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        DigestResult со сводкой прогона.
+
+    Raises:
+        ValueError: Если проект не найден или путь не существует.
+    """
+    from agents.budget import combine_reports
+
+    project_info = get_project_info(project_name, config_path)
+    if not project_info:
+        raise ValueError(f"Проект '{project_name}' не найден в конфигурации")
+    project_path = project_info["path"]
+    if not is_path_valid(project_path):
+        raise ValueError(f"Путь к проекту не существует: {project_path}")
+
+    store = store or get_digest_store()
+    files = {
+        os.path.relpath(path, project_path).replace(os.sep, "/"): file_hash(path)
+        for path in get_project_files(project_path, DOC_EXTENSIONS)
+    }
+    known = store.file_summaries(sorted(set(files.values())))
+    # Одинаковое содержимое (копии файлов) описывается один раз
+    todo: Dict[str, str] = {}
+    pending = set()
+    for rel_path, h in sorted(files.items()):
+        if h not in known and h not in pending:
+            todo[rel_path] = h
+            pending.add(h)
+
+    usage: Dict[str, int] = {}
+    reports: List[Dict[str, Any]] = []
+    usage_lock = threading.Lock()
+
+    def summarize(prompt: str) -> str:
+        summary, call_usage, report = _summarize(provider, prompt, project_info, config_path)
+        with usage_lock:
+            for key, value in call_usage.items():
+                usage[key] = usage.get(key, 0) + value
+            reports.append(report)
+        return summary
+
+    workers = max(1, workers or pool_size(provider))
+
+    def describe_file(item: Tuple[str, str]) -> Tuple[str, Optional[str]]:
+        rel_path, h = item
+        try:
+            content = get_file_content(os.path.join(project_path, rel_path), max_lines=max_lines)
+        except (ValueError, OSError):
+            return rel_path, None
+        summary = summarize(_file_prompt(rel_path, content))
+        store.put_file(h, summary)
+        return rel_path, summary
+
+    generated = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rel_path, summary in pool.map(describe_file, todo.items()):
+            if summary is not None:
+                known[files[rel_path]] = summary
+                generated.append(rel_path)
+    described = {rel_path: h for rel_path, h in files.items() if h in known}
+    store.set_project_files(project_name, described)
+
+    # Директории снизу вверх: ключ зависит от хэшей файлов и ключей поддиректорий
+    tree = _dir_keys(described)
+    previous = store.dir_digests(project_name)
+    dir_digests: Dict[str, Tuple[str, str]] = {}
+    for depth in sorted({d.count("/") + bool(d) for d in tree}, reverse=True):
+        level = [d for d in tree if d.count("/") + bool(d) == depth]
+
+        def describe_dir(rel_dir: str) -> Tuple[str, Tuple[str, str]]:
+            dir_files, subdirs = tree[rel_dir]
+            key = hashlib.sha1("".join(
+                [f"{f}:{described[f]}" for f in sorted(dir_files)] +
+                [f"{s}/:{dir_digests[s][0]}" for s in sorted(subdirs)]
+            ).encode("utf-8")).hexdigest()
+            cached = previous.get(rel_dir)
+            if cached and cached[0] == key:
+                return rel_dir, cached
+            children = [f"- {s}/: {dir_digests[s][1]}" for s in sorted(subdirs)]
+            children += [f"- {os.path.basename(f)}: {known[described[f]]}" for f in sorted(dir_files)]
+            generated.append(f"{rel_dir or '.'}/")
+            return rel_dir, (key, summarize(_dir_prompt(rel_dir, children)))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            dir_digests.update(pool.map(describe_dir, level))
+    store.set_dir_digests(project_name, dir_digests)
+
+    cached = [rel_path for rel_path in described if rel_path not in todo]
+    answer = (
+        f"## 🗂 Дайджест проекта: {project_name}\n"
+        f"Файлов: {len(described)} (описано заново: {len([g for g in generated if not g.endswith('/')])}, "
+        f"из кэша: {len(cached)}), директорий: {len(dir_digests)}"
+    )
+    return DigestResult(answer=answer, generated=generated, cached=cached, token_usage=usage,
+                        budget=combine_reports(reports))
+
+
+def _words(text: str) -> set:
+    return {w.lower() for w in _WORD_RE.findall(text)}
+
+
+def relevant_digests(project_name: str, user_request: str, key_files: Optional[List[str]] = None,
+                     project_path: Optional[str] = None, max_chars: int = DIGEST_CONTEXT_CHARS,
+                     store: Optional[DigestStore] = None) -> str:
+    """Дайджесты, относящиеся к запросу, в пределах max_chars (без вызовов LLM).
+
+    Файлы ранжируются по пересечению слов запроса с путём и описанием;
+    ключевые файлы проекта получают бонус. Описания директорий верхнего
+    уровня идут первыми как обзор.
+
+    Args:
+        project_name: Название проекта.
+        user_request: Запрос пользователя.
+        key_files: Ключевые файлы проекта (абсолютные пути).
+        project_path: Путь к проекту (для сопоставления key_files).
+        max_chars: Бюджет символов на блок.
+        store: База дайджестов.
+
+    Returns:
+        Текст блока или пустая строка, если дайджестов нет.
+    """
+    try:
+        files, dirs = (store or get_digest_store()).project_digests(project_name)
+    except sqlite3.Error:
+        return ""
+    if not files:
+        return ""
+    query = _words(user_request)
+    key_rel = {os.path.relpath(p, project_path).replace(os.sep, "/") for p in key_files or []} if project_path else set()
+
+    def score(rel_path: str) -> float:
+        path_words = _words(rel_path.replace("/", " ").replace("_", " "))
+        return 3 * len(query & path_words) + len(query & _words(files[rel_path])) + (1.5 if rel_path in key_rel else 0)
+
+    lines = [f"- {d or '.'}/: {dirs[d]}" for d in sorted(dirs) if "/" not in d]
+    ranked = sorted((r for r in files if score(r) > 0), key=lambda r: (-score(r), r))
+    lines += [f"- {r}: {files[r]}" for r in ranked]
+    block, used = [], 0
+    for line in lines:
+        line = " ".join(line.split())
+        if used + len(line) > max_chars:
+            break
+        block.append(line)
+        used += len(line) + 1
+    return "\n".join(block)
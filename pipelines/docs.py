@@ -0,0 +1,303 @@
+"""Map-reduce генерация документации проекта с кэшем по модулям.
+
+Файлы проекта группируются в модули (директория, не более N файлов на часть),
+документация каждого модуля генерируется параллельно (map) и кэшируется по
+хэшу содержимого его файлов, затем документация модулей сводится в обзор
+(reduce). Если она не помещается в бюджет одного запроса, reduce идёт
+уровнями: модули сжимаются группами в пределах бюджета, пока всё не
+поместится в один запрос. Повторный запуск после небольшого изменения
+перегенерирует только изменившиеся модули и группы.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.cache import JsonStore, cache_dir, file_hash, slugify
+from utils.file_utils import get_file_content, get_project_files, get_project_info, is_path_valid
+from utils.llm_limiter import pool_size
+from utils.memory import estimate_tokens
+
+DOCS_PROMPT = "Сгенерируй документацию для проекта"
+DOC_EXTENSIONS = [".py", ".sql", ".yaml", ".yml", ".sh", ".toml", ".md"]
+
+# Бюджет токенов документации модулей в одном reduce запросе
+REDUCE_TOKEN_BUDGET = 6000
+# Максимум промежуточных уровней reduce (на случай, если сжатие не уменьшает текст)
+REDUCE_MAX_DEPTH = 4
+
+
+@dataclass
+class DocChunk:
+    """Часть модуля, документируемая одним LLM запросом."""
+    module: str
+    files: List[str]
+    key: str
+
+
+@dataclass
+class DocsResult:
+    """Итог генерации документации."""
+    answer: str
+    generated: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    token_usage: Dict[str, int] = field(default_factory=dict)
+    budget: Dict[str, Any] = field(default_factory=dict)
+
+
+def split_into_chunks(project_path: str, files: List[str], files_per_chunk: int = 8) -> List[DocChunk]:
+    """Группирует файлы в чанки по директориям.
+
+    Разбиение зависит только от набора путей (не от размеров), поэтому
+    правка файла меняет ключ лишь его чанка. Границы чанков внутри
+    директории определяются хэшем пути (content-defined chunking), а не
+    позицией файла: добавление или удаление файла меняет состав только
+    соседних чанков, а не всех последующих.
+
+    Args:
+        project_path: Путь к проекту.
+        files: Абсолютные пути файлов.
+        files_per_chunk: Максимум файлов в одном чанке.
+
+    Returns:
+        Список чанков с ключами кэша.
+    """
+    by_dir: Dict[str, List[str]] = {}
+    hashes: Dict[str, str] = {}
+    for path in files:
+        rel_path = os.path.relpath(path, project_path)
+        try:
+            hashes[rel_path] = file_hash(path)
+        except OSError:
+            # Файл удалён или стал недоступен после листинга — пропускаем
+            continue
+        by_dir.setdefault(os.path.dirname(rel_path) or ".", []).append(rel_path)
+
+    chunks = []
+    for directory in sorted(by_dir):
+        parts = _split_members(sorted(by_dir[directory]), files_per_chunk)
+        for part in parts:
+            module = directory
+            if len(parts) > 1:
+                module = f"{directory} ({os.path.basename(part[0])} … {os.path.basename(part[-1])})"
+            digest = hashlib.sha1()
+            for rel_path in part:
+                digest.update(rel_path.encode("utf-8"))
+                digest.update(hashes[rel_path].encode("ascii"))
+            chunks.append(DocChunk(module=module, files=part, key=digest.hexdigest()))
+    return chunks
+
+
+def _split_members(members: List[str], files_per_chunk: int) -> List[List[str]]:
+    # Чанк заканчивается на пути с "граничным" хэшем (в среднем раз в
+    # files_per_chunk / 2 файлов) или при достижении максимума
+    period = max(1, files_per_chunk // 2)
+    parts, current = [], []
+    for rel_path in members:
+        current.append(rel_path)
+        boundary = int(hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:8], 16) % period == 0
+        if boundary or len(current) >= files_per_chunk:
+            parts.append(current)
+            current = []
+    if current:
+        parts.append(current)
+    return parts
+
+
+def group_by_budget(sections: List[str], budget: int) -> List[List[str]]:
+    """Делит секции на последовательные группы в пределах бюджета токенов.
+
+    Секция больше бюджета образует группу сама и на следующем уровне
+    reduce заменяется своим сжатым описанием.
+
+    Args:
+        sections: Тексты секций.
+        budget: Бюджет токенов группы.
+
+    Returns:
+        Список групп секций.
+    """
+    groups, current, size = [], [], 0
+    for section in sections:
+        # +1 на разделитель между секциями
+        tokens = estimate_tokens(section) + 1
+        if current and size + tokens > budget:
+            groups.append(current)
+            current, size = [], 0
+        current.append(section)
+        size += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _chunk_content(project_path: str, chunk: DocChunk, max_lines: int) -> str:
+    parts = []
+    for rel_path in chunk.files:
+        try:
+            content = get_file_content(os.path.join(project_path, rel_path), max_lines=max_lines)
+        except ValueError:
+            continue
+        parts.append(f"### {rel_path}\n```\n{content}\n```")
+    return "\n\n".join(parts)
+
+
+def _generate_module_doc(project_info: Dict, chunk: DocChunk, provider: str, verbose: bool, max_lines: int,
+                         config_path: str) -> Tuple[str, Dict[str, int], Dict[str, Any]]:
+    from agents.budget import run_with_budget
+    from crew import create_module_doc_crew
+
+    crew = create_module_doc_crew(
+        project_info["name"], chunk.module, _chunk_content(project_info["path"], chunk, max_lines), provider, verbose
+    )
+    result, report = run_with_budget(crew.kickoff, project_info, config_path)
+    return str(result), result.token_usage.model_dump(), report
+
+
+def _generate_group_doc(project_info: Dict, text: str, provider: str, verbose: bool,
+                        config_path: str) -> Tuple[str, Dict[str, int], Dict[str, Any]]:
+    from agents.budget import run_with_budget
+    from crew import create_docs_group_crew
+
+    crew = create_docs_group_crew(project_info["name"], text, provider, verbose)
+    result, report = run_with_budget(crew.kickoff, project_info, config_path)
+    return str(result), result.token_usage.model_dump(), report
+
+
+def _add_usage(total: Dict[str, int], usage: Dict[str, int]):
+    for key, value in usage.items():
+        total[key] = total.get(key, 0) + value
+
+
+def generate_docs(
+    project_name: str,
+    provider: str = "ollama",
+    verbose: bool = False,
+    workers: Optional[int] = None,
+    files_per_chunk: int = 8,
+    max_lines: int = 300,
+    reduce_tokens: int = REDUCE_TOKEN_BUDGET,
+    config_path: str = "config.yaml",
+) -> DocsResult:
+    """Генерирует документацию проекта по схеме map-reduce.
+
+    Args:
+        project_name: Название проекта из config.yaml.
+        provider: LLM провайдер.
+        verbose: Подробный вывод CrewAI.
+        workers: Параллельность map шага (по умолчанию - максимум окна лимитера провайдера).
+        files_per_chunk: Максимум файлов в одном map запросе.
+        max_lines: Сколько строк каждого файла передавать в LLM.
+        reduce_tokens: Бюджет токенов документации модулей в одном reduce запросе.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        DocsResult с итоговой документацией.
+
+    Raises:
+        ValueError: Если проект не найден или путь не существует.
+    """
+    from agents.budget import combine_reports, run_with_budget
+
+    project_info = get_project_info(project_name, config_path)
+    if not project_info:
+        raise ValueError(f"Проект '{project_name}' не найден в конфигурации")
+    project_path = project_info["path"]
+    if not is_path_valid(project_path):
+        raise ValueError(f"Путь к проекту не существует: {project_path}")
+
+    store = JsonStore(os.path.join(cache_dir("docs"), f"{slugify(project_name)}.json"))
+    module_docs: Dict[str, str] = store.get("modules", {})
+    chunks = split_into_chunks(project_path, get_project_files(project_path, DOC_EXTENSIONS), files_per_chunk)
+
+    usage: Dict[str, int] = {}
+    reports: List[Dict[str, Any]] = []
+    todo = [c for c in chunks if c.key not in module_docs]
+    workers = workers or pool_size(provider)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            c.key: pool.submit(_generate_module_doc, project_info, c, provider, verbose, max_lines, config_path)
+            for c in todo
+        }
+        errors = []
+        for key, future in futures.items():
+            try:
+                doc, chunk_usage, report = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            module_docs[key] = doc
+            _add_usage(usage, chunk_usage)
+            reports.append(report)
+
+    if errors:
+        # Готовые модули сохраняем, чтобы повтор не генерировал их заново
+        store.set("modules", module_docs)
+        store.save()
+        raise RuntimeError(f"Не удалось сгенерировать документацию {len(errors)} модулей: {errors[0]}")
+
+    module_sections = [f"## Модуль `{c.module}`\n{module_docs[c.key].strip()}" for c in chunks]
+    sections = "\n\n".join(module_sections)
+
+    # Reduce шаги тоже кэшируются по тексту входа: без изменений модулей LLM не вызывается
+    group_docs: Dict[str, str] = store.get("groups", {})
+    live_groups = set()
+    level, depth = module_sections, 0
+    while len(level) > 1 and depth < REDUCE_MAX_DEPTH and estimate_tokens("\n\n".join(level)) > reduce_tokens:
+        depth += 1
+        texts = ["\n\n".join(group) for group in group_by_budget(level, reduce_tokens)]
+        keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        live_groups.update(keys)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            group_futures = {
+                key: pool.submit(_generate_group_doc, project_info, text, provider, verbose, config_path)
+                for key, text in zip(keys, texts) if key not in group_docs
+            }
+            errors = []
+            for key, future in group_futures.items():
+                try:
+                    group_docs[key], group_usage, report = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                _add_usage(usage, group_usage)
+                reports.append(report)
+        if errors:
+            store.set("modules", module_docs)
+            store.set("groups", group_docs)
+            store.save()
+            raise RuntimeError(f"Не удалось свести документацию {len(errors)} групп модулей: {errors[0]}")
+        # Заголовок без номера группы: вставка группы не меняет ключи соседних на следующем уровне
+        level = [f"## Группа модулей (уровень {depth})\n{group_docs[key].strip()}" for key in keys]
+
+    reduce_input = "\n\n".join(level)
+    synthesis_key = hashlib.sha1(reduce_input.encode("utf-8")).hexdigest()
+    overview = store.get("overview") or {}
+    if overview.get("key") != synthesis_key:
+        from crew import create_docs_synthesis_crew
+
+        crew = create_docs_synthesis_crew(project_name, reduce_input, provider, verbose)
+        result, report = run_with_budget(crew.kickoff, project_info, config_path)
+        overview = {"key": synthesis_key, "text": str(result)}
+        _add_usage(usage, result.token_usage.model_dump())
+        reports.append(report)
+
+    live = {c.key for c in chunks}
+    store.set("modules", {k: v for k, v in module_docs.items() if k in live})
+    store.set("groups", {k: v for k, v in group_docs.items() if k in live_groups})
+    store.set("overview", overview)
+    store.set("updated_at", time.time())
+    store.save()
+
+    generated = [c.module for c in todo]
+    cached = [c.module for c in chunks if c.key not in futures]
+    answer = (
+        f"# 📝 Документация: {project_name}\n"
+        f"Модулей: {len(chunks)} (сгенерировано: {len(generated)}, из кэша: {len(cached)})\n\n"
+        f"{overview['text'].strip()}\n\n---\n\n{sections}"
+    )
+    return DocsResult(answer=answer, generated=generated, cached=cached, token_usage=usage,
+                      budget=combine_reports(reports))
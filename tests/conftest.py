@@ -0,0 +1,18 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["CREWAI_TELEMETRY_OPT_OUT"] = "true"
+os.environ["OTEL_SDK_DISABLED"] = "true"
+# Клиенты провайдеров создаются без ключей; реальные вызовы в тестах идут через провайдер replay
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Кэш и контрольные точки каждого теста - во временном каталоге."""
+    monkeypatch.setenv("CREW_CACHE_DIR", str(tmp_path / "cache"))
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+import batch
+from utils.sql_lint import SQL_LINT_PROMPT
+
+
+def test_read_records_rejects_duplicate_ids(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    path.write_text('{"id": "a", "prompt": "x"}\n{"id": "b", "prompt": "y"}\n{"id": "a", "prompt": "z"}\n')
+    with pytest.raises(ValueError, match="requests.jsonl:3: id 'a' уже есть в строке 1"):
+        batch.read_records(str(path))
+
+
+def test_run_batch_counts_duplicates_and_uses_config(tmp_path):
+    project = tmp_path / "shop"
+    (project / "sql").mkdir(parents=True)
+    (project / "sql" / "orders.sql").write_text("SELECT * FROM orders;\n")
+    config = tmp_path / "other.yaml"
+    config.write_text(f'projects:\n  - name: "shop"\n    path: "{project}"\n')
+
+    records = batch.project_records("sql-lint", SQL_LINT_PROMPT, "ollama", str(config))
+    output = tmp_path / "out.jsonl"
+    stats = batch.run_batch(records + records, str(output), use_threads=True, config_path=str(config))
+
+    assert stats == {"ok": 1, "error": 0, "skipped": 0, "duplicate": 1}
+    row = json.loads(output.read_text())
+    assert row["status"] == "ok" and row["project"] == "shop"
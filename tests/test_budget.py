@@ -0,0 +1,89 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from crewai import Crew, Task
+
+from agents.budget import RequestBudget, combine_reports, current_budget, format_budget, run_with_budget
+from agents.cassette import Cassette, ReplayLLM
+from agents.delegation import DelegationController
+from agents.factory import create_manager_agent, create_python_developer, create_sql_developer
+
+
+def delegate(coworker: str, task: str) -> str:
+    arguments = json.dumps({"task": task, "context": task, "coworker": coworker}, ensure_ascii=False)
+    return f"Thought: Нужна помощь коллеги.\nAction: Delegate work to coworker\nAction Input: {arguments}"
+
+
+def final(text: str) -> str:
+    return f"Thought: Готово.\nFinal Answer: {text}"
+
+
+def delegation_chain_cassette(tmp_path) -> Cassette:
+    """Руководитель -> Python Developer -> SQL Developer, ответы в формате ReAct."""
+    cassette = Cassette(str(tmp_path / "chain.json"), strict=True)
+    responses = [
+        ("Технический руководитель DWH команды", delegate("Python Developer", "Подготовь загрузку")),
+        ("Python Developer", delegate("SQL Developer", "Оптимизируй запрос")),
+        ("SQL Developer", final("Запрос оптимизирован")),
+        ("Python Developer", final("Загрузка готова")),
+        ("Технический руководитель DWH команды", final("Итог руководителя")),
+    ]
+    cassette.interactions = [{"agent": agent, "key": "", "response": response} for agent, response in responses]
+    return cassette
+
+
+def build_chain_crew() -> Crew:
+    agents = {
+        "manager": create_manager_agent(ReplayLLM(), verbose=False),
+        "python_dev": create_python_developer(ReplayLLM(), verbose=False),
+        "sql_dev": create_sql_developer(ReplayLLM(), verbose=False),
+    }
+    DelegationController(max_depth=2).attach(agents)
+    task = Task(description="Подготовь загрузку и оптимизируй запрос", expected_output="Итог",
+                agent=agents["manager"])
+    return Crew(agents=list(agents.values()), tasks=[task], verbose=False)
+
+
+def test_nested_executors_wrap_up_instead_of_failing(tmp_path):
+    budget = RequestBudget(max_llm_calls=3)
+    crew = build_chain_crew()
+    with delegation_chain_cassette(tmp_path).replaying() as cassette, budget.activate():
+        result = crew.kickoff()
+
+    report = budget.report()
+    assert str(result) == "Итог руководителя"
+    assert report["finished_early"] and report["finish_reason"] == "llm_calls"
+    # Каждому исполнителю цепочки хватило вызовов на финальный ответ
+    assert report["blocked_calls"] == 0
+    assert report["usage"]["llm_calls"] == cassette.metrics["llm_calls"] == 5
+    assert cassette.metrics["missing"] == 0
+
+
+def test_runaway_executor_is_blocked_after_final_calls():
+    budget = RequestBudget(max_llm_calls=1)
+
+    class Context:
+        executor = object()
+        llm = ReplayLLM()
+        messages = [{"role": "user", "content": "вопрос"}]
+        iterations = 0
+
+    context = Context()
+    results = [budget.before_call(context) for _ in range(6)]
+    # Два вызова до hard_ratio, затем FINAL_CALLS на завершение, остальные блокируются
+    assert results == [None, None, None, None, False, False]
+    assert budget.report()["blocked_calls"] == 2
+
+
+def test_pipeline_steps_run_under_their_own_budget():
+    # Потоки пула не видят бюджет вызывающего: каждый шаг активирует свой
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(lambda _: run_with_budget(current_budget), range(3)))
+    budgets = [budget for budget, _ in results]
+    assert all(budget is not None for budget in budgets) and len(set(map(id, budgets))) == 3
+
+    reports = [report for _, report in results]
+    reports[1] = {**reports[1], "finished_early": True, "finish_reason": "seconds"}
+    combined = combine_reports(reports)
+    assert combined["runs"] == 3 and combined["finished_early_runs"] == 1
+    assert format_budget(combined).startswith("Досрочно завершено шагов: 1 из 3")
@@ -0,0 +1,32 @@
+from crewai import Agent, Task
+from crewai.tasks.task_output import TaskOutput
+
+from agents.cassette import ReplayLLM
+from agents.checkpoint import CheckpointedTask, RunCheckpoint
+
+
+def research_task(history: str) -> CheckpointedTask:
+    researcher = Agent(role="Исследователь", goal="g", backstory="b", llm=ReplayLLM())
+    return CheckpointedTask(name="research", description=f"{history}Исследуй тему", expected_output="Пункты",
+                            agent=researcher)
+
+
+def test_named_task_resumes_when_history_changes():
+    first = research_task("")
+    checkpoint = RunCheckpoint("run")
+    checkpoint.save_task(first, TaskOutput(description=first.description, raw="пункты", agent="Исследователь"))
+
+    # В истории повтора уже есть сообщение об ошибке первой попытки
+    retry = research_task("История:\n❌ **Ошибка:** timeout\n")
+    output = RunCheckpoint("run").task_output(retry)
+    assert output is not None and output.raw == "пункты"
+
+
+def test_unnamed_task_is_keyed_by_description():
+    agent = Agent(role="Исследователь", goal="g", backstory="b", llm=ReplayLLM())
+    task = Task(description="Исследуй тему", expected_output="Пункты", agent=agent)
+    checkpoint = RunCheckpoint("run")
+    checkpoint.save_task(task, TaskOutput(description=task.description, raw="пункты", agent="Исследователь"))
+    other = Task(description="Другая тема", expected_output="Пункты", agent=agent)
+    assert RunCheckpoint("run").task_output(other) is None
+    assert RunCheckpoint("run").task_output(task) is not None
@@ -0,0 +1,84 @@
+import os
+from types import SimpleNamespace
+
+import crew
+from agents.budget import RequestBudget, current_budget
+import pipelines.docs as docs
+from pipelines.docs import group_by_budget, split_into_chunks
+from utils.memory import estimate_tokens
+
+
+class _Result:
+    def __init__(self, text):
+        self.text = text
+        self.token_usage = SimpleNamespace(model_dump=lambda: {})
+
+    def __str__(self):
+        return self.text
+
+
+def _report():
+    return RequestBudget().report()
+
+
+def _write_files(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"-- {name}\nselect 1;\n")
+    return [str(root / name) for name in names]
+
+
+def test_adding_file_keeps_most_chunk_keys(tmp_path):
+    names = [f"models/m{i:02d}.sql" for i in range(40)]
+    before = {c.key for c in split_into_chunks(str(tmp_path), _write_files(tmp_path, names))}
+    after = {c.key for c in split_into_chunks(str(tmp_path), _write_files(tmp_path, ["models/m05a.sql", *names]))}
+    assert len(before - after) <= 2
+    assert all(len(c.files) <= 8 for c in split_into_chunks(str(tmp_path), _write_files(tmp_path, names)))
+
+
+def test_vanished_file_is_skipped(tmp_path):
+    files = _write_files(tmp_path, ["models/a.sql", "models/b.sql"])
+    (tmp_path / "models/b.sql").unlink()
+    chunks = split_into_chunks(str(tmp_path), files)
+    assert [c.files for c in chunks] == [[os.path.join("models", "a.sql")]]
+
+def test_group_by_budget_respects_budget():
+    sections = ["x" * 300] * 10
+    groups = group_by_budget(sections, 250)
+    assert sum(len(g) for g in groups) == 10
+    assert all(estimate_tokens("\n\n".join(g)) <= 250 for g in groups)
+    # Секция больше бюджета идёт отдельной группой
+    assert len(group_by_budget(sections, 10)) == 10
+
+
+def test_reduce_is_hierarchical(tmp_path, monkeypatch):
+    _write_files(tmp_path, [f"pkg{i}/mod.py" for i in range(12)])
+    monkeypatch.setattr(docs, "get_project_info", lambda name, config_path: {"name": name, "path": str(tmp_path)})
+    monkeypatch.setattr(docs, "_generate_module_doc", lambda *a: ("описание модуля " * 40, {}, _report()))
+    group_inputs, synthesis_inputs = [], []
+
+    def group_doc(project_info, text, provider, verbose, config_path):
+        group_inputs.append(text)
+        return "сводка группы", {}, _report()
+
+    def synthesis_crew(project_name, module_docs, provider, verbose):
+        synthesis_inputs.append(module_docs)
+        # Синтез выполняется под собственным бюджетом
+        return SimpleNamespace(kickoff=lambda: _Result("обзор" if current_budget() else "без бюджета"))
+
+    monkeypatch.setattr(docs, "_generate_group_doc", group_doc)
+    monkeypatch.setattr(crew, "create_docs_synthesis_crew", synthesis_crew)
+    budget = 500
+    result = docs.generate_docs("demo", reduce_tokens=budget)
+    assert "обзор" in result.answer
+    assert result.budget["runs"] == 12 + len(group_inputs) + 1
+    assert len(group_inputs) > 1
+    assert all(estimate_tokens(text) <= budget for text in group_inputs)
+    assert synthesis_inputs and estimate_tokens(synthesis_inputs[0]) <= budget
+
+    # Повтор без изменений берёт все шаги reduce из кэша
+    group_inputs.clear()
+    synthesis_inputs.clear()
+    docs.generate_docs("demo", reduce_tokens=budget)
+    assert group_inputs == [] and synthesis_inputs == []
@@ -0,0 +1,26 @@
+import threading
+import time
+
+from utils.llm_limiter import AIMDLimiter, get_limiter, pool_size
+
+
+def test_pipeline_pool_matches_limiter_max():
+    assert pool_size("ollama") == get_limiter("ollama").max_limit == 4
+
+
+def test_window_grows_past_initial_with_pool_of_max_size():
+    limiter = AIMDLimiter("test", initial=1, min_limit=1, max_limit=4)
+
+    def call():
+        started = limiter.acquire()
+        time.sleep(0.005)
+        limiter.release(started, response="")
+
+    # Пул размером с максимум окна держит окно заполненным, и оно растёт
+    for _ in range(20):
+        threads = [threading.Thread(target=call) for _ in range(limiter.max_limit)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert limiter.limit > 2
@@ -0,0 +1,25 @@
+import yaml
+
+from benchmarks import llm_replay
+
+
+def run(monkeypatch, *args):
+    # main переходит в корень репозитория; monkeypatch вернёт рабочую директорию
+    monkeypatch.chdir(llm_replay.ROOT)
+    # Накладные расходы зависят от машины, здесь проверяются только вызовы и токены
+    return llm_replay.main(["run", "--strict", "--max-overhead-growth", "1000", *args])
+
+
+def test_recorded_scenarios_match_baseline(monkeypatch, capsys):
+    assert run(monkeypatch) == 0
+    assert "РЕГРЕССИЯ" not in capsys.readouterr().err
+
+
+def test_prompt_growth_is_a_regression(tmp_path, monkeypatch, capsys):
+    scenarios = llm_replay.load_scenarios(llm_replay.SCENARIOS_PATH, ["research_article"])
+    scenarios[0]["prompt"] += " " + "с учётом удалений, поздних данных и сверки с источником " * 20
+    path = tmp_path / "scenarios.yaml"
+    path.write_text(yaml.safe_dump({"scenarios": scenarios}, allow_unicode=True), encoding="utf-8")
+
+    assert run(monkeypatch, "--scenarios", str(path)) == 1
+    assert "research_article: токенов промптов" in capsys.readouterr().err
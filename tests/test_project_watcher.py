@@ -0,0 +1,30 @@
+import time
+
+from utils.project_index import get_project_index
+from utils.project_watcher import ProjectWatcher
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_polling_picks_up_gitignore_changes(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text("a = 1\n")
+    (tmp_path / "src" / "b.py").write_text("b = 1\n")
+    project = str(tmp_path)
+    watcher = ProjectWatcher({project: "demo"}, debounce=0.1, poll_interval=0.1, use_watchdog=False).start()
+    try:
+        assert "a.py" in get_project_index(project).structure
+        (tmp_path / ".gitignore").write_text("src/a.py\n")
+        # Файл, ставший игнорируемым, выпадает из индекса без перезапуска
+        assert wait_for(lambda: "a.py" not in get_project_index(project).structure)
+        assert watcher.stats["rebuilds"] >= 1
+        assert "b.py" in get_project_index(project).structure
+    finally:
+        watcher.stop()
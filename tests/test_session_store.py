@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from utils.session_store import FileSessionStore, SessionStore, SqliteSessionStore
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_file_store_keeps_concurrent_job_updates(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    threads = [
+        threading.Thread(target=store.set_job, args=("s", f"job-{i}", {"status": "done", "started_at": time.time()}))
+        for i in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.get_jobs("s")) == 20
+    store.clear_session("s")
+    assert store.get_jobs("s") == {}
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda root: FileSessionStore(str(root)),
+    lambda root: SqliteSessionStore(str(root / "sessions.db")),
+])
+def test_stale_running_jobs_are_abandoned(tmp_path, make_store):
+    store = make_store(tmp_path)
+    store.set_job("s", "old", {"status": "running", "started_at": time.time() - 7200})
+    store.set_job("s", "new", {"status": "running", "started_at": time.time()})
+    jobs = store.get_jobs("s")
+    assert jobs["old"]["status"] == "abandoned"
+    assert jobs["new"]["status"] == "running"
+    assert store.get_jobs("s")["old"]["status"] == "abandoned"
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda root: FileSessionStore(str(root)),
+    lambda root: SqliteSessionStore(str(root / "sessions.db")),
+])
+def test_answers_expire_after_max_age(tmp_path, make_store, monkeypatch):
+    store = make_store(tmp_path)
+    store.set_answer("k", "ответ", project="demo")
+    assert store.get_answer("k") == "ответ"
+    later = time.time() + 7200
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.get_answer("k") is None
+    assert store.get_answer("k", max_age=None) == "ответ"
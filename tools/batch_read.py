@@ -0,0 +1,39 @@
+from typing import List, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from utils.batch_read import PER_FILE_BYTES, TOTAL_BYTES, format_read_results, read_project_files
+
+
+class BatchReadToolSchema(BaseModel):
+    """Параметры пакетного чтения файлов проекта."""
+    paths: List[str] = Field(
+        ...,
+        description="Пути относительно корня проекта, glob шаблоны ('models/staging/*.sql') "
+                    "или пути с диапазоном строк ('etl/load.py:40-120')",
+    )
+    max_bytes_per_file: int = Field(default=PER_FILE_BYTES, description="Бюджет байт на один файл")
+
+
+class BatchReadTool(BaseTool):
+    """Чтение нескольких файлов проекта за один вызов."""
+    name: str = "Read project files"
+    description: str = (
+        "Читает сразу несколько файлов проекта одним вызовом: список путей, glob шаблонов или "
+        "путей с диапазоном строк ('path:10-80'). Возвращает содержимое всех файлов с заголовками, "
+        "обрезанное по бюджету. Используй, когда нужно больше одного файла (модель и её источники, "
+        "модуль и его тесты) - вместо нескольких вызовов FileReadTool."
+    )
+    args_schema: Type[BaseModel] = BatchReadToolSchema
+    project_path: str
+
+    def _run(self, paths: List[str], max_bytes_per_file: int = PER_FILE_BYTES) -> str:
+        if isinstance(paths, str):
+            paths = [paths]
+        try:
+            results = read_project_files(self.project_path, paths,
+                                         per_file_bytes=max(1_000, min(max_bytes_per_file, TOTAL_BYTES)))
+        except (ValueError, OSError) as e:
+            return f"Ошибка: {e}"
+        return format_read_results(results)
@@ -0,0 +1,38 @@
+import json
+import os
+from typing import Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from utils.data_profile import profile_data_file
+
+
+class DataProfileToolSchema(BaseModel):
+    """Параметры профилирования файла данных."""
+    path: str = Field(..., description="Путь к CSV/TSV/Parquet файлу относительно корня проекта")
+
+
+class DataProfileTool(BaseTool):
+    """Профиль файла данных проекта без чтения его целиком."""
+    name: str = "Profile data file"
+    description: str = (
+        "Профилирует CSV/TSV/Parquet файл проекта (в том числе многогигабайтный): число строк, "
+        "для каждой колонки - тип, доля NULL, оценка числа уникальных значений, min/max. "
+        "Для больших файлов статистика считается по выборке: stats_from_sample - min/max и NULL "
+        "только по выборке, distinct_from_sample - число уникальных значений не меньше оценки. "
+        "Используй вместо чтения файлов данных через FileReadTool."
+    )
+    args_schema: Type[BaseModel] = DataProfileToolSchema
+    project_path: str
+
+    def _run(self, path: str) -> str:
+        root = os.path.realpath(self.project_path)
+        target = os.path.realpath(os.path.join(root, path))
+        if target != root and not target.startswith(root + os.sep):
+            return f"Ошибка: путь вне проекта: {path}"
+        try:
+            profile = profile_data_file(target)
+        except (ValueError, OSError) as e:
+            return f"Ошибка: {e}"
+        return json.dumps({**profile, "path": os.path.relpath(target, root)}, ensure_ascii=False)
@@ -0,0 +1,35 @@
+import json
+from typing import Optional, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from utils.file_utils import list_project_dir
+
+
+class ProjectTreeToolSchema(BaseModel):
+    """Параметры просмотра директории проекта."""
+    path: str = Field(default="", description="Директория относительно корня проекта, '' - корень")
+    limit: int = Field(default=50, description="Сколько записей вернуть (до 200)")
+    cursor: Optional[str] = Field(default=None, description="next_cursor из предыдущего ответа для следующей страницы")
+    sort_by: str = Field(default="name", description="Сортировка: 'name' или 'size' (крупные первыми)")
+
+
+class ProjectTreeTool(BaseTool):
+    """Постраничный просмотр дерева проекта без рекурсивного обхода."""
+    name: str = "Browse project directory"
+    description: str = (
+        "Показывает содержимое одной директории проекта постранично: имя, тип, размер. "
+        "Передай 'path' относительно корня проекта; для следующей страницы передай 'cursor' "
+        "из next_cursor. Используй вместо рекурсивного перечисления всего проекта."
+    )
+    args_schema: Type[BaseModel] = ProjectTreeToolSchema
+    project_path: str
+
+    def _run(self, path: str = "", limit: int = 50, cursor: Optional[str] = None, sort_by: str = "name") -> str:
+        try:
+            page = list_project_dir(self.project_path, path, limit=max(1, min(limit, 200)),
+                                    cursor=cursor, sort_by=sort_by)
+        except (ValueError, OSError) as e:
+            return f"Ошибка: {e}"
+        return json.dumps(page, ensure_ascii=False)
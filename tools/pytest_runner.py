@@ -0,0 +1,47 @@
+from typing import List, Optional, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from utils.file_utils import find_project_by_path
+from utils.pytest_runner import MEMORY_LIMIT_MB, PER_TEST_TIMEOUT, TEST_WORKERS, format_test_report, run_project_tests
+
+
+class PytestRunToolSchema(BaseModel):
+    """Параметры запуска тестов проекта."""
+    targets: List[str] = Field(
+        default_factory=list,
+        description="Тестовые файлы, директории, glob шаблоны или node id (tests/test_load.py::test_empty); "
+                    "пусто - все тесты проекта",
+    )
+    keyword: Optional[str] = Field(default=None, description="Выражение pytest -k для отбора тестов")
+
+
+class PytestRunTool(BaseTool):
+    """Запуск pytest тестов проекта с кэшем результатов."""
+    name: str = "Run project tests"
+    description: str = (
+        "Запускает pytest тесты проекта (все или выбранные) в изолированных процессах параллельно, "
+        "с лимитом времени на тест. Возвращает счётчики passed/failed/error/skipped/timeout и "
+        "краткие сообщения упавших тестов. Результаты файлов, у которых не менялись сам тест и "
+        "импортируемый им код, берутся из кэша. Запускай тесты, прежде чем делать выводы о "
+        "работоспособности кода."
+    )
+    args_schema: Type[BaseModel] = PytestRunToolSchema
+    project_path: str
+
+    def _run(self, targets: Optional[List[str]] = None, keyword: Optional[str] = None) -> str:
+        settings = (find_project_by_path(self.project_path) or {}).get("tests") or {}
+        try:
+            result = run_project_tests(
+                self.project_path,
+                targets=targets or None,
+                keyword=keyword,
+                python=settings.get("python"),
+                per_test_timeout=settings.get("timeout", PER_TEST_TIMEOUT),
+                workers=settings.get("workers", TEST_WORKERS),
+                memory_mb=settings.get("memory_mb", MEMORY_LIMIT_MB),
+            )
+        except (ValueError, OSError) as e:
+            return f"Ошибка: {e}"
+        return format_test_report(result)
@@ -0,0 +1,38 @@
+from typing import Optional, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from utils.sql_lint import format_lint_report, lint_project
+
+
+class SqlLintToolSchema(BaseModel):
+    """Параметры статического анализа SQL."""
+    path: Optional[str] = Field(default=None, description="Файл .sql относительно корня проекта; пусто - все файлы")
+
+
+class SqlLintTool(BaseTool):
+    """Детерминированные замечания по производительности SQL файлов проекта."""
+    name: str = "Lint SQL performance"
+    description: str = (
+        "Статический анализ .sql файлов проекта: SELECT *, несаргабельные условия, функции над "
+        "индексированными колонками, колонки фильтров/JOIN без индекса, декартовы произведения, "
+        "повторяющиеся подзапросы. Возвращает замечания со строками. Используй до ручного разбора "
+        "SQL, чтобы тратить время на исправления, а не на поиск очевидных проблем."
+    )
+    args_schema: Type[BaseModel] = SqlLintToolSchema
+    project_path: str
+
+    def _run(self, path: Optional[str] = None) -> str:
+        try:
+            report = lint_project(self.project_path)
+        except (ValueError, OSError) as e:
+            return f"Ошибка: {e}"
+        if path:
+            rel_path = path.strip("/")
+            if rel_path not in report.files:
+                return f"Ошибка: SQL файл не найден в проекте: {path}"
+            report.files = [rel_path]
+            report.findings = report.for_file(rel_path)
+            report.cached = [r for r in report.cached if r == rel_path]
+        return format_lint_report(report, path or "проект")
@@ -0,0 +1,42 @@
+import json
+from typing import Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from utils.file_utils import find_project_by_path
+from utils.sql_sandbox import DEFAULT_SAMPLE_ROWS, get_project_sandbox
+
+
+class SqlExplainToolSchema(BaseModel):
+    """Параметры проверки плана SQL запроса."""
+    query: str = Field(..., description="Один SELECT/WITH запрос для проверки")
+    analyze: bool = Field(default=False, description="Выполнить запрос на выборке данных и замерить время")
+
+
+class SqlExplainTool(BaseTool):
+    """EXPLAIN запроса в SQLite песочнице со схемой проекта."""
+    name: str = "Explain SQL query"
+    description: str = (
+        "Проверяет SQL запрос на схеме проекта (DDL из .sql файлов) во встроенной SQLite песочнице: "
+        "возвращает план выполнения, использованные индексы, полные сканирования таблиц, "
+        "сортировки во временном B-дереве и грубую оценку стоимости. С analyze=true запрос "
+        "выполняется на выборке данных с замером времени. Используй, чтобы проверить, что "
+        "оптимизированный запрос действительно использует индексы."
+    )
+    args_schema: Type[BaseModel] = SqlExplainToolSchema
+    project_path: str
+
+    def _run(self, query: str, analyze: bool = False) -> str:
+        settings = (find_project_by_path(self.project_path) or {}).get("sql_sandbox") or {}
+        try:
+            sandbox = get_project_sandbox(
+                self.project_path,
+                data=settings.get("data"),
+                sample_rows=settings.get("sample_rows", DEFAULT_SAMPLE_ROWS),
+            )
+            result = sandbox.explain(query, analyze=analyze)
+        except (ValueError, OSError) as e:
+            return f"Ошибка: {e}"
+        result["schema"] = sandbox.summary()
+        return json.dumps(result, ensure_ascii=False)
@@ -0,0 +1,253 @@
+"""Пакетное чтение файлов проекта за один вызов инструмента.
+
+Спецификация файла - путь относительно корня проекта, glob шаблон
+(`models/staging/*.sql`) или путь с диапазоном строк (`etl/load.py:40-120`).
+Файлы читаются параллельно через кэш read_file_cached и обрезаются по
+бюджету на файл и на весь ответ. Файлы больше бюджета читаются частично
+(начало или нужный диапазон строк), строки в них считаются потоково.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+from utils.file_utils import get_project_filter, is_path_valid, read_file_cached
+from utils.fs_walk import parallel_walk
+
+PER_FILE_BYTES = 16_000
+TOTAL_BYTES = 64_000
+MAX_FILES = 20
+READ_WORKERS = 8
+# Сверх бюджета файла читается немного больше: _trim режет по границе строки и отмечает обрезку
+READ_SLACK = 4096
+_CHUNK = 1 << 20
+
+_RANGE_RE = re.compile(r"^(.*?):(\d+)(?:-(\d+))?$")
+_GLOB_CHARS = set("*?[")
+
+
+def parse_spec(spec: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """Разбирает `путь[:начало[-конец]]` в (путь, первая строка, последняя строка)."""
+    match = _RANGE_RE.match(spec.strip())
+    if not match:
+        return spec.strip(), None, None
+    start = int(match.group(2))
+    end = int(match.group(3)) if match.group(3) else start
+    return match.group(1), max(1, start), max(start, end)
+
+
+def match_glob(rel_path: str, pattern: str) -> bool:
+    """Совпадение пути с шаблоном по сегментам: `*` не переходит через `/`.
+
+    `models/*.sql` совпадает с `models/a.sql`, но не с `models/staging/a.sql`;
+    `**` в шаблоне - любое число каталогов.
+    """
+    path_parts = PurePosixPath(rel_path).parts
+    pattern_parts = PurePosixPath(pattern).parts
+    if "**" not in pattern_parts:
+        return len(path_parts) == len(pattern_parts) and PurePosixPath(rel_path).match(pattern)
+    return _match_parts(path_parts, pattern_parts)
+
+
+def _match_parts(path_parts: Tuple[str, ...], pattern_parts: Tuple[str, ...]) -> bool:
+    if not pattern_parts:
+        return not path_parts
+    if pattern_parts[0] == "**":
+        return any(_match_parts(path_parts[i:], pattern_parts[1:]) for i in range(len(path_parts) + 1))
+    return (bool(path_parts) and PurePosixPath(path_parts[0]).match(pattern_parts[0])
+            and _match_parts(path_parts[1:], pattern_parts[1:]))
+
+
+def _inside(root: str, path: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+def expand_specs(project_path: str, specs: List[str], max_files: int = MAX_FILES) -> List[Dict]:
+    """Превращает спецификации в список файлов проекта (glob с учётом фильтра путей).
+
+    Args:
+        project_path: Путь к проекту.
+        specs: Пути, glob шаблоны или пути с диапазоном строк.
+        max_files: Максимум файлов в результате.
+
+    Returns:
+        Словари {"path", "start", "end"} либо {"path", "error"} для недопустимых спецификаций.
+    """
+    root = os.path.realpath(project_path)
+    entries: List[Dict] = []
+    seen = set()
+    rel_files: Optional[List[str]] = None
+    for spec in specs:
+        path, start, end = parse_spec(spec)
+        path = path[2:] if path.startswith("./") else path
+        if _GLOB_CHARS & set(path):
+            if rel_files is None:
+                # Обход проекта один раз на вызов, только если есть шаблоны
+                rel_files = sorted(
+                    f"{rel_root}/{name}" if rel_root else name
+                    for _, rel_root, _, files in parallel_walk(root, get_project_filter(project_path))
+                    for name in files
+                )
+            matches = [f for f in rel_files if match_glob(f, path)]
+            if not matches:
+                entries.append({"path": spec, "error": "нет файлов по шаблону"})
+            candidates = [(m, start, end) for m in matches]
+        else:
+            candidates = [(path, start, end)]
+        for rel_path, first, last in candidates:
+            target = os.path.realpath(os.path.join(root, rel_path))
+            if not _inside(root, target):
+                entries.append({"path": rel_path, "error": "путь вне проекта"})
+                continue
+            key = (target, first, last)
+            if key in seen:
+                continue
+            seen.add(key)
+            entries.append({"path": os.path.relpath(target, root), "abs_path": target, "start": first, "end": last})
+    result, files, skipped = [], 0, 0
+    for entry in entries:
+        if "error" not in entry:
+            files += 1
+            if files > max_files:
+                skipped += 1
+                continue
+        result.append(entry)
+    if skipped:
+        result.append({"path": f"... ещё {skipped} файлов", "error": f"превышен лимит {max_files} файлов"})
+    return result
+
+
+def _read_partial(path: str, start: Optional[int], end: Optional[int], limit: int) -> Tuple[bytes, bytes, int]:
+    """Читает из большого файла не больше limit байт: начало или строки start..end.
+
+    Returns:
+        (первые байты файла для проверки на бинарность, прочитанные байты, число строк файла).
+    """
+    newlines, last = 0, b""
+    with open(path, "rb") as f:
+        head = f.read(8192)
+        f.seek(0)
+        if start is None:
+            data = f.read(limit)
+            newlines, last = data.count(b"\n"), data[-1:]
+        else:
+            parts, size, line = [], 0, 1
+            while line <= end:
+                # readline с ограничением: очень длинная строка не читается в память целиком
+                piece = f.readline(_CHUNK)
+                if not piece:
+                    break
+                if line >= start and size < limit:
+                    parts.append(piece[:limit - size])
+                    size += len(parts[-1])
+                if piece.endswith(b"\n"):
+                    newlines += 1
+                    line += 1
+                last = piece[-1:]
+            data = b"".join(parts)
+        # Остаток файла - только подсчёт строк
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            newlines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return head, data, newlines + (1 if last and last != b"\n" else 0)
+
+
+def _read_entry(entry: Dict, per_file_bytes: int = PER_FILE_BYTES) -> Dict:
+    limit = per_file_bytes + READ_SLACK
+    try:
+        if os.path.getsize(entry["abs_path"]) > limit:
+            head, data, total_lines = _read_partial(entry["abs_path"], entry.get("start"), entry.get("end"), limit)
+        else:
+            head = data = read_file_cached(entry["abs_path"])
+            total_lines = None
+    except FileNotFoundError:
+        return {"path": entry["path"], "error": "файл не найден"}
+    except OSError as e:
+        return {"path": entry["path"], "error": str(e)}
+    if b"\0" in head[:8192]:
+        return {"path": entry["path"], "error": "бинарный файл"}
+    text = data.decode("utf-8", errors="replace")
+    if total_lines is None:
+        total_lines = text.count("\n") + (0 if text.endswith("\n") or not text else 1)
+        if entry.get("start"):
+            lines = text.splitlines(keepends=True)
+            text = "".join(lines[entry["start"] - 1:entry["end"]])
+    return {"path": entry["path"], "start": entry.get("start"), "end": entry.get("end"),
+            "lines": total_lines, "text": text}
+
+
+def _trim(text: str, budget: int) -> Tuple[str, bool]:
+    data = text.encode("utf-8")
+    if len(data) <= budget:
+        return text, False
+    cut = data[:budget].decode("utf-8", errors="ignore")
+    # Обрезаем по границе строки, если она недалеко
+    newline = cut.rfind("\n")
+    if newline > len(cut) // 2:
+        cut = cut[:newline + 1]
+    return cut, True
+
+
+def read_project_files(project_path: str, specs: List[str], per_file_bytes: int = PER_FILE_BYTES,
+                       total_bytes: int = TOTAL_BYTES, max_files: int = MAX_FILES,
+                       workers: int = READ_WORKERS) -> List[Dict]:
+    """Параллельно читает несколько файлов проекта в пределах бюджета байт.
+
+    Args:
+        project_path: Путь к проекту.
+        specs: Пути, glob шаблоны или пути с диапазоном строк.
+        per_file_bytes: Бюджет на один файл.
+        total_bytes: Бюджет на все файлы вместе (файлы сверх него не включаются).
+        max_files: Максимум файлов.
+        workers: Потоков чтения.
+
+    Returns:
+        Словари {"path", "text", "lines", "truncated", ...} или {"path", "error"} в порядке спецификаций.
+
+    Raises:
+        ValueError: Если путь проекта не существует.
+    """
+    if not is_path_valid(project_path):
+        raise ValueError(f"Путь не существует или не является директорией: {project_path}")
+    entries = expand_specs(project_path, specs, max_files)
+    readable = [e for e in entries if "error" not in e]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(readable) or 1))) as pool:
+        read = iter(list(pool.map(lambda e: _read_entry(e, per_file_bytes), readable)))
+
+    results = []
+    remaining = total_bytes
+    for entry in entries:
+        if "error" in entry:
+            results.append(entry)
+            continue
+        result = next(read)
+        if "error" not in result:
+            if remaining <= 0:
+                result = {"path": result["path"], "error": "не включён: исчерпан общий бюджет ответа"}
+            else:
+                text, truncated = _trim(result["text"], min(per_file_bytes, remaining))
+                remaining -= len(text.encode("utf-8"))
+                result.update(text=text, truncated=truncated)
+        results.append(result)
+    return results
+
+
+def format_read_results(results: List[Dict]) -> str:
+    """Один текстовый ответ: заголовок и содержимое каждого файла."""
+    parts = []
+    for r in results:
+        if "error" in r:
+            parts.append(f"=== {r['path']} ===\nОшибка: {r['error']}")
+            continue
+        header = f"=== {r['path']}"
+        if r.get("start"):
+            header += f" (строки {r['start']}-{r['end']} из {r['lines']})"
+        else:
+            header += f" ({r['lines']} строк)"
+        body = r["text"].rstrip("\n")
+        if r.get("truncated"):
+            body += "\n... [обрезано по бюджету - запроси диапазон строк]"
+        parts.append(f"{header} ===\n{body}")
+    return "\n\n".join(parts)
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+
+def cache_dir(*parts: str) -> str:
+    """Возвращает (и создаёт) директорию локального кэша.
+
+    Корень задаётся переменной CREW_CACHE_DIR, по умолчанию `.cache/crew`.
+
+    Args:
+        parts: Поддиректории внутри корня кэша.
+
+    Returns:
+        Путь к директории.
+    """
+    path = os.path.join(os.getenv("CREW_CACHE_DIR", os.path.join(".cache", "crew")), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def slugify(name: str) -> str:
+    """Безопасное имя файла из произвольной строки (имени проекта, пути)."""
+    slug = re.sub(r"[^\w.-]+", "_", name).strip("._")
+    return slug or hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+
+
+def git_blob_hash(data: bytes) -> str:
+    """Хэш содержимого в формате git blob (совпадает с `git hash-object`)."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """Хэш содержимого файла в формате git blob.
+
+    Args:
+        path: Путь к файлу.
+
+    Returns:
+        40-символьный sha1.
+    """
+    with open(path, "rb") as f:
+        return git_blob_hash(f.read())
+
+
+class JsonStore:
+    """Словарь, сохраняемый в JSON файл с атомарной записью.
+
+    Подходит для небольших кэшей (результаты review, документация по модулям),
+    которые целиком помещаются в память.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def _load(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            # Повреждённый кэш не должен ломать запрос - начинаем с пустого
+            return {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self.data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self.data[key] = value
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
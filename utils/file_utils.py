@@ -1,8 +1,16 @@
+import base64
+import heapq
+import json
 import os
+import threading
 import yaml
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 
+from utils.fs_walk import parallel_walk, scan_tree
+from utils.path_filter import PathFilter, PatternRanker, build_path_filter
+
 
 def load_config(config_path: str = "config.yaml") -> Dict:
     """Загружает конфигурацию из YAML файла.
@@ -83,6 +91,92 @@ def is_path_valid(path: str) -> bool:
     return os.path.exists(path) and os.path.isdir(path)
 
 
+def find_project_by_path(project_path: str, config_path: str = "config.yaml") -> Optional[Dict]:
+    """Ищет проект в конфигурации по пути к нему.
+
+    Args:
+        project_path: Путь к проекту.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        Словарь с информацией о проекте или None.
+    """
+    try:
+        config = load_config(config_path)
+    except FileNotFoundError:
+        return None
+    target = os.path.realpath(project_path)
+    for project in config.get("projects", []):
+        if project.get("path") and os.path.realpath(project["path"]) == target:
+            return project
+    return None
+
+
+_filter_cache: Dict[str, Tuple[Tuple, PathFilter]] = {}
+_filter_lock = threading.Lock()
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def get_project_filter(project_path: str, config_path: str = "config.yaml") -> PathFilter:
+    """Возвращает фильтр путей проекта: .gitignore + include/exclude из config.yaml.
+
+    Фильтр компилируется один раз и пересобирается только при изменении
+    .gitignore или правил проекта в конфигурации.
+
+    Args:
+        project_path: Путь к проекту.
+        config_path: Путь к конфигурационному файлу.
+
+    Returns:
+        PathFilter проекта.
+    """
+    project = find_project_by_path(project_path, config_path) or {}
+    exclude = tuple(project.get("exclude") or ())
+    include = tuple(project.get("include") or ())
+    signature = (
+        _mtime(os.path.join(project_path, ".gitignore")),
+        _mtime(os.path.join(project_path, ".git", "info", "exclude")),
+        exclude,
+        include,
+    )
+    key = os.path.realpath(project_path)
+    with _filter_lock:
+        cached = _filter_cache.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+    path_filter = build_path_filter(project_path, exclude, include or None)
+    with _filter_lock:
+        _filter_cache[key] = (signature, path_filter)
+    return path_filter
+
+
+def iter_project_files(project_path: str, extensions: Optional[List[str]] = None) -> Iterator[str]:
+    """Лениво перечисляет файлы проекта с указанными расширениями.
+
+    Args:
+        project_path: Путь к проекту.
+        extensions: Список расширений файлов (например, [".py", ".sql"]).
+                   Если None, возвращает все файлы.
+
+    Yields:
+        Пути к файлам.
+    """
+    if not is_path_valid(project_path):
+        raise ValueError(f"Путь не существует или не является директорией: {project_path}")
+    
+    # Директории сканируются параллельно, порядок выдачи не гарантирован
+    for root, _, _, filenames in parallel_walk(project_path, get_project_filter(project_path)):
+        for filename in filenames:
+            if extensions is None or any(filename.endswith(ext) for ext in extensions):
+                yield os.path.join(root, filename)
+
+
 def get_project_files(project_path: str, extensions: Optional[List[str]] = None) -> List[str]:
     """Возвращает список файлов проекта с указанными расширениями.
 
@@ -97,14 +191,7 @@ def get_project_files(project_path: str, extensions: Optional[List[str]] = None)
     if not is_path_valid(project_path):
         raise ValueError(f"Путь не существует или не является директорией: {project_path}")
     
-    files = []
-    
-    for root, _, filenames in os.walk(project_path):
-        for filename in filenames:
-            if extensions is None or any(filename.endswith(ext) for ext in extensions):
-                files.append(os.path.join(root, filename))
-    
-    return files
+    return list(iter_project_files(project_path, extensions))
 
 
 def get_file_content(file_path: str, max_lines: int = 1000) -> str:
@@ -136,9 +223,72 @@ def get_file_content(file_path: str, max_lines: int = 1000) -> str:
         raise ValueError(f"Не удалось прочитать файл как текст: {file_path}")
 
 
+def _entry_size(entry: os.DirEntry) -> int:
+    # Битая симлинка или файл, удалённый во время обхода, не должны ронять листинг каталога
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return 0
+
+
+def iter_project_structure(project_path: str, max_depth: int = 3) -> Iterator[Dict]:
+    """Лениво обходит дерево проекта с учётом фильтра путей.
+
+    Для каждой директории сначала выдаются её записи (по имени), затем
+    содержимое поддиректорий. В памяти - только очередь ещё не открытых
+    директорий, а не всё дерево.
+
+    Args:
+        project_path: Путь к проекту.
+        max_depth: Максимальная глубина (1 - только корень проекта).
+
+    Yields:
+        Записи {"path", "name", "type", "depth", "size"}; директории на
+        глубине max_depth помечаются "truncated": True.
+    """
+    if not is_path_valid(project_path):
+        raise ValueError(f"Путь не существует или не является директорией: {project_path}")
+    
+    path_filter = get_project_filter(project_path)
+    # Стек директорий к обходу: (абсолютный путь, относительный путь с "/", глубина)
+    stack = [(project_path, "", 0)]
+    while stack:
+        path, rel, depth = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except PermissionError:
+            yield {"path": rel, "name": "Access denied", "type": "error", "depth": depth + 1, "size": 0}
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            rel_entry = f"{rel}{entry.name}"
+            is_dir = entry.is_dir()
+            if (path_filter.is_dir_excluded if is_dir else path_filter.is_file_excluded)(rel_entry):
+                continue
+            item = {
+                "path": rel_entry,
+                "name": entry.name,
+                "type": "dir" if is_dir else "file",
+                "depth": depth + 1,
+                "size": 0 if is_dir else _entry_size(entry),
+            }
+            if is_dir and depth + 1 >= max_depth:
+                item["truncated"] = True
+            yield item
+            if is_dir and depth + 1 < max_depth:
+                # Поддиректории обходим после файлов текущего уровня, сохраняя порядок
+                subdirs.append((entry.path, rel_entry + "/", depth + 1))
+        stack.extend(reversed(subdirs))
+
+
 def get_project_structure(project_path: str, max_depth: int = 3) -> Dict:
     """Возвращает структуру проекта в виде древовидной структуры.
 
+    Директории сканируются параллельно (важно для сетевых ФС). Для больших
+    проектов используйте iter_project_structure или list_project_dir.
+
     Args:
         project_path: Путь к проекту.
         max_depth: Максимальная глубина просмотра.
@@ -149,25 +299,173 @@ def get_project_structure(project_path: str, max_depth: int = 3) -> Dict:
     if not is_path_valid(project_path):
         raise ValueError(f"Путь не существует или не является директорией: {project_path}")
     
-    def build_tree(path: str, depth: int) -> Dict:
-        if depth > max_depth:
-            return {}
-        
-        result: Dict = {"name": os.path.basename(path), "type": "dir" if os.path.isdir(path) else "file"}
-        
-        if os.path.isdir(path):
-            children = []
-            try:
-                for item in sorted(os.listdir(path)):
-                    item_path = os.path.join(path, item)
-                    children.append(build_tree(item_path, depth + 1))
-            except PermissionError:
-                children = [{"name": "Access denied", "type": "error"}]
-            result["children"] = children
-        
-        return result
+    denied = set()
+    
+    def on_error(rel_dir: str, error: OSError):
+        if isinstance(error, PermissionError):
+            denied.add(rel_dir)
+    
+    # Все директории до max_depth читаются параллельно, затем дерево собирается в памяти
+    listings = scan_tree(
+        project_path,
+        get_project_filter(project_path),
+        max_depth=max(max_depth - 1, 0),
+        follow_links=True,
+        onerror=on_error,
+    )
+    
+    def build(name: str, rel: str, depth: int) -> Dict:
+        node: Dict = {"name": name, "type": "dir", "children": []}
+        if rel in denied:
+            node["children"].append({"name": "Access denied", "type": "error"})
+            return node
+        dirs, files = listings.get(rel, ([], []))
+        entries = sorted([(d, True) for d in dirs] + [(f, False) for f in files])
+        for entry, is_dir in entries:
+            if not is_dir:
+                node["children"].append({"name": entry, "type": "file"})
+                continue
+            child_rel = f"{rel}/{entry}" if rel else entry
+            if depth + 1 >= max_depth:
+                node["children"].append({"name": entry, "type": "dir", "children": [], "truncated": True})
+            else:
+                node["children"].append(build(entry, child_rel, depth + 1))
+        return node
+    
+    return build(os.path.basename(os.path.normpath(project_path)), "", 0)
+
+
+SORT_KEYS = {
+    "name": lambda item: (item["name"],),
+    "size": lambda item: (-item["size"], item["name"]),
+}
+
+
+def _encode_cursor(key: Tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key), ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple:
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Некорректный cursor: {cursor}")
+
+
+def list_project_dir(project_path: str, rel_path: str = "", limit: int = 100, offset: int = 0,
+                     cursor: Optional[str] = None, sort_by: str = "name") -> Dict:
+    """Постраничный просмотр содержимого одной директории проекта.
+
+    Директория читается потоково, в памяти держится только limit + offset
+    лучших записей (heapq), поэтому стоимость не зависит от размера дерева.
+
+    Args:
+        project_path: Путь к проекту.
+        rel_path: Директория относительно корня проекта ("" - корень).
+        limit: Размер страницы.
+        offset: Смещение (игнорируется, если передан cursor).
+        cursor: Курсор из next_cursor предыдущей страницы.
+        sort_by: "name" или "size" (по убыванию).
+
+    Returns:
+        {"path", "items", "total", "next_cursor"}.
+
+    Raises:
+        ValueError: Если путь вне проекта, не директория или неверные параметры.
+    """
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"sort_by должен быть одним из: {', '.join(SORT_KEYS)}")
+    root = os.path.realpath(project_path)
+    rel_path = rel_path.strip("/")
+    target = os.path.realpath(os.path.join(root, rel_path))
+    if target != root and not target.startswith(root + os.sep):
+        raise ValueError(f"Путь вне проекта: {rel_path}")
+    if not is_path_valid(target):
+        raise ValueError(f"Путь не существует или не является директорией: {rel_path}")
+    
+    key_fn = SORT_KEYS[sort_by]
+    after = _decode_cursor(cursor) if cursor else None
+    if after is not None:
+        offset = 0
+    path_filter = get_project_filter(project_path)
+    prefix = f"{rel_path}/" if rel_path else ""
+    total = 0
     
-    return build_tree(project_path, 0)
+    def entries() -> Iterator[Dict]:
+        nonlocal total
+        with os.scandir(target) as it:
+            for entry in it:
+                rel_entry = prefix + entry.name
+                is_dir = entry.is_dir()
+                if (path_filter.is_dir_excluded if is_dir else path_filter.is_file_excluded)(rel_entry):
+                    continue
+                total += 1
+                item = {
+                    "name": entry.name,
+                    "path": rel_entry,
+                    "type": "dir" if is_dir else "file",
+                    "size": 0 if is_dir else _entry_size(entry),
+                }
+                if after is None or key_fn(item) > after:
+                    yield item
+    
+    best = heapq.nsmallest(offset + limit + 1, entries(), key=key_fn)
+    page = best[offset:offset + limit]
+    has_more = len(best) > offset + limit
+    return {
+        "path": rel_path,
+        "items": page,
+        "total": total,
+        "next_cursor": _encode_cursor(key_fn(page[-1])) if has_more and page else None,
+    }
+
+
+# Кэш прочитанных файлов: realpath -> ((mtime_ns, size), bytes), ограничен по суммарному объёму
+READ_CACHE_BYTES = int(os.getenv("READ_CACHE_BYTES", str(64 * 1024 * 1024)))
+_read_cache: "OrderedDict[str, Tuple[Tuple[int, int], bytes]]" = OrderedDict()
+_read_cache_size = 0
+_read_cache_lock = threading.Lock()
+
+
+def read_file_cached(file_path: str) -> bytes:
+    """Читает файл целиком через кэш процесса, проверяя mtime и размер.
+
+    Повторные чтения неизменённого файла (разными агентами и запросами)
+    не обращаются к диску. Кэш вытесняет давно не использованные файлы,
+    когда суммарный объём превышает READ_CACHE_BYTES.
+
+    Args:
+        file_path: Путь к файлу.
+
+    Returns:
+        Содержимое файла.
+
+    Raises:
+        OSError: Если файл не удаётся прочитать.
+    """
+    global _read_cache_size
+    key = os.path.realpath(file_path)
+    stat = os.stat(key)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _read_cache_lock:
+        cached = _read_cache.get(key)
+        if cached and cached[0] == signature:
+            _read_cache.move_to_end(key)
+            return cached[1]
+    with open(key, "rb") as f:
+        data = f.read()
+    if len(data) > READ_CACHE_BYTES // 4:
+        return data
+    with _read_cache_lock:
+        previous = _read_cache.pop(key, None)
+        if previous:
+            _read_cache_size -= len(previous[1])
+        _read_cache[key] = (signature, data)
+        _read_cache_size += len(data)
+        while _read_cache_size > READ_CACHE_BYTES and _read_cache:
+            _, (_, evicted) = _read_cache.popitem(last=False)
+            _read_cache_size -= len(evicted)
+    return data
 
 
 def find_files_by_pattern(project_path: str, pattern: str) -> List[str]:
@@ -187,21 +485,23 @@ def find_files_by_pattern(project_path: str, pattern: str) -> List[str]:
     
     matches = []
     
-    for root, _, filenames in os.walk(project_path):
+    for root, _, _, filenames in parallel_walk(project_path, get_project_filter(project_path)):
         for filename in filenames:
             if fnmatch(filename, pattern):
                 matches.append(os.path.join(root, filename))
     
-    return matches
+    return sorted(matches)
 
 
-def scan_project_structure(project_path: str, max_depth: int = 2, max_files: int = 50) -> str:
+def scan_project_structure(project_path: str, max_depth: int = 2, max_files: int = 50,
+                           path_filter: Optional[PathFilter] = None) -> str:
     """Сканирует структуру проекта и возвращает текстовое представление.
 
     Args:
         project_path: Путь к проекту.
         max_depth: Максимальная глубина сканирования.
         max_files: Максимальное количество файлов для отображения.
+        path_filter: Фильтр путей (по умолчанию фильтр проекта).
 
     Returns:
         Текстовое представление структуры проекта.
@@ -209,37 +509,21 @@ def scan_project_structure(project_path: str, max_depth: int = 2, max_files: int
     if not is_path_valid(project_path):
         return "Путь не существует"
     
-    ignored_dirs = {
-        ".git", "venv", ".venv", "__pycache__", ".pytest_cache", 
-        ".mypy_cache", ".ruff_cache", ".idea", ".vscode", "node_modules",
-        ".tox", ".eggs", "*.egg-info", "dist", "build", ".cache"
-    }
-    ignored_files = {".DS_Store", "Thumbs.db", ".gitignore"}
+    if path_filter is None:
+        path_filter = get_project_filter(project_path)
     
+    # Листинги всех директорий до max_depth читаются параллельно через scandir,
+    # дальше дерево рендерится из памяти без обращений к ФС
+    listings = scan_tree(project_path, path_filter, max_depth=max_depth)
     lines = []
     file_count = 0
     
-    def walk(path: str, prefix: str = "", depth: int = 0):
+    def walk(rel: str = "", prefix: str = "", depth: int = 0):
         nonlocal file_count
-        if depth > max_depth or file_count >= max_files:
-            return
-        
-        try:
-            entries = sorted(os.listdir(path))
-        except PermissionError:
+        if depth > max_depth or file_count >= max_files or rel not in listings:
             return
         
-        dirs = []
-        files = []
-        
-        for entry in entries:
-            if entry in ignored_dirs or entry in ignored_files:
-                continue
-            full_path = os.path.join(path, entry)
-            if os.path.isdir(full_path):
-                dirs.append(entry)
-            else:
-                files.append(entry)
+        dirs, files = listings[rel]
         
         for f in files:
             if file_count >= max_files:
@@ -254,12 +538,67 @@ def scan_project_structure(project_path: str, max_depth: int = 2, max_files: int
             is_last = (i == len(dirs) - 1)
             lines.append(f"{prefix}{d}/")
             new_prefix = prefix + ("    " if is_last else "│   ")
-            walk(os.path.join(path, d), new_prefix, depth + 1)
+            walk(f"{rel}/{d}" if rel else d, new_prefix, depth + 1)
     
-    walk(project_path)
+    walk()
     return "\n".join(lines) if lines else "(пусто)"
 
 
+# Приоритетные паттерны (в порядке важности)
+KEY_FILE_PATTERNS = [
+    # Документация
+    ("README*", 1),
+    ("CHANGELOG*", 2),
+    ("docs/*.md", 3),
+    # Конфигурация проекта
+    ("pyproject.toml", 1),
+    ("setup.py", 1),
+    ("setup.cfg", 2),
+    ("package.json", 1),
+    ("Cargo.toml", 1),
+    ("go.mod", 1),
+    ("pom.xml", 1),
+    ("build.gradle", 1),
+    # Конфиги приложения
+    ("config.yaml", 1),
+    ("config.yml", 1),
+    ("config.json", 1),
+    ("*.config.js", 2),
+    ("*.config.ts", 2),
+    (".env.example", 2),
+    ("settings.py", 2),
+    ("conf/*.yaml", 3),
+    ("conf/*.yml", 3),
+    # Зависимости
+    ("requirements.txt", 1),
+    ("requirements*.txt", 2),
+    ("Pipfile", 2),
+    ("poetry.lock", 3),
+    # Точки входа
+    ("main.py", 1),
+    ("app.py", 1),
+    ("__main__.py", 1),
+    ("index.js", 1),
+    ("index.ts", 1),
+    ("src/main.*", 2),
+    ("src/index.*", 2),
+    ("src/app.*", 2),
+    # CI/CD
+    (".github/workflows/*.yml", 3),
+    (".gitlab-ci.yml", 3),
+    ("Dockerfile", 2),
+    ("docker-compose.yml", 2),
+    ("Makefile", 2),
+    # Тесты
+    ("tests/test_*.py", 3),
+    ("test_*.py", 3),
+    ("*_test.py", 3),
+]
+
+# Все шаблоны скомпилированы в одно регулярное выражение вместо fnmatch в цикле
+_KEY_FILE_RANKER = PatternRanker([pattern for pattern, _ in KEY_FILE_PATTERNS])
+
+
 def find_key_files(project_path: str, max_files: int = 15) -> List[str]:
     """Автоматически определяет ключевые файлы проекта.
 
@@ -275,93 +614,17 @@ def find_key_files(project_path: str, max_files: int = 15) -> List[str]:
     if not is_path_valid(project_path):
         return []
     
-    key_files = []
-    
-    # Приоритетные паттерны (в порядке важности)
-    priority_patterns = [
-        # Документация
-        ("README*", 1),
-        ("CHANGELOG*", 2),
-        ("docs/*.md", 3),
-        # Конфигурация проекта
-        ("pyproject.toml", 1),
-        ("setup.py", 1),
-        ("setup.cfg", 2),
-        ("package.json", 1),
-        ("Cargo.toml", 1),
-        ("go.mod", 1),
-        ("pom.xml", 1),
-        ("build.gradle", 1),
-        # Конфиги приложения
-        ("config.yaml", 1),
-        ("config.yml", 1),
-        ("config.json", 1),
-        ("*.config.js", 2),
-        ("*.config.ts", 2),
-        (".env.example", 2),
-        ("settings.py", 2),
-        ("conf/*.yaml", 3),
-        ("conf/*.yml", 3),
-        # Зависимости
-        ("requirements.txt", 1),
-        ("requirements*.txt", 2),
-        ("Pipfile", 2),
-        ("poetry.lock", 3),
-        # Точки входа
-        ("main.py", 1),
-        ("app.py", 1),
-        ("__main__.py", 1),
-        ("index.js", 1),
-        ("index.ts", 1),
-        ("src/main.*", 2),
-        ("src/index.*", 2),
-        ("src/app.*", 2),
-        # CI/CD
-        (".github/workflows/*.yml", 3),
-        (".gitlab-ci.yml", 3),
-        ("Dockerfile", 2),
-        ("docker-compose.yml", 2),
-        ("Makefile", 2),
-        # Тесты
-        ("tests/test_*.py", 3),
-        ("test_*.py", 3),
-        ("*_test.py", 3),
-    ]
-    
-    from fnmatch import fnmatch
-    
     found = {}  # path -> priority
     
-    ignored_dirs = {
-        ".git", "venv", ".venv", "__pycache__", ".pytest_cache", 
-        ".mypy_cache", ".ruff_cache", ".idea", ".vscode", "node_modules",
-        ".tox", ".eggs", "dist", "build", ".cache"
-    }
-    
-    for root, dirs, files in os.walk(project_path):
-        # Пропускаем игнорируемые директории
-        dirs[:] = [d for d in dirs if d not in ignored_dirs]
-        
-        rel_root = os.path.relpath(root, project_path)
-        if rel_root == ".":
-            rel_root = ""
-        
+    for root, rel_root, _, files in parallel_walk(project_path, get_project_filter(project_path)):
         for filename in files:
-            if rel_root:
-                rel_path = f"{rel_root}/{filename}"
-            else:
-                rel_path = filename
-            
-            full_path = os.path.join(root, filename)
-            
-            for pattern, priority in priority_patterns:
-                if fnmatch(rel_path, pattern) or fnmatch(filename, pattern):
-                    if full_path not in found or found[full_path] > priority:
-                        found[full_path] = priority
-                    break
+            rel_path = f"{rel_root}/{filename}" if rel_root else filename
+            index = _KEY_FILE_RANKER.first_match(rel_path, filename)
+            if index is not None:
+                found[os.path.join(root, filename)] = KEY_FILE_PATTERNS[index][1]
     
-    # Сортируем по приоритету и берём top N
-    sorted_files = sorted(found.items(), key=lambda x: x[1])
+    # Сортируем по приоритету (при равном - по пути) и берём top N
+    sorted_files = sorted(found.items(), key=lambda x: (x[1], x[0]))
     key_files = [path for path, _ in sorted_files[:max_files]]
     
     return key_files
@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.path_filter import PathFilter
+
+# На сетевых ФС (NFS/SMB) каждый вызов - сетевой round trip, поэтому
+# директории сканируются параллельно; для локального диска хватает 1-4
+DEFAULT_WORKERS = int(os.getenv("FS_WALK_WORKERS", "8"))
+
+WalkItem = Tuple[str, str, List[str], List[str]]
+ErrorHandler = Callable[[str, OSError], None]
+
+
+def _scan_dir(path: str, rel_dir: str, path_filter: Optional[PathFilter], follow_links: bool,
+              onerror: Optional[ErrorHandler]) -> Tuple[WalkItem, List[str]]:
+    """Читает одну директорию через os.scandir (тип записи из dirent, без stat).
+
+    Returns:
+        ((путь, относительный путь, директории, файлы), директории для обхода).
+    """
+    prefix = f"{rel_dir}/" if rel_dir else ""
+    dirs: List[str] = []
+    files: List[str] = []
+    descend: List[str] = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                rel_entry = prefix + entry.name
+                if entry.is_dir():
+                    if path_filter is None or not path_filter.is_dir_excluded(rel_entry):
+                        dirs.append(entry.name)
+                        # Как os.walk: симлинки на директории показываем, но обходим только по запросу
+                        if follow_links or not entry.is_symlink():
+                            descend.append(entry.name)
+                elif path_filter is None or not path_filter.is_file_excluded(rel_entry):
+                    files.append(entry.name)
+    except OSError as e:
+        if onerror is not None:
+            onerror(rel_dir, e)
+    dirs.sort()
+    files.sort()
+    return (path, rel_dir, dirs, files), sorted(descend)
+
+
+def parallel_walk(
+    root: str,
+    path_filter: Optional[PathFilter] = None,
+    max_workers: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    follow_links: bool = False,
+    onerror: Optional[ErrorHandler] = None,
+) -> Iterator[WalkItem]:
+    """Обход дерева с параллельным сканированием поддиректорий.
+
+    Порядок выдачи директорий не детерминирован (по мере готовности),
+    списки внутри одной директории отсортированы.
+
+    Args:
+        root: Корневая директория.
+        path_filter: Фильтр путей; исключённые директории не сканируются.
+        max_workers: Размер пула потоков (1 - последовательный обход).
+        max_depth: Максимальная глубина сканируемых директорий (корень - 0).
+        follow_links: Заходить в симлинки на директории.
+        onerror: Вызывается с (относительный путь, ошибка) для нечитаемых директорий;
+            по умолчанию такие директории молча пропускаются, как в os.walk.
+
+    Yields:
+        (абсолютный путь, относительный posix путь, директории, файлы).
+    """
+    workers = max_workers or DEFAULT_WORKERS
+    if workers <= 1:
+        stack = [(root, "", 0)]
+        while stack:
+            path, rel_dir, depth = stack.pop()
+            item, descend = _scan_dir(path, rel_dir, path_filter, follow_links, onerror)
+            yield item
+            if max_depth is None or depth < max_depth:
+                stack.extend(
+                    (os.path.join(path, d), f"{rel_dir}/{d}" if rel_dir else d, depth + 1)
+                    for d in reversed(descend)
+                )
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fs-walk")
+    try:
+        pending: Dict[Future, int] = {
+            pool.submit(_scan_dir, root, "", path_filter, follow_links, onerror): 0
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                depth = pending.pop(future)
+                item, descend = future.result()
+                path, rel_dir = item[0], item[1]
+                if max_depth is None or depth < max_depth:
+                    for d in descend:
+                        child_rel = f"{rel_dir}/{d}" if rel_dir else d
+                        future_child = pool.submit(
+                            _scan_dir, os.path.join(path, d), child_rel, path_filter, follow_links, onerror
+                        )
+                        pending[future_child] = depth + 1
+                yield item
+    finally:
+        # Потребитель мог остановиться раньше: не ждём оставшиеся сканирования
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_tree(
+    root: str,
+    path_filter: Optional[PathFilter] = None,
+    max_workers: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    follow_links: bool = False,
+    onerror: Optional[ErrorHandler] = None,
+) -> Dict[str, Tuple[List[str], List[str]]]:
+    """Параллельно читает дерево в словарь {относительный путь: (директории, файлы)}.
+
+    Args:
+        root: Корневая директория.
+        path_filter: Фильтр путей.
+        max_workers: Размер пула потоков.
+        max_depth: Максимальная глубина сканируемых директорий.
+        follow_links: Заходить в симлинки на директории.
+        onerror: Обработчик ошибок чтения директорий.
+
+    Returns:
+        Листинги директорий; корень под ключом "".
+    """
+    return {
+        rel_dir: (dirs, files)
+        for _, rel_dir, dirs, files in parallel_walk(root, path_filter, max_workers, max_depth, follow_links, onerror)
+    }
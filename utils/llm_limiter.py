@@ -0,0 +1,244 @@
+"""Адаптивное ограничение параллельных вызовов LLM по провайдерам (AIMD).
+
+Ollama, vLLM и облачный zai по-разному переносят параллельную нагрузку:
+Ollama теряет пропускную способность при лишних запросах, а vLLM простаивает
+без батчей. Для каждого провайдера держится окно - число одновременных
+вызовов. Успешный вызов при заполненном окне расширяет его на 1/окно
+(примерно +1 за "круг" вызовов), а 429/5xx, таймаут или рост задержки на
+токен ответа относительно базовой сужают окно в decrease раз - не чаще раза
+на поколение вызовов. Вызовы сверх окна ждут в очереди.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from utils.file_utils import load_config
+from utils.memory import estimate_tokens
+
+# Провайдер -> (начальное окно, минимум, максимум)
+PROVIDER_LIMITS = {
+    "ollama": (1, 1, 4),
+    "vllm": (4, 1, 32),
+    "zai": (2, 1, 8),
+}
+DEFAULT_LIMITS = (2, 1, 8)
+DECREASE_FACTOR = 0.5
+# Во сколько раз задержка на токен может превысить базовую до сужения окна
+LATENCY_TOLERANCE = 2.0
+# Ответ короче этого (в токенах) не даёт осмысленной задержки на токен
+_MIN_TOKENS = 16
+_FAST_ALPHA = 0.3
+_SLOW_ALPHA = 0.05
+
+
+def overload_status(error: BaseException) -> Optional[int]:
+    """HTTP статус перегрузки (429, 5xx) из исключения клиента LLM или None.
+
+    Таймауты соединения считаются перегрузкой со статусом 504.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and (status == 429 or status >= 500):
+        return status
+    if status is None and "timeout" in type(error).__name__.lower():
+        return 504
+    return None
+
+
+class AIMDLimiter:
+    """Окно параллельных вызовов одного провайдера с очередью (потокобезопасно)."""
+
+    def __init__(self, name: str, initial: int = DEFAULT_LIMITS[0], min_limit: int = DEFAULT_LIMITS[1],
+                 max_limit: int = DEFAULT_LIMITS[2], decrease: float = DECREASE_FACTOR,
+                 latency_tolerance: float = LATENCY_TOLERANCE):
+        """
+        Args:
+            name: Имя провайдера.
+            initial: Начальное окно.
+            min_limit: Минимальное окно.
+            max_limit: Максимальное окно.
+            decrease: Множитель окна при перегрузке.
+            latency_tolerance: Допустимый рост задержки на токен относительно базовой.
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.queued = 0
+        self.stats = {"calls": 0, "errors": 0, "overloads": 0, "increases": 0, "decreases": 0}
+        self.last_overload = ""
+        self._latency: Optional[float] = None
+        self._per_token_fast: Optional[float] = None
+        self._per_token_base: Optional[float] = None
+        self._wait: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def for_provider(cls, provider: str, config_path: str = "config.yaml") -> "AIMDLimiter":
+        """Лимитер с окнами PROVIDER_LIMITS, переопределёнными секцией `llm_concurrency` config.yaml."""
+        initial, min_limit, max_limit = PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS)
+        try:
+            config = (load_config(config_path).get("llm_concurrency") or {}).get(provider) or {}
+        except FileNotFoundError:
+            config = {}
+        return cls(
+            provider,
+            initial=config.get("initial", initial),
+            min_limit=config.get("min", min_limit),
+            max_limit=config.get("max", max_limit),
+            decrease=config.get("decrease", DECREASE_FACTOR),
+            latency_tolerance=config.get("latency_tolerance", LATENCY_TOLERANCE),
+        )
+
+    def acquire(self) -> float:
+        """Ждёт свободного места в окне; возвращает момент начала вызова."""
+        waited = time.monotonic()
+        with self._cond:
+            self.queued += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    self._cond.wait()
+            finally:
+                self.queued -= 1
+            self.in_flight += 1
+            started = time.monotonic()
+            self._wait = _ewma(self._wait, started - waited, _FAST_ALPHA)
+        return started
+
+    def release(self, started: float, response: Any = None, error: Optional[BaseException] = None):
+        """Освобождает место и подстраивает окно по результату вызова.
+
+        Args:
+            started: Момент начала вызова из acquire().
+            response: Ответ LLM (для задержки на токен).
+            error: Исключение вызова, если он не удался.
+        """
+        latency = time.monotonic() - started
+        status = overload_status(error) if error is not None else None
+        with self._cond:
+            # Окно растёт только если было заполнено - иначе рост ничего не говорит о провайдере
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.stats["calls"] += 1
+            if error is not None:
+                self.stats["errors"] += 1
+            congested = status is not None
+            if status is not None:
+                self.stats["overloads"] += 1
+                self.last_overload = f"HTTP {status}: {type(error).__name__}"
+            elif error is None:
+                self._latency = _ewma(self._latency, latency, _FAST_ALPHA)
+                tokens = estimate_tokens(response) if isinstance(response, str) else 0
+                if tokens >= _MIN_TOKENS:
+                    per_token = latency / tokens
+                    self._per_token_fast = _ewma(self._per_token_fast, per_token, _FAST_ALPHA)
+                    self._per_token_base = _ewma(self._per_token_base, per_token, _SLOW_ALPHA)
+                    congested = self._per_token_fast > self.latency_tolerance * self._per_token_base
+                    if congested:
+                        self.last_overload = (f"задержка {self._per_token_fast * 1000:.0f} мс/токен "
+                                              f"при базовой {self._per_token_base * 1000:.0f}")
+            if congested:
+                # Одно сужение на поколение: вызовы, начатые до прошлого сужения, его не повторяют
+                if started >= self._last_decrease:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                    self._last_decrease = time.monotonic()
+                    self.stats["decreases"] += 1
+            elif error is None and saturated and self.limit < self.max_limit:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                self.stats["increases"] += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Контекст одного вызова; ответ кладётся в holder["response"]."""
+        started = self.acquire()
+        holder: Dict[str, Any] = {}
+        try:
+            yield holder
+        except BaseException as e:
+            self.release(started, error=e)
+            raise
+        self.release(started, response=holder.get("response"))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние окна для метрик."""
+        with self._cond:
+            return {
+                "provider": self.name,
+                "limit": int(self.limit),
+                "window": round(self.limit, 2),
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "latency_s": round(self._latency, 3) if self._latency is not None else None,
+                "queue_wait_s": round(self._wait, 3) if self._wait is not None else None,
+                "ms_per_token": round(self._per_token_fast * 1000, 1) if self._per_token_fast else None,
+                "baseline_ms_per_token": round(self._per_token_base * 1000, 1) if self._per_token_base else None,
+                "last_overload": self.last_overload,
+                **self.stats,
+            }
+
+
+def _ewma(previous: Optional[float], value: float, alpha: float) -> float:
+    return value if previous is None else previous + alpha * (value - previous)
+
+
+_limiters: Dict[str, AIMDLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> AIMDLimiter:
+    """Общий на процесс лимитер провайдера."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = AIMDLimiter.for_provider(provider)
+        return _limiters[provider]
+
+
+def pool_size(provider: str) -> int:
+    """Размер пула потоков конвейера (map шаги, проекты, файлы) для провайдера.
+
+    Параллельность вызовов ограничивает общий лимитер - лишние вызовы ждут в
+    его очереди. Пул размером с максимум окна не мешает окну заполняться и
+    расти; пул меньше окна держал бы его на своём размере.
+    """
+    return get_limiter(provider).max_limit
+
+
+def limit_llm(llm, provider: str):
+    """Пропускает вызовы llm.call через лимитер провайдера.
+
+    Args:
+        llm: Экземпляр LLM CrewAI.
+        provider: Имя провайдера.
+
+    Returns:
+        Тот же экземпляр с ограниченным call.
+    """
+    limiter = get_limiter(provider)
+    call = llm.call
+
+    @wraps(call)
+    def limited_call(*args, **kwargs):
+        with limiter.slot() as holder:
+            holder["response"] = call(*args, **kwargs)
+        return holder["response"]
+
+    llm.call = limited_call
+    return llm
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Состояние лимитеров всех использованных провайдеров."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.snapshot() for limiter in limiters}
@@ -0,0 +1,142 @@
+from typing import Callable, Dict, List, Optional
+
+# Summarizer(предыдущее_резюме, вытесненные_реплики) -> новое резюме
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+ROLE_LABELS = {"user": "Пользователь", "assistant": "Ассистент"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов без токенизатора.
+
+    Для смеси кириллицы, кода и латиницы ~3 символа на токен.
+
+    Args:
+        text: Текст.
+
+    Returns:
+        Оценка количества токенов.
+    """
+    return len(text) // 3 + 1 if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """Обрезает текст до примерного бюджета токенов.
+
+    Args:
+        text: Текст.
+        max_tokens: Бюджет токенов.
+        keep_tail: Сохранять конец текста вместо начала.
+
+    Returns:
+        Обрезанный текст с пометкой "…" на месте разреза.
+    """
+    max_chars = max(0, max_tokens * 3)
+    if len(text) <= max_chars:
+        return text
+    if max_chars == 0:
+        return ""
+    if keep_tail:
+        return "…" + text[-max_chars:]
+    return text[:max_chars] + "…"
+
+
+def extractive_summarizer(summary: str, turns: List[Dict[str, str]], line_chars: int = 200) -> str:
+    """Резюме без LLM: дописывает по одной сжатой строке на каждую реплику.
+
+    Args:
+        summary: Предыдущее резюме.
+        turns: Реплики, вытесняемые из окна.
+        line_chars: Максимальная длина строки на одну реплику.
+
+    Returns:
+        Обновлённое резюме.
+    """
+    lines = [summary] if summary else []
+    for turn in turns:
+        text = " ".join(turn["content"].split())
+        if len(text) > line_chars:
+            text = text[:line_chars] + "…"
+        lines.append(f"- {ROLE_LABELS.get(turn['role'], turn['role'])}: {text}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """Ограниченная память диалога: последние N реплик дословно + резюме старых.
+
+    Размер отрендеренного контекста ограничен token_budget, поэтому промпт
+    не растёт линейно с длиной сессии.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 6,
+        token_budget: int = 1500,
+        max_message_tokens: int = 400,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        """
+        Args:
+            max_turns: Сколько последних реплик хранить дословно.
+            token_budget: Бюджет токенов на весь блок истории.
+            max_message_tokens: Бюджет на одну дословную реплику.
+            summarizer: Функция обновления резюме (по умолчанию без LLM).
+        """
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_message_tokens = max_message_tokens
+        self.summarizer = summarizer or extractive_summarizer
+        self.summary = ""
+        self.turns: List[Dict[str, str]] = []
+
+    def add(self, role: str, content: str):
+        """Добавляет реплику и при переполнении окна сворачивает старые в резюме."""
+        self.turns.append({"role": role, "content": content})
+        if len(self.turns) > self.max_turns:
+            overflow = len(self.turns) - self.max_turns
+            self._evict(overflow)
+
+    def clear(self):
+        self.summary = ""
+        self.turns = []
+
+    def _evict(self, count: int):
+        evicted, self.turns = self.turns[:count], self.turns[count:]
+        try:
+            self.summary = self.summarizer(self.summary, evicted)
+        except Exception:
+            # Сбой LLM-резюме не должен ломать диалог
+            self.summary = extractive_summarizer(self.summary, evicted)
+        # Резюме хранится в пределах бюджета: старейшие строки отбрасываются
+        self.summary = truncate_to_tokens(self.summary, self.token_budget, keep_tail=True)
+
+    def _render_turns(self) -> List[str]:
+        return [
+            f"{ROLE_LABELS.get(t['role'], t['role'])}: {truncate_to_tokens(t['content'], self.max_message_tokens)}"
+            for t in self.turns
+        ]
+
+    def render(self) -> str:
+        """Возвращает блок истории для вставки в описание задачи.
+
+        Returns:
+            Текст истории в пределах token_budget или пустая строка.
+        """
+        turns = self._render_turns()
+        # Если дословные реплики не влезают в бюджет, сворачиваем самые старые
+        while len(turns) > 1 and sum(estimate_tokens(t) for t in turns) > self.token_budget // 2:
+            self._evict(1)
+            turns = turns[1:]
+
+        parts = []
+        used = sum(estimate_tokens(t) for t in turns)
+        if self.summary:
+            summary = truncate_to_tokens(self.summary, max(0, self.token_budget - used), keep_tail=True)
+            if summary:
+                parts.append(f"Краткое содержание ранее:\n{summary}")
+        if turns:
+            parts.append("Последние сообщения:\n" + "\n".join(turns))
+        return "\n\n".join(parts)
+
+    def __len__(self) -> int:
+        return len(self.turns)
@@ -0,0 +1,182 @@
+import os
+import re
+from fnmatch import translate
+from typing import List, Optional, Sequence, Tuple
+
+# Служебные директории и файлы, которые не нужны агентам ни в одном проекте
+DEFAULT_EXCLUDES = [
+    ".git/", "venv/", ".venv/", "__pycache__/", ".pytest_cache/",
+    ".mypy_cache/", ".ruff_cache/", ".idea/", ".vscode/", "node_modules/",
+    ".tox/", ".eggs/", "*.egg-info/", "dist/", "build/", ".cache/",
+    ".DS_Store", "Thumbs.db", ".gitignore",
+]
+
+
+def _glob_to_regex(glob: str) -> str:
+    """Переводит glob в стиле .gitignore в регулярное выражение для posix пути."""
+    out = []
+    i = 0
+    while i < len(glob):
+        ch = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("/**", i) and i + 3 == len(glob):
+            out.append("/.*")
+            i += 3
+        elif glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif ch == "*":
+            out.append("[^/]*")
+            i += 1
+        elif ch == "?":
+            out.append("[^/]")
+            i += 1
+        elif ch == "[":
+            end = glob.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(ch))
+                i += 1
+            else:
+                body = glob[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        elif ch == "\\" and i + 1 < len(glob):
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(ch))
+            i += 1
+    return "".join(out)
+
+
+def _compile_rule(line: str) -> Optional[Tuple[str, bool, bool]]:
+    """Разбирает строку .gitignore.
+
+    Returns:
+        (regex, negated, dir_only) или None для пустых строк и комментариев.
+    """
+    line = line.rstrip("\n")
+    if not line.strip() or line.startswith("#"):
+        return None
+    line = line.rstrip(" ") if not line.endswith("\\ ") else line
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # Шаблон со слешем в начале или середине привязан к корню, иначе - к любому уровню
+    anchored = "/" in line
+    line = line.lstrip("/")
+    regex = _glob_to_regex(line)
+    if not anchored:
+        regex = f"(?:.*/)?{regex}"
+    return regex, negated, dir_only
+
+
+class PathFilter:
+    """Единый фильтр путей проекта: .gitignore, дефолтные и проектные исключения.
+
+    Все правила компилируются в одно регулярное выражение на тип записи
+    (файл/директория). Правила идут в обратном порядке, поэтому первая
+    совпавшая альтернатива - это последнее подходящее правило, как в git.
+    """
+
+    def __init__(self, rules: Sequence[str] = (), include: Optional[Sequence[str]] = None):
+        """
+        Args:
+            rules: Правила в синтаксисе .gitignore (поддерживается `!` и `dir/`).
+            include: Если задано, файлы должны совпасть хотя бы с одним glob.
+        """
+        compiled = [r for r in (_compile_rule(line) for line in rules) if r]
+        self._negated: List[bool] = [negated for _, negated, _ in compiled]
+        self._dir_re = self._combine([(i, rx) for i, (rx, _, _) in enumerate(compiled)])
+        self._file_re = self._combine([(i, rx) for i, (rx, _, dir_only) in enumerate(compiled) if not dir_only])
+        include_rules = [_compile_rule(g) for g in include or []]
+        include_rx = [rx for rx, _, _ in filter(None, include_rules)]
+        self._include_re = re.compile("|".join(f"(?:{rx})" for rx in include_rx)) if include_rx else None
+
+    @staticmethod
+    def _combine(indexed: List[Tuple[int, str]]) -> Optional["re.Pattern[str]"]:
+        if not indexed:
+            return None
+        return re.compile("|".join(f"(?P<r{i}>{rx})" for i, rx in reversed(indexed)))
+
+    def _excluded(self, pattern: Optional["re.Pattern[str]"], rel_path: str) -> bool:
+        if pattern is None:
+            return False
+        match = pattern.fullmatch(rel_path)
+        return bool(match) and not self._negated[int(match.lastgroup[1:])]
+
+    def is_dir_excluded(self, rel_path: str) -> bool:
+        """Нужно ли пропустить директорию (и всё её содержимое)."""
+        return self._excluded(self._dir_re, rel_path)
+
+    def is_file_excluded(self, rel_path: str) -> bool:
+        """Нужно ли пропустить файл (без проверки родительских директорий)."""
+        if self._excluded(self._file_re, rel_path):
+            return True
+        return self._include_re is not None and not self._include_re.fullmatch(rel_path)
+
+    def is_excluded(self, rel_path: str) -> bool:
+        """Полная проверка пути файла, включая исключённые родительские директории."""
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            if self.is_dir_excluded("/".join(parts[:depth])):
+                return True
+        return self.is_file_excluded(rel_path)
+
+
+def read_ignore_file(path: str) -> List[str]:
+    """Читает строки файла в синтаксисе .gitignore (пустой список, если файла нет)."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+def build_path_filter(project_path: str, exclude: Optional[Sequence[str]] = None,
+                      include: Optional[Sequence[str]] = None) -> PathFilter:
+    """Собирает фильтр проекта: дефолты + .gitignore + .git/info/exclude + exclude из конфига.
+
+    Правила проектного конфига идут последними и имеют приоритет.
+
+    Args:
+        project_path: Путь к проекту.
+        exclude: Дополнительные glob исключения проекта.
+        include: Glob включения файлов проекта.
+
+    Returns:
+        PathFilter.
+    """
+    rules = list(DEFAULT_EXCLUDES)
+    rules += read_ignore_file(os.path.join(project_path, ".gitignore"))
+    rules += read_ignore_file(os.path.join(project_path, ".git", "info", "exclude"))
+    rules += list(exclude or [])
+    return PathFilter(rules, include)
+
+
+class PatternRanker:
+    """Набор fnmatch шаблонов, скомпилированных в одно регулярное выражение.
+
+    Возвращает индекс первого совпавшего шаблона - как цикл по fnmatch с break,
+    но за один проход регулярного выражения.
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        self._regex = re.compile("|".join(f"(?P<p{i}>{translate(p)})" for i, p in enumerate(patterns)))
+
+    def first_match(self, *names: str) -> Optional[int]:
+        best = None
+        for name in names:
+            match = self._regex.match(name)
+            if match:
+                index = int(match.lastgroup[1:])
+                best = index if best is None else min(best, index)
+        return best
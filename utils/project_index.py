@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from utils.file_utils import scan_project_structure, find_key_files
+
+# Индекс без явной инвалидации считается устаревшим через этот интервал
+DEFAULT_TTL_SECONDS = 300.0
+
+
+@dataclass
+class ProjectIndex:
+    """Снимок проекта, который подставляется в контекст DWH команды."""
+    path: str
+    structure: str
+    key_files: List[str] = field(default_factory=list)
+    built_at: float = field(default_factory=time.time)
+
+    @property
+    def fingerprint(self) -> str:
+        """Хэш структуры и ключевых файлов: у одинаковых снимков проекта совпадает."""
+        payload = "\n".join([self.path, self.structure, *self.key_files])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+_indexes: Dict[str, ProjectIndex] = {}
+_lock = threading.Lock()
+# Проекты под наблюдением ProjectWatcher: их индекс актуален без TTL
+_watched: Set[str] = set()
+
+
+def build_project_index(project_path: str, max_depth: int = 2, max_files: int = 40, max_key_files: int = 12) -> ProjectIndex:
+    """Сканирует проект и строит индекс (без кэша).
+
+    Args:
+        project_path: Путь к проекту.
+        max_depth: Глубина сканирования структуры.
+        max_files: Максимум файлов в структуре.
+        max_key_files: Максимум ключевых файлов.
+
+    Returns:
+        Новый ProjectIndex.
+    """
+    return ProjectIndex(
+        path=project_path,
+        structure=scan_project_structure(project_path, max_depth=max_depth, max_files=max_files),
+        key_files=find_key_files(project_path, max_files=max_key_files),
+    )
+
+
+def get_project_index(project_path: str, ttl: Optional[float] = DEFAULT_TTL_SECONDS) -> ProjectIndex:
+    """Возвращает индекс проекта из кэша процесса, перестраивая устаревший.
+
+    Индекс проекта под наблюдением ProjectWatcher не устаревает по TTL:
+    наблюдатель сам обновляет его при изменении файлов.
+
+    Args:
+        project_path: Путь к проекту.
+        ttl: Время жизни индекса в секундах (None - бессрочно).
+
+    Returns:
+        ProjectIndex.
+    """
+    with _lock:
+        index = _indexes.get(project_path)
+        watched = project_path in _watched
+    if index is not None and (ttl is None or watched or time.time() - index.built_at < ttl):
+        return index
+    return refresh_project_index(project_path)
+
+
+def invalidate_project_index(project_path: Optional[str] = None):
+    """Сбрасывает индекс проекта (или все индексы, если путь не указан)."""
+    with _lock:
+        if project_path is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(project_path, None)
+
+
+def refresh_project_index(project_path: str) -> ProjectIndex:
+    """Перестраивает индекс проекта и сохраняет его в кэш процесса."""
+    index = build_project_index(project_path)
+    with _lock:
+        _indexes[project_path] = index
+    return index
+
+
+def set_project_watched(project_path: str, watched: bool = True):
+    """Отмечает, что индекс проекта поддерживается наблюдателем файлов."""
+    with _lock:
+        if watched:
+            _watched.add(project_path)
+        else:
+            _watched.discard(project_path)
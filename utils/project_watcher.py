@@ -0,0 +1,276 @@
+"""Фоновый наблюдатель за файлами проектов из config.yaml.
+
+Наблюдатель поддерживает индексы проектов (структуру и ключевые файлы)
+актуальными, чтобы create_dwh_crew не сканировал проект на пути запроса.
+События файловой системы приходят от watchdog (inotify/FSEvents), а если
+он не установлен - от опроса снимков каталогов. Поток событий (например,
+при `git checkout`) сглаживается: изменения копятся, пока не наступит пауза
+debounce секунд (но не дольше max_delay), и применяются одной пачкой:
+
+- создание, удаление и перемещение файлов перестраивают индекс проекта;
+- любое изменение помечает устаревшими готовые ответы по проекту, а
+  выполняющиеся запросы по нему закрывает для присоединения.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.file_utils import get_project_filter, is_path_valid, load_config
+from utils.fs_walk import parallel_walk
+from utils.path_filter import PathFilter
+from utils.project_index import refresh_project_index, set_project_watched
+from utils.session_store import get_session_store
+from utils.singleflight import get_single_flight
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - watchdog опционален
+    FileSystemEventHandler = object
+    Observer = None
+
+DEBOUNCE_SECONDS = 1.0
+MAX_DELAY_SECONDS = 10.0
+POLL_INTERVAL_SECONDS = 5.0
+
+# Файлы, изменение которых меняет фильтр путей, а значит и индекс
+_FILTER_FILES = (".gitignore", ".git/info/exclude")
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Переводит события watchdog в ProjectWatcher.notify."""
+
+    def __init__(self, watcher: "ProjectWatcher", project_path: str):
+        super().__init__()
+        self.watcher = watcher
+        self.project_path = project_path
+
+    def on_any_event(self, event):
+        if event.event_type not in ("created", "deleted", "moved", "modified"):
+            return
+        if event.is_directory and event.event_type == "modified":
+            return
+        self.watcher.notify(self.project_path, event.src_path, event.event_type)
+        if event.event_type == "moved":
+            self.watcher.notify(self.project_path, event.dest_path, "created")
+
+
+def snapshot_project(project_path: str) -> Dict[str, Tuple[int, int]]:
+    """Снимок файлов проекта для опроса: относительный путь -> (mtime_ns, size).
+
+    Файлы правил фильтра (.gitignore) входят в снимок, хотя сами исключены фильтром:
+    иначе их изменение при опросе не заметно.
+    """
+    snapshot = {}
+    for rel_path in _FILTER_FILES:
+        try:
+            stat = os.stat(os.path.join(project_path, rel_path))
+        except OSError:
+            continue
+        snapshot[rel_path] = (stat.st_mtime_ns, stat.st_size)
+    for root, rel_root, _, files in parallel_walk(project_path, get_project_filter(project_path)):
+        for filename in files:
+            try:
+                stat = os.stat(os.path.join(root, filename))
+            except OSError:
+                continue
+            rel_path = f"{rel_root}/{filename}" if rel_root else filename
+            snapshot[rel_path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+class ProjectWatcher:
+    """Следит за каталогами проектов и пачками обновляет их индексы."""
+
+    def __init__(
+        self,
+        projects: Dict[str, str],
+        debounce: float = DEBOUNCE_SECONDS,
+        max_delay: float = MAX_DELAY_SECONDS,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+        use_watchdog: Optional[bool] = None,
+        on_update: Optional[Callable[[str, Dict[str, str]], None]] = None,
+    ):
+        """
+        Args:
+            projects: Путь проекта -> имя проекта.
+            debounce: Пауза без событий, после которой пачка применяется.
+            max_delay: Максимальная задержка применения при непрерывном потоке событий.
+            poll_interval: Интервал опроса, если watchdog недоступен.
+            use_watchdog: None - watchdog при наличии, False - всегда опрос.
+            on_update: Вызывается после применения пачки (путь проекта, изменения).
+        """
+        self.projects = projects
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_watchdog = Observer is not None if use_watchdog is None else use_watchdog and Observer is not None
+        self.on_update = on_update
+        self.stats = {"events": 0, "batches": 0, "rebuilds": 0, "invalidated_answers": 0, "errors": 0}
+        self.last_error = ""
+
+        self._pending: Dict[str, Dict[str, str]] = {}
+        # Фильтры путей на текущую пачку: get_project_filter перечитывает config.yaml
+        self._filters: Dict[str, PathFilter] = {}
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._observer = None
+
+    @property
+    def mode(self) -> str:
+        return "watchdog" if self.use_watchdog else "polling"
+
+    def start(self) -> "ProjectWatcher":
+        """Строит индексы проектов и запускает наблюдение в фоновых потоках."""
+        for path in self.projects:
+            refresh_project_index(path)
+            set_project_watched(path)
+        if self.use_watchdog:
+            self._observer = Observer()
+            for path in self.projects:
+                self._observer.schedule(_EventHandler(self, path), path, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._spawn(self._poll_loop, "project-watcher-poll")
+        self._spawn(self._apply_loop, "project-watcher-apply")
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        for path in self.projects:
+            set_project_watched(path, False)
+
+    def _spawn(self, target: Callable, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def notify(self, project_path: str, path: str, kind: str, check_filter: bool = True):
+        """Регистрирует изменение файла; применяется пачкой после паузы.
+
+        Args:
+            project_path: Путь проекта из config.yaml.
+            path: Абсолютный или относительный путь изменённого файла.
+            kind: created | deleted | moved | modified.
+            check_filter: Пропускать исключённые фильтром пути. Опрос отключает проверку
+                для удалений: файл был в снимке, а исключённым мог стать после правки .gitignore.
+        """
+        rel_path = os.path.relpath(path, project_path) if os.path.isabs(path) else path
+        rel_path = rel_path.replace(os.sep, "/")
+        if check_filter and rel_path not in _FILTER_FILES and self._filter(project_path).is_excluded(rel_path):
+            return
+        now = time.monotonic()
+        with self._cond:
+            changes = self._pending.setdefault(project_path, {})
+            # Создание/удаление важнее последующего изменения того же файла
+            if changes.get(rel_path) in (None, "modified"):
+                changes[rel_path] = kind
+            if not self._first_event:
+                self._first_event = now
+            self._last_event = now
+            self.stats["events"] += 1
+            self._cond.notify()
+
+    def _filter(self, project_path: str) -> PathFilter:
+        with self._cond:
+            path_filter = self._filters.get(project_path)
+        if path_filter is None:
+            path_filter = get_project_filter(project_path)
+            with self._cond:
+                self._filters[project_path] = path_filter
+        return path_filter
+
+    def _apply_loop(self):
+        while not self._stopped.is_set():
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                ready_at = min(self._last_event + self.debounce, self._first_event + self.max_delay)
+                if now < ready_at:
+                    self._cond.wait(ready_at - now)
+                    continue
+                batch, self._pending = self._pending, {}
+                # Следующая пачка берёт фильтр заново: в этой мог измениться .gitignore
+                self._filters.clear()
+                self._first_event = self._last_event = 0.0
+            for project_path, changes in batch.items():
+                self._apply(project_path, changes)
+
+    def _apply(self, project_path: str, changes: Dict[str, str]):
+        try:
+            structural = any(kind != "modified" for kind in changes.values())
+            if structural or any(rel_path in _FILTER_FILES for rel_path in changes):
+                refresh_project_index(project_path)
+                self.stats["rebuilds"] += 1
+            self.stats["invalidated_answers"] += get_session_store().invalidate_answers(self.projects[project_path])
+            # Запросы, начатые до изменения, не принимают новых участников
+            get_single_flight().detach(self.projects[project_path])
+            self.stats["batches"] += 1
+            if self.on_update:
+                self.on_update(project_path, changes)
+        except Exception as e:
+            # Сбой обновления не должен останавливать наблюдение - индекс обновится по TTL
+            set_project_watched(project_path, False)
+            self.stats["errors"] += 1
+            self.last_error = f"{project_path}: {type(e).__name__}: {e}"
+
+    def _poll_loop(self):
+        snapshots = {path: snapshot_project(path) for path in self.projects}
+        while not self._stopped.wait(self.poll_interval):
+            for path, previous in snapshots.items():
+                if not is_path_valid(path):
+                    continue
+                current = snapshot_project(path)
+                for rel_path in previous.keys() - current.keys():
+                    self.notify(path, rel_path, "deleted", check_filter=False)
+                for rel_path in current.keys() - previous.keys():
+                    self.notify(path, rel_path, "created")
+                for rel_path in current.keys() & previous.keys():
+                    if current[rel_path] != previous[rel_path]:
+                        self.notify(path, rel_path, "modified")
+                snapshots[path] = current
+
+
+_watcher: Optional[ProjectWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def start_project_watcher(config_path: str = "config.yaml", **kwargs) -> Optional[ProjectWatcher]:
+    """Запускает один наблюдатель на процесс для всех существующих путей из config.yaml.
+
+    Args:
+        config_path: Путь к конфигурационному файлу.
+        kwargs: Параметры ProjectWatcher.
+
+    Returns:
+        ProjectWatcher или None, если наблюдать нечего.
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            try:
+                config = load_config(config_path)
+            except FileNotFoundError:
+                return None
+            projects = {
+                p["path"]: p["name"] for p in config.get("projects", []) if is_path_valid(p.get("path", ""))
+            }
+            if not projects:
+                return None
+            _watcher = ProjectWatcher(projects, **kwargs).start()
+        return _watcher
@@ -0,0 +1,398 @@
+"""Запуск pytest тестов проекта в изолированных подпроцессах.
+
+Каждый тестовый файл запускается отдельным процессом pytest из пула (до
+workers одновременно) с лимитом времени на тест, урезанным окружением (без
+переменных с ключами и токенами), ограничением памяти и без записи кэшей
+в проект. Если файл не уложился в лимит, его тесты перезапускаются по
+одному, чтобы найти зависший тест. Это изоляция от случайного вреда, а не
+защита от намеренно вредного кода.
+
+Результаты файла кэшируются по хэшу тестового файла, conftest.py и
+исходников проекта, которые он импортирует (транзитивно), поэтому повторный
+запуск без изменений не запускает pytest.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.cache import JsonStore, cache_dir, file_hash, slugify
+from utils.file_utils import get_project_files, is_path_valid
+
+PER_TEST_TIMEOUT = 30.0
+TEST_WORKERS = 4
+MEMORY_LIMIT_MB = 4096
+# Запуск интерпретатора и сбор тестов
+_STARTUP_SECONDS = 10.0
+_MAX_OUTPUT_CHARS = 1500
+_SECRET_ENV_RE = re.compile(r"KEY|TOKEN|SECRET|PASSWORD|CREDENTIAL", re.IGNORECASE)
+
+# Лимит памяти ставится в самом дочернем процессе: preexec_fn небезопасен при потоках
+_BOOTSTRAP = (
+    "import sys\n"
+    "try:\n"
+    "    import resource\n"
+    "    limit = int(sys.argv[1]) * 1024 * 1024\n"
+    "    if limit > 0:\n"
+    "        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))\n"
+    "except (ImportError, ValueError, OSError):\n"
+    "    pass\n"
+    "import pytest\n"
+    "sys.exit(pytest.main(sys.argv[2:]))\n"
+)
+
+
+@dataclass
+class PytestRunResult:
+    """Итог запуска тестов проекта."""
+    project_path: str
+    tests: List[Dict] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    duration_s: float = 0.0
+
+    def counts(self) -> Dict[str, int]:
+        counts = {"passed": 0, "failed": 0, "error": 0, "skipped": 0, "timeout": 0}
+        for test in self.tests:
+            counts[test["outcome"]] = counts.get(test["outcome"], 0) + 1
+        return counts
+
+
+def is_test_file(rel_path: str) -> bool:
+    name = os.path.basename(rel_path)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def select_test_files(project_path: str, targets: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """Тестовые файлы проекта и выбранные в них тесты.
+
+    Args:
+        project_path: Путь к проекту.
+        targets: Файлы, директории, glob шаблоны или node id (`tests/test_x.py::test_y`);
+            None - все тесты проекта.
+
+    Returns:
+        Относительный путь файла -> node id выбранных тестов (пустой список - весь файл).
+    """
+    root = os.path.realpath(project_path)
+    all_files = sorted(
+        os.path.relpath(path, root).replace(os.sep, "/")
+        for path in get_project_files(root, [".py"])
+    )
+    test_files = [f for f in all_files if is_test_file(f)]
+    if not targets:
+        return {f: [] for f in test_files}
+    selected: Dict[str, List[str]] = {}
+    whole: Set[str] = set()
+    for target in targets:
+        target = target.strip()
+        target = target[2:] if target.startswith("./") else target
+        path, _, node = target.partition("::")
+        path = path.rstrip("/")
+        matches = [f for f in test_files if f == path or fnmatch(f, path) or f.startswith(path + "/")]
+        for rel_path in matches:
+            if not node:
+                # Файл целиком важнее отдельных тестов из него
+                selected[rel_path] = []
+                whole.add(rel_path)
+            elif rel_path not in whole:
+                selected.setdefault(rel_path, []).append(f"{rel_path}::{node}")
+    return selected
+
+
+def _module_candidates(module: str, bases: List[str]) -> List[str]:
+    rel = module.replace(".", os.sep)
+    return [p for base in bases for p in (os.path.join(base, rel + ".py"), os.path.join(base, rel, "__init__.py"))]
+
+
+def _imported_files(path: str, root: str) -> Set[str]:
+    """Файлы проекта, импортируемые модулем path (один уровень)."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    here = os.path.dirname(path)
+    # Модули ищутся от корня проекта, от src/ и от каталога файла (rootdir-вставка pytest)
+    bases = [root, os.path.join(root, "src"), here]
+    found = set()
+    for node in ast.walk(tree):
+        modules = []
+        if isinstance(node, ast.Import):
+            modules = [(alias.name, bases) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                package = here
+                for _ in range(node.level - 1):
+                    package = os.path.dirname(package)
+                search = [package]
+            else:
+                search = bases
+            prefix = node.module or ""
+            modules = [(prefix, search)] if prefix else []
+            # `from pkg import module` импортирует подмодуль
+            modules += [(f"{prefix}.{alias.name}" if prefix else alias.name, search) for alias in node.names]
+        for module, search in modules:
+            for candidate in _module_candidates(module, search):
+                candidate = os.path.realpath(candidate)
+                if os.path.isfile(candidate) and candidate.startswith(root + os.sep):
+                    found.add(candidate)
+    return found
+
+
+def source_dependencies(project_path: str, rel_path: str) -> List[str]:
+    """Исходники, от которых зависит результат тестового файла.
+
+    Тестовый файл, conftest.py его каталогов и (транзитивно) импортируемые
+    им модули проекта.
+
+    Returns:
+        Отсортированные относительные пути.
+    """
+    root = os.path.realpath(project_path)
+    start = os.path.realpath(os.path.join(root, rel_path))
+    deps = {start}
+    directory = os.path.dirname(start)
+    while directory.startswith(root):
+        conftest = os.path.join(directory, "conftest.py")
+        if os.path.isfile(conftest):
+            deps.add(conftest)
+        if directory == root:
+            break
+        directory = os.path.dirname(directory)
+    queue = list(deps)
+    while queue:
+        for dep in _imported_files(queue.pop(), root):
+            if dep not in deps:
+                deps.add(dep)
+                queue.append(dep)
+    return sorted(os.path.relpath(d, root).replace(os.sep, "/") for d in deps)
+
+
+def _cache_key(project_path: str, rel_path: str, nodes: List[str], python: str, keyword: Optional[str]) -> str:
+    root = os.path.realpath(project_path)
+    hashes = [(dep, file_hash(os.path.join(root, dep))) for dep in source_dependencies(root, rel_path)]
+    payload = json.dumps([python, sorted(nodes), keyword, hashes], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _sandbox_env(project_path: str) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if not _SECRET_ENV_RE.search(k)}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (project_path, env.get("PYTHONPATH")) if p)
+    return env
+
+
+def _count_tests(path: str) -> int:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError):
+        return 1
+    return max(1, sum(
+        isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name.startswith("test")
+        for n in ast.walk(tree)
+    ))
+
+
+def _pytest(python: str, project_path: str, args: List[str], timeout: float,
+            memory_mb: int) -> Tuple[Optional[int], str, List[Dict]]:
+    """Один процесс pytest; возвращает (код выхода или None при таймауте, вывод, тесты из junit)."""
+    with tempfile.TemporaryDirectory(prefix="crew-pytest-") as tmp:
+        junit = os.path.join(tmp, "junit.xml")
+        command = [
+            python, "-c", _BOOTSTRAP, str(memory_mb),
+            "-q", "--tb=short", "-p", "no:cacheprovider", "--rootdir", project_path,
+            f"--junitxml={junit}", *args,
+        ]
+        try:
+            proc = subprocess.run(
+                command, cwd=project_path, env=_sandbox_env(project_path), stdin=subprocess.DEVNULL,
+                capture_output=True, text=True, errors="replace", timeout=timeout, start_new_session=True,
+            )
+        except subprocess.TimeoutExpired as e:
+            output = e.stdout.decode("utf-8", "replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+            return None, output, []
+        return proc.returncode, proc.stdout + proc.stderr, _parse_junit(junit)
+
+
+def _parse_junit(path: str) -> List[Dict]:
+    try:
+        tree = ET.parse(path)
+    except (OSError, ET.ParseError):
+        return []
+    tests = []
+    for case in tree.iter("testcase"):
+        classname, name = case.get("classname", ""), case.get("name", "")
+        outcome, message = "passed", ""
+        for child in case:
+            if child.tag in ("failure", "error", "skipped"):
+                outcome = {"failure": "failed"}.get(child.tag, child.tag)
+                # Короткий трейсбек (--tb=short) уже содержит строки E с сообщением
+                details = (child.text or "").strip() if outcome != "skipped" else ""
+                message = details or (child.get("message") or "").strip()
+                break
+        tests.append({
+            "classname": classname,
+            "name": name,
+            "outcome": outcome,
+            "duration_s": round(float(case.get("time") or 0), 3),
+            "message": message,
+        })
+    return tests
+
+
+def _node_id(rel_path: str, test: Dict) -> str:
+    module = rel_path[:-3].replace("/", ".")
+    classname = test["classname"]
+    # classname pytest: пакет.модуль[.Класс]; класс сохраняется в node id
+    cls = classname[len(module) + 1:] if classname.startswith(module + ".") else ""
+    return "::".join(p for p in (rel_path, cls, test["name"]) if p)
+
+
+def _run_file(python: str, project_path: str, rel_path: str, nodes: List[str], keyword: Optional[str],
+              per_test_timeout: float, memory_mb: int) -> Dict:
+    args = list(nodes or [rel_path])
+    if keyword:
+        args += ["-k", keyword]
+    expected = len(nodes) or _count_tests(os.path.join(project_path, rel_path))
+    code, output, tests = _pytest(python, project_path, args, _STARTUP_SECONDS + per_test_timeout * expected, memory_mb)
+    if code is None:
+        # Файл не уложился в лимит: тесты по одному, чтобы найти зависший
+        collect_code, collected, _ = _pytest(python, project_path, ["--collect-only", *args],
+                                             _STARTUP_SECONDS * 3, memory_mb)
+        node_ids = [line.strip() for line in collected.splitlines() if "::" in line and " " not in line.strip()]
+        if collect_code is None or not node_ids:
+            return {"file": rel_path, "tests": [{"node_id": rel_path, "outcome": "timeout", "duration_s": 0.0,
+                                                 "message": f"файл не уложился в лимит времени\n{output[-_MAX_OUTPUT_CHARS:]}"}],
+                    "cacheable": False}
+        results = []
+        for node_id in node_ids:
+            node_code, node_output, node_tests = _pytest(python, project_path, [node_id],
+                                                         _STARTUP_SECONDS + per_test_timeout, memory_mb)
+            if node_code is None:
+                results.append({"node_id": node_id, "outcome": "timeout", "duration_s": per_test_timeout,
+                                "message": f"тест не уложился в {per_test_timeout:.0f} с"})
+            else:
+                results += [{"node_id": _node_id(rel_path, t), **_strip(t)} for t in node_tests]
+        return {"file": rel_path, "tests": results, "cacheable": False}
+    results = [{"node_id": _node_id(rel_path, t), **_strip(t)} for t in tests]
+    # 0 - все прошли, 1 - есть падения, 5 - тестов нет; остальное - сбой самого pytest
+    if code not in (0, 1, 5) and not results:
+        results = [{"node_id": rel_path, "outcome": "error", "duration_s": 0.0,
+                    "message": f"pytest завершился с кодом {code}\n{output[-_MAX_OUTPUT_CHARS:]}"}]
+    return {"file": rel_path, "tests": results, "cacheable": code in (0, 1, 5)}
+
+
+def _strip(test: Dict) -> Dict:
+    return {"outcome": test["outcome"], "duration_s": test["duration_s"], "message": test["message"]}
+
+
+def pytest_available(python: str) -> bool:
+    try:
+        return subprocess.run([python, "-c", "import pytest"], capture_output=True, timeout=30).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def run_project_tests(
+    project_path: str,
+    targets: Optional[List[str]] = None,
+    keyword: Optional[str] = None,
+    python: Optional[str] = None,
+    per_test_timeout: float = PER_TEST_TIMEOUT,
+    workers: int = TEST_WORKERS,
+    memory_mb: int = MEMORY_LIMIT_MB,
+    use_cache: bool = True,
+) -> PytestRunResult:
+    """Запускает тесты проекта параллельно по файлам, переиспользуя результаты неизменённых.
+
+    Args:
+        project_path: Путь к проекту.
+        targets: Файлы, директории, glob шаблоны или node id; None - все тесты.
+        keyword: Выражение `pytest -k`.
+        python: Интерпретатор проекта (с установленным pytest); по умолчанию текущий.
+        per_test_timeout: Лимит времени на один тест, с.
+        workers: Одновременных процессов pytest.
+        memory_mb: Лимит адресного пространства процесса, МБ (0 - без лимита).
+        use_cache: Использовать кэш результатов.
+
+    Returns:
+        PytestRunResult с результатами по тестам.
+
+    Raises:
+        ValueError: Если путь проекта не существует или pytest недоступен.
+    """
+    if not is_path_valid(project_path):
+        raise ValueError(f"Путь не существует или не является директорией: {project_path}")
+    started = time.time()
+    root = os.path.realpath(project_path)
+    python = python or sys.executable
+    if python != sys.executable and not os.path.isabs(python):
+        python = os.path.join(root, python)
+    selected = select_test_files(root, targets)
+    result = PytestRunResult(project_path=root, files=sorted(selected))
+    if not selected:
+        result.errors.append("тестовые файлы не найдены" if not targets else "по указанным целям тесты не найдены")
+        return result
+    if not pytest_available(python):
+        raise ValueError(f"pytest не установлен для интерпретатора {python}")
+
+    store = JsonStore(os.path.join(cache_dir("tests"), f"{slugify(root)}.json"))
+    keys = {rel: _cache_key(root, rel, nodes, python, keyword) for rel, nodes in selected.items()}
+    pending = []
+    for rel_path in result.files:
+        cached = store.get(keys[rel_path]) if use_cache else None
+        if cached is not None:
+            result.tests += cached
+            result.cached.append(rel_path)
+        else:
+            pending.append(rel_path)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending) or 1))) as pool:
+        runs = list(pool.map(
+            lambda rel: _run_file(python, root, rel, selected[rel], keyword, per_test_timeout, memory_mb),
+            pending,
+        ))
+    for run in runs:
+        result.tests += run["tests"]
+        if run["cacheable"]:
+            store.set(keys[run["file"]], run["tests"])
+    if runs:
+        store.save()
+    result.tests.sort(key=lambda t: t["node_id"])
+    result.duration_s = round(time.time() - started, 3)
+    return result
+
+
+def format_test_report(result: PytestRunResult, max_failures: int = 10, max_message_chars: int = 600) -> str:
+    """Краткая сводка: счётчики и первые падения с сообщением об ошибке."""
+    counts = result.counts()
+    lines = [
+        f"Тестов: {len(result.tests)} (passed {counts['passed']}, failed {counts['failed']}, "
+        f"error {counts['error']}, skipped {counts['skipped']}, timeout {counts['timeout']}); "
+        f"файлов: {len(result.files)}, из кэша: {len(result.cached)}; {result.duration_s:.1f} с"
+    ]
+    lines += [f"Ошибка: {error}" for error in result.errors]
+    failures = [t for t in result.tests if t["outcome"] in ("failed", "error", "timeout")]
+    for test in failures[:max_failures]:
+        message = test["message"]
+        if len(message) > max_message_chars:
+            # Конец трейсбека информативнее начала
+            message = "…" + message[-max_message_chars:]
+        lines.append(f"\n[{test['outcome'].upper()}] {test['node_id']}\n{message}")
+    if len(failures) > max_failures:
+        lines.append(f"\n... ещё {len(failures) - max_failures} падений")
+    return "\n".join(lines)
@@ -0,0 +1,350 @@
+"""Внешнее хранилище сессий чата: сообщения, статусы задач и готовые ответы.
+
+Состояние чата не привязано к процессу Streamlit: любая реплика за
+балансировщиком восстанавливает сессию по её id, а перезапуск ничего не
+теряет. Сообщения загружаются лениво (при первом обращении к сессии) и
+пишутся пачками через SessionBuffer.
+
+Бэкенды:
+    sqlite - один файл SQLite в режиме WAL (по умолчанию). Подходит для
+             нескольких процессов на одной машине.
+    file   - каталог с файлами по сессиям (JSON Lines) и атомарной записью.
+             Каталог можно разместить на общем томе для нескольких хостов.
+
+Выбор задаётся переменными SESSION_STORE (sqlite|file) и SESSION_STORE_PATH.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from utils.cache import cache_dir, slugify
+
+MESSAGE_FIELDS = ("role", "content", "hash")
+# Задача в статусе running дольше этого считается брошенной (скрипт прерван, реплика упала)
+JOB_TIMEOUT_SECONDS = 30 * 60
+# Готовый ответ старше этого не переиспользуется: правки содержимого файлов (без наблюдателя
+# проекта или после его сбоя) не меняют ключ ответа
+ANSWER_TTL_SECONDS = 60 * 60
+
+
+def answer_key(**parts) -> str:
+    """Ключ готового ответа: хэш всех параметров, влияющих на ответ."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SessionStore(ABC):
+    """Интерфейс хранилища сессий.
+
+    Сообщение - словарь с полями role, content, hash (как в st.session_state.messages).
+    Статус задачи - словарь со status ("running" | "done" | "error" | "abandoned"),
+    started_at и произвольными полями.
+    """
+
+    @abstractmethod
+    def load_messages(self, session_id: str) -> List[Dict[str, str]]:
+        ...
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]):
+        ...
+
+    @abstractmethod
+    def clear_session(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def set_job(self, session_id: str, job_id: str, status: Dict):
+        ...
+
+    @abstractmethod
+    def _load_jobs(self, session_id: str) -> Dict[str, Dict]:
+        ...
+
+    def get_jobs(self, session_id: str, timeout: float = JOB_TIMEOUT_SECONDS) -> Dict[str, Dict]:
+        """Статусы задач сессии; running дольше timeout помечаются брошенными (abandoned)."""
+        jobs = self._load_jobs(session_id)
+        now = time.time()
+        for job_id, job in jobs.items():
+            if job.get("status") == "running" and now - job.get("started_at", now) > timeout:
+                job.update(status="abandoned", finished_at=now)
+                self.set_job(session_id, job_id, job)
+        return jobs
+
+    @abstractmethod
+    def get_answer(self, key: str, max_age: Optional[float] = ANSWER_TTL_SECONDS) -> Optional[str]:
+        """Готовый ответ по ключу, если он не устарел и не старше max_age (None - без ограничения)."""
+
+    @abstractmethod
+    def set_answer(self, key: str, answer: str, project: Optional[str] = None):
+        ...
+
+    @abstractmethod
+    def invalidate_answers(self, project: str) -> int:
+        """Помечает устаревшими готовые ответы по проекту; возвращает их число."""
+
+
+class SqliteSessionStore(SessionStore):
+    """Хранилище в файле SQLite; соединение на поток, WAL для параллельных процессов."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            hash TEXT,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (session_id, seq)
+        );
+        CREATE TABLE IF NOT EXISTS jobs (
+            session_id TEXT NOT NULL,
+            job_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (session_id, job_id)
+        );
+        CREATE TABLE IF NOT EXISTS answers (
+            key TEXT PRIMARY KEY,
+            project TEXT,
+            answer TEXT NOT NULL,
+            stale INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_answers_project ON answers (project);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(self._SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_messages(self, session_id: str) -> List[Dict[str, str]]:
+        rows = self._connect().execute(
+            "SELECT role, content, hash FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [dict(zip(MESSAGE_FIELDS, row)) for row in rows]
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]):
+        if not messages:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            # Номер следующего сообщения и вставка - в одной транзакции
+            conn.execute("BEGIN IMMEDIATE")
+            (last,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, hash, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(session_id, last + 1 + i, m["role"], m["content"], m.get("hash"), now)
+                 for i, m in enumerate(messages)],
+            )
+
+    def clear_session(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM jobs WHERE session_id = ?", (session_id,))
+
+    def set_job(self, session_id: str, job_id: str, status: Dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (session_id, job_id, status, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, job_id, json.dumps(status, ensure_ascii=False), time.time()),
+            )
+
+    def _load_jobs(self, session_id: str) -> Dict[str, Dict]:
+        rows = self._connect().execute(
+            "SELECT job_id, status FROM jobs WHERE session_id = ? ORDER BY updated_at", (session_id,)
+        ).fetchall()
+        return {job_id: json.loads(status) for job_id, status in rows}
+
+    def get_answer(self, key: str, max_age: Optional[float] = ANSWER_TTL_SECONDS) -> Optional[str]:
+        oldest = time.time() - max_age if max_age is not None else 0
+        row = self._connect().execute(
+            "SELECT answer FROM answers WHERE key = ? AND stale = 0 AND created_at >= ?", (key, oldest)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_answer(self, key: str, answer: str, project: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, project, answer, stale, created_at) VALUES (?, ?, ?, 0, ?)",
+                (key, project, answer, time.time()),
+            )
+
+    def invalidate_answers(self, project: str) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE answers SET stale = 1 WHERE project = ? AND stale = 0", (project,)
+            ).rowcount
+
+
+class FileSessionStore(SessionStore):
+    """Хранилище в каталоге: сессия - JSON Lines файл, статусы и ответы - JSON файлы.
+
+    Сообщения дописываются одним write на пачку (O_APPEND), статус каждой
+    задачи - отдельный файл в каталоге сессии, остальные файлы заменяются
+    атомарно: обновления не требуют чтения-изменения-записи общего файла,
+    поэтому каталог безопасно делить между процессами.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        for sub in ("messages", "jobs", "answers"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def _path(self, kind: str, name: str, suffix: str) -> str:
+        return os.path.join(self.root, kind, slugify(name) + suffix)
+
+    def _read_json(self, path: str, default):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return default
+
+    def _write_json(self, path: str, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load_messages(self, session_id: str) -> List[Dict[str, str]]:
+        messages = []
+        try:
+            with open(self._path("messages", session_id, ".jsonl"), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Недописанная строка (сбой во время записи) пропускается
+                        continue
+        except FileNotFoundError:
+            pass
+        return messages
+
+    def append_messages(self, session_id: str, messages: List[Dict[str, str]]):
+        if not messages:
+            return
+        data = "".join(
+            json.dumps({k: m.get(k) for k in MESSAGE_FIELDS}, ensure_ascii=False) + "\n" for m in messages
+        ).encode("utf-8")
+        fd = os.open(self._path("messages", session_id, ".jsonl"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def clear_session(self, session_id: str):
+        try:
+            os.remove(self._path("messages", session_id, ".jsonl"))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(self._path("jobs", session_id, ""), ignore_errors=True)
+
+    def set_job(self, session_id: str, job_id: str, status: Dict):
+        jobs_dir = self._path("jobs", session_id, "")
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._write_json(os.path.join(jobs_dir, slugify(job_id) + ".json"), {"job_id": job_id, "status": status})
+
+    def _load_jobs(self, session_id: str) -> Dict[str, Dict]:
+        jobs_dir = self._path("jobs", session_id, "")
+        try:
+            names = os.listdir(jobs_dir)
+        except FileNotFoundError:
+            return {}
+        entries = [self._read_json(os.path.join(jobs_dir, name), None) for name in names if name.endswith(".json")]
+        entries = [e for e in entries if e]
+        entries.sort(key=lambda e: e["status"].get("started_at", 0))
+        return {e["job_id"]: e["status"] for e in entries}
+
+    def get_answer(self, key: str, max_age: Optional[float] = ANSWER_TTL_SECONDS) -> Optional[str]:
+        entry = self._read_json(self._path("answers", key, ".json"), None)
+        if not entry or entry.get("stale"):
+            return None
+        if max_age is not None and time.time() - entry.get("created_at", 0) > max_age:
+            return None
+        return entry["answer"]
+
+    def set_answer(self, key: str, answer: str, project: Optional[str] = None):
+        self._write_json(self._path("answers", key, ".json"),
+                         {"answer": answer, "project": project, "stale": False, "created_at": time.time()})
+
+    def invalidate_answers(self, project: str) -> int:
+        count = 0
+        answers_dir = os.path.join(self.root, "answers")
+        for name in os.listdir(answers_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(answers_dir, name)
+            entry = self._read_json(path, None)
+            if entry and entry.get("project") == project and not entry.get("stale"):
+                entry["stale"] = True
+                self._write_json(path, entry)
+                count += 1
+        return count
+
+
+class SessionBuffer:
+    """Буфер записи одной сессии: сообщения копятся в памяти и пишутся пачкой."""
+
+    def __init__(self, store: SessionStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+        self.pending: List[Dict[str, str]] = []
+
+    def add(self, message: Dict[str, str]):
+        self.pending.append(message)
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        self.store.append_messages(self.session_id, batch)
+
+    def discard(self):
+        self.pending = []
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Возвращает хранилище сессий процесса по SESSION_STORE / SESSION_STORE_PATH.
+
+    Raises:
+        ValueError: Если SESSION_STORE содержит неизвестный бэкенд.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.getenv("SESSION_STORE", "sqlite").lower()
+            path = os.getenv("SESSION_STORE_PATH")
+            if backend == "sqlite":
+                _store = SqliteSessionStore(path or os.path.join(cache_dir("sessions"), "sessions.db"))
+            elif backend == "file":
+                _store = FileSessionStore(path or cache_dir("sessions", "files"))
+            else:
+                raise ValueError(f"Неизвестный SESSION_STORE: {backend}. Доступны: sqlite, file")
+        return _store
@@ -0,0 +1,164 @@
+"""Объединение одинаковых одновременных запросов (singleflight).
+
+Когда несколько сессий почти одновременно отправляют один и тот же запрос
+(например, быструю команду после деплоя), готового ответа ещё нет и каждая
+сессия запустила бы свой crew. Коалесцер держит реестр выполняющихся
+запросов по ключу: первый запрос запускает работу в фоновом потоке, а
+следующие с тем же ключом присоединяются к ней и получают тот же результат
+(или ту же ошибку) и её прогресс. Работа не зависит от сессии, которая её
+начала: если та ушла со страницы, остальные всё равно дождутся ответа.
+"""
+
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Сколько последних сообщений прогресса хранится у запроса
+PROGRESS_LIMIT = 50
+
+
+class Flight:
+    """Один выполняющийся запрос и все ожидающие его сессии."""
+
+    def __init__(self, key: str, tag: Optional[str] = None):
+        """
+        Args:
+            key: Ключ запроса.
+            tag: Метка для отсоединения (например, имя проекта).
+        """
+        self.key = key
+        self.tag = tag
+        self.started_at = time.time()
+        self.waiters = 1
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self._progress: List[str] = []
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def progress(self) -> List[str]:
+        """Копия сообщений прогресса (последние PROGRESS_LIMIT)."""
+        with self._lock:
+            return list(self._progress)
+
+    def report(self, message: str):
+        """Добавляет сообщение прогресса, видимое всем ожидающим."""
+        with self._lock:
+            self._progress.append(message)
+            del self._progress[:-PROGRESS_LIMIT]
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт завершения; True, если запрос завершён."""
+        return self._done.wait(timeout)
+
+    def outcome(self) -> Any:
+        """Результат завершённого запроса.
+
+        Raises:
+            Exception: Ошибка, с которой завершился запрос.
+        """
+        self.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _finish(self, result: Any, error: Optional[BaseException]):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+
+class SingleFlight:
+    """Реестр выполняющихся запросов процесса (потокобезопасно)."""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "joined": 0, "detached": 0}
+
+    def start(self, key: str, fn: Callable[[Flight], Any], tag: Optional[str] = None) -> Tuple[Flight, bool]:
+        """Присоединяется к запросу с тем же ключом или запускает fn в фоновом потоке.
+
+        Args:
+            key: Ключ запроса: одинаковый у запросов с одинаковым ответом.
+            fn: Работа; получает Flight для сообщений прогресса.
+            tag: Метка запроса для detach.
+
+        Returns:
+            (Flight, True) для нового запроса или (Flight, False) при присоединении.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.stats["joined"] += 1
+                return flight, False
+            flight = Flight(key, tag)
+            self._flights[key] = flight
+            self.stats["started"] += 1
+        # Контекст запустившего потока (бюджеты, контрольные точки) переходит в работу
+        context = contextvars.copy_context()
+        thread = threading.Thread(
+            target=context.run, args=(self._execute, flight, fn), name=f"flight-{key[:8]}", daemon=True
+        )
+        thread.start()
+        return flight, True
+
+    def run(self, key: str, fn: Callable[[Flight], Any], tag: Optional[str] = None) -> Any:
+        """start и ожидание результата в одном вызове."""
+        flight, _ = self.start(key, fn, tag)
+        return flight.outcome()
+
+    def _execute(self, flight: Flight, fn: Callable[[Flight], Any]):
+        result, error = None, None
+        try:
+            result = fn(flight)
+        except BaseException as e:
+            # Ошибка достаётся всем ожидающим, а не только потоку работы
+            error = e
+        # Из реестра до завершения: новые запросы после этого запускают работу заново
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight._finish(result, error)
+
+    def detach(self, tag: str) -> int:
+        """Закрывает для присоединения запросы с меткой; возвращает их число.
+
+        Запросы продолжают выполняться для уже ожидающих, а новые с тем же
+        ключом запускаются заново - например, после изменения файлов проекта.
+        """
+        with self._lock:
+            keys = [key for key, flight in self._flights.items() if flight.tag == tag]
+            for key in keys:
+                del self._flights[key]
+            self.stats["detached"] += len(keys)
+        return len(keys)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Выполняющиеся запросы для отображения."""
+        with self._lock:
+            flights = list(self._flights.values())
+        return [
+            {"key": f.key, "tag": f.tag, "waiters": f.waiters, "running_s": round(time.time() - f.started_at, 1)}
+            for f in flights
+        ]
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Общий на процесс реестр выполняющихся запросов."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
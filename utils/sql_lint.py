@@ -0,0 +1,431 @@
+"""Статический анализ производительности SQL файлов проекта.
+
+Детерминированные правила поверх текста запросов (без подключения к БД):
+SELECT *, несаргабельные предикаты, функции над индексированными колонками,
+колонки фильтров/JOIN без индекса (по объявленным CREATE INDEX и PRIMARY KEY),
+декартовы произведения и повторяющиеся подзапросы.
+
+Файлы читаются и анализируются параллельно, результаты кэшируются по хэшу
+файла и отпечатку каталога индексов проекта.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.cache import JsonStore, cache_dir, git_blob_hash, slugify
+from utils.file_utils import get_project_files
+from utils.sql_utils import split_sql_statements_with_lines
+
+SQL_LINT_PROMPT = "Проверь SQL проекта на проблемы производительности"
+SEVERITY_ORDER = {"error": 0, "warning": 1, "info": 2}
+SEVERITY_ICONS = {"error": "🔴", "warning": "🟠", "info": "🔵"}
+
+_IDENT = r"[A-Za-z_][\w$]*"
+_QUALIFIED = rf"{_IDENT}(?:\.{_IDENT})?"
+_KEYWORDS = {
+    "select", "from", "where", "and", "or", "not", "in", "is", "null", "on", "join", "left", "right",
+    "inner", "outer", "full", "cross", "natural", "using", "group", "order", "by", "having", "limit",
+    "offset", "union", "all", "as", "case", "when", "then", "else", "end", "between", "like", "ilike",
+    "exists", "distinct", "set", "values", "returning", "window", "true", "false", "with", "lateral",
+}
+_AGGREGATES = {"count", "sum", "avg", "min", "max", "coalesce", "exists", "any", "all", "in", "array_agg"}
+
+_CREATE_TABLE_RE = re.compile(
+    rf"^\s*CREATE\s+(?:(?:GLOBAL|LOCAL)\s+)?(?:TEMP(?:ORARY)?\s+|UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    rf"({_QUALIFIED})\s*\((.*)\)",
+    re.IGNORECASE | re.DOTALL,
+)
+_CREATE_INDEX_RE = re.compile(
+    rf"^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?({_QUALIFIED})?\s*"
+    rf"ON\s+(?:ONLY\s+)?({_QUALIFIED})\s*(?:USING\s+\w+\s*)?\((.*)\)",
+    re.IGNORECASE | re.DOTALL,
+)
+_QUERY_RE = re.compile(r"^\s*(?:SELECT|WITH|INSERT|UPDATE|DELETE|MERGE|CREATE\s+(?:OR\s+REPLACE\s+)?"
+                       r"(?:MATERIALIZED\s+)?VIEW)\b", re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_SELECT_STAR_RE = re.compile(rf"\bSELECT\s+(?:DISTINCT\s+)?(?:{_IDENT}\.)?\*", re.IGNORECASE)
+_LEADING_WILDCARD_RE = re.compile(r"\bI?LIKE\s+'%", re.IGNORECASE)
+_COMPARISON = r"(?:=|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bILIKE\b|\bBETWEEN\b)"
+_FUNCTION_PREDICATE_RE = re.compile(
+    rf"\b({_IDENT})\s*\(\s*({_QUALIFIED})\s*(?:,[^()]*)?\)\s*{_COMPARISON}", re.IGNORECASE
+)
+_ARITHMETIC_PREDICATE_RE = re.compile(
+    rf"(?<![\w.])({_QUALIFIED})\s*(?:[-+*/]\s*\d+(?:\.\d+)?|::\s*\w+)\s*{_COMPARISON}", re.IGNORECASE
+)
+_PREDICATE_COLUMN_RE = re.compile(rf"(?<![\w.])({_QUALIFIED})\s*{_COMPARISON}\s*({_QUALIFIED})?", re.IGNORECASE)
+_CLAUSE_RE = re.compile(r"\b(WHERE|ON|HAVING)\b", re.IGNORECASE)
+_CLAUSE_END_RE = re.compile(
+    r"\b(?:GROUP\s+BY|ORDER\s+BY|LIMIT|OFFSET|UNION|HAVING|WINDOW|RETURNING|WHERE|"
+    r"(?:(?:LEFT|RIGHT|FULL|INNER|CROSS|NATURAL)\s+)?(?:OUTER\s+)?JOIN)\b|[()]",
+    re.IGNORECASE,
+)
+_TABLE_REF_RE = re.compile(rf"\b(?:FROM|JOIN|UPDATE|INTO)\s+({_QUALIFIED})(?:\s+(?:AS\s+)?({_IDENT}))?", re.IGNORECASE)
+_COMMA_FROM_RE = re.compile(
+    rf"\bFROM\s+({_QUALIFIED}(?:\s+(?:AS\s+)?{_IDENT})?(?:\s*,\s*{_QUALIFIED}(?:\s+(?:AS\s+)?{_IDENT})?)+)",
+    re.IGNORECASE,
+)
+_CROSS_JOIN_RE = re.compile(r"\bCROSS\s+JOIN\b", re.IGNORECASE)
+_JOIN_EQUALITY_RE = re.compile(rf"\b({_IDENT})\.{_IDENT}\s*=\s*({_IDENT})\.{_IDENT}")
+
+
+@dataclass
+class LintFinding:
+    """Одно замечание статического анализа."""
+    rule: str
+    severity: str
+    file: str
+    line: int
+    message: str
+
+
+@dataclass
+class LintReport:
+    """Итог анализа SQL файлов проекта."""
+    findings: List[LintFinding] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    indexes: Dict[str, List[str]] = field(default_factory=dict)
+
+    def for_file(self, rel_path: str) -> List[LintFinding]:
+        return [f for f in self.findings if f.file == rel_path]
+
+
+def _normalize_name(name: str) -> str:
+    return name.lower().rsplit(".", 1)[-1]
+
+
+def _split_top_level(body: str) -> List[str]:
+    items, depth, current = [], 0, []
+    for ch in body:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    items.append("".join(current))
+    return [item.strip() for item in items if item.strip()]
+
+
+def _column_list(text: str) -> List[str]:
+    return [re.sub(r"\s+", "", c.strip().strip('"').lower()) for c in _split_top_level(text)]
+
+
+def build_index_catalog(sources: Dict[str, str]) -> Dict[str, List[List[str]]]:
+    """Собирает индексы проекта из CREATE INDEX, PRIMARY KEY и UNIQUE.
+
+    Args:
+        sources: Относительный путь -> содержимое .sql файла.
+
+    Returns:
+        Таблица (без схемы, в нижнем регистре) -> список индексов (списков колонок/выражений).
+        Таблицы, объявленные без индексов, присутствуют с пустым списком.
+    """
+    catalog: Dict[str, List[List[str]]] = {}
+    for _, content in sorted(sources.items()):
+        for _, statement in split_sql_statements_with_lines(content):
+            statement = statement.replace('"', "")
+            table = _CREATE_TABLE_RE.match(statement)
+            if table:
+                indexes = catalog.setdefault(_normalize_name(table.group(1)), [])
+                for item in _split_top_level(table.group(2)):
+                    keys = re.match(r"(?:CONSTRAINT\s+\w+\s+)?(?:PRIMARY\s+KEY|UNIQUE)\s*\((.*)\)", item,
+                                    re.IGNORECASE | re.DOTALL)
+                    if keys:
+                        indexes.append(_column_list(keys.group(1)))
+                    elif re.search(r"\b(?:PRIMARY\s+KEY|UNIQUE)\b", item, re.IGNORECASE):
+                        indexes.append([item.split()[0].lower()])
+                continue
+            index = _CREATE_INDEX_RE.match(statement)
+            if index:
+                catalog.setdefault(_normalize_name(index.group(2)), []).append(_column_list(index.group(3)))
+    return catalog
+
+
+def _index_names(sources: Dict[str, str]) -> Dict[Tuple[str, str], str]:
+    """(таблица, первая колонка) -> имя индекса из CREATE INDEX, для сообщений."""
+    names = {}
+    for content in sources.values():
+        for _, statement in split_sql_statements_with_lines(content):
+            index = _CREATE_INDEX_RE.match(statement.replace('"', ""))
+            if index and index.group(1):
+                first = _column_list(index.group(3))[0]
+                names[(_normalize_name(index.group(2)), first)] = index.group(1)
+    return names
+
+
+def _table_aliases(statement: str) -> Dict[str, str]:
+    aliases = {}
+    for match in _TABLE_REF_RE.finditer(statement):
+        table = _normalize_name(match.group(1))
+        aliases[table] = table
+        alias = match.group(2)
+        if alias and alias.lower() not in _KEYWORDS:
+            aliases[alias.lower()] = table
+    for match in _COMMA_FROM_RE.finditer(statement):
+        for item in match.group(1).split(","):
+            parts = [p for p in item.split() if p.lower() != "as"]
+            table = _normalize_name(parts[0])
+            aliases[table] = table
+            if len(parts) > 1 and parts[1].lower() not in _KEYWORDS:
+                aliases[parts[1].lower()] = table
+    return aliases
+
+
+def _resolve_column(ref: str, aliases: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """'alias.col' или 'col' -> (таблица, колонка); None, если таблицу определить нельзя."""
+    ref = ref.lower()
+    if "." in ref:
+        alias, column = ref.split(".", 1)
+        table = aliases.get(alias)
+        return (table, column) if table else None
+    tables = set(aliases.values())
+    if len(tables) == 1 and ref not in _KEYWORDS:
+        return next(iter(tables)), ref
+    return None
+
+
+def _predicate_regions(statement: str) -> List[Tuple[int, str]]:
+    regions = []
+    for match in _CLAUSE_RE.finditer(statement):
+        start = match.end()
+        depth = 0
+        end = len(statement)
+        # Условие заканчивается на следующем предложении или закрывающей скобке своего уровня
+        for token in _CLAUSE_END_RE.finditer(statement, start):
+            text = token.group(0)
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth < 0:
+                    end = token.start()
+                    break
+            elif depth == 0:
+                end = token.start()
+                break
+        regions.append((start, statement[start:end]))
+    return regions
+
+
+def _subqueries(statement: str) -> List[Tuple[int, str]]:
+    found = []
+    for match in re.finditer(r"\(\s*SELECT\b", statement, re.IGNORECASE):
+        depth = 0
+        for pos in range(match.start(), len(statement)):
+            if statement[pos] == "(":
+                depth += 1
+            elif statement[pos] == ")":
+                depth -= 1
+                if depth == 0:
+                    found.append((match.start(), statement[match.start():pos + 1]))
+                    break
+    return found
+
+
+def lint_statement(statement: str, catalog: Dict[str, List[List[str]]],
+                   index_names: Optional[Dict[Tuple[str, str], str]] = None) -> List[Tuple[int, str, str, str]]:
+    """Проверяет одно выражение.
+
+    Args:
+        statement: SQL выражение без комментариев.
+        catalog: Каталог индексов из build_index_catalog.
+        index_names: Имена индексов для сообщений.
+
+    Returns:
+        Список (смещение в выражении, правило, важность, сообщение).
+    """
+    if not _QUERY_RE.match(statement):
+        return []
+    index_names = index_names or {}
+    issues = []
+    for match in _LEADING_WILDCARD_RE.finditer(statement):
+        issues.append((match.start(), "non_sargable", "warning",
+                       "LIKE с ведущим '%' не использует B-tree индекс: полный скан таблицы"))
+    # Дальше литералы не нужны: заменяем их пробелами той же длины, чтобы не сдвигать позиции
+    masked = _LITERAL_RE.sub(lambda m: "'" + " " * (len(m.group(0)) - 2) + "'", statement).replace('"', " ")
+    aliases = _table_aliases(masked)
+
+    for match in _SELECT_STAR_RE.finditer(masked):
+        issues.append((match.start(), "select_star", "warning",
+                       "SELECT * читает все колонки: перечислите только нужные"))
+
+    leading: Dict[str, Set[str]] = {t: {idx[0] for idx in indexes if idx} for t, indexes in catalog.items()}
+    expressions: Dict[str, Set[str]] = {t: {c for idx in indexes for c in idx} for t, indexes in catalog.items()}
+    for offset, region in _predicate_regions(masked):
+        for match in _FUNCTION_PREDICATE_RE.finditer(region):
+            function = match.group(1).lower()
+            if function in _AGGREGATES or function in _KEYWORDS:
+                continue
+            resolved = _resolve_column(match.group(2), aliases)
+            if resolved and f"{function}({resolved[1]})" in expressions.get(resolved[0], set()):
+                continue  # есть индекс по выражению
+            if resolved and resolved[1] in leading.get(resolved[0], set()):
+                name = index_names.get(resolved, "индекс")
+                issues.append((offset + match.start(), "function_on_indexed_column", "error",
+                               f"{match.group(1)}({match.group(2)}) в условии отключает {name} на "
+                               f"{resolved[0]}.{resolved[1]}: перенесите функцию на константу "
+                               f"или создайте индекс по выражению"))
+            else:
+                issues.append((offset + match.start(), "non_sargable", "info",
+                               f"{match.group(1)}({match.group(2)}) в условии не даёт использовать индекс"))
+        for match in _ARITHMETIC_PREDICATE_RE.finditer(region):
+            if match.group(1).lower() in _KEYWORDS:
+                continue
+            issues.append((offset + match.start(), "non_sargable", "warning",
+                           f"Выражение над колонкой {match.group(1)} в условии не даёт использовать индекс: "
+                           f"перенесите вычисление в правую часть"))
+
+        reported: Set[Tuple[str, str]] = set()
+        for match in _PREDICATE_COLUMN_RE.finditer(region):
+            for ref in (match.group(1), match.group(2)):
+                if not ref or ref.lower() in _KEYWORDS or ref.replace(".", "").isdigit():
+                    continue
+                resolved = _resolve_column(ref, aliases)
+                if not resolved or resolved[0] not in catalog or resolved in reported:
+                    continue
+                if resolved[1] not in leading[resolved[0]]:
+                    reported.add(resolved)
+                    issues.append((offset + match.start(), "missing_index", "info",
+                                   f"Колонка {resolved[0]}.{resolved[1]} используется в фильтре/JOIN, "
+                                   f"но индекса с ней первой нет: CREATE INDEX ON {resolved[0]}({resolved[1]})"))
+
+    for match in _CROSS_JOIN_RE.finditer(masked):
+        issues.append((match.start(), "cartesian_join", "warning",
+                       "CROSS JOIN - декартово произведение: убедитесь, что оно действительно нужно"))
+    for match in _COMMA_FROM_RE.finditer(masked):
+        items = [[p for p in item.split() if p.lower() != "as"] for item in match.group(1).split(",")]
+        names = [(parts[1] if len(parts) > 1 else parts[0].rsplit(".", 1)[-1]).lower() for parts in items]
+        # Связность таблиц через равенства a.x = b.y в условиях
+        groups = {name: {name} for name in names}
+        for join in _JOIN_EQUALITY_RE.finditer(masked):
+            left, right = join.group(1).lower(), join.group(2).lower()
+            if left in groups and right in groups and groups[left] is not groups[right]:
+                merged = groups[left] | groups[right]
+                for name in merged:
+                    groups[name] = merged
+        if len({id(g) for g in groups.values()}) > 1:
+            issues.append((match.start(), "cartesian_join", "error",
+                           f"Таблицы {', '.join(names)} в FROM через запятую не связаны условием: "
+                           f"декартово произведение"))
+
+    counts: Dict[str, List[int]] = {}
+    for start, subquery in _subqueries(masked):
+        counts.setdefault(" ".join(subquery.lower().split()), []).append(start)
+    for text, starts in counts.items():
+        if len(starts) > 1:
+            issues.append((starts[1], "repeated_subquery", "warning",
+                           f"Подзапрос повторяется {len(starts)} раза: вынесите его в CTE (WITH) "
+                           f"- {text[:60]}{'…' if len(text) > 60 else ''}"))
+    return issues
+
+
+def lint_sql(rel_path: str, content: str, catalog: Dict[str, List[List[str]]],
+             index_names: Optional[Dict[Tuple[str, str], str]] = None) -> List[LintFinding]:
+    """Проверяет содержимое одного .sql файла.
+
+    Args:
+        rel_path: Путь файла относительно проекта (для отчёта).
+        content: Содержимое файла.
+        catalog: Каталог индексов проекта.
+        index_names: Имена индексов для сообщений.
+
+    Returns:
+        Замечания, отсортированные по строке.
+    """
+    findings = []
+    for line, statement in split_sql_statements_with_lines(content):
+        for offset, rule, severity, message in lint_statement(statement, catalog, index_names):
+            findings.append(LintFinding(rule, severity, rel_path, line + statement.count("\n", 0, offset), message))
+    return sorted(findings, key=lambda f: (f.line, SEVERITY_ORDER[f.severity]))
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _without_file(finding: LintFinding) -> Dict:
+    item = asdict(finding)
+    del item["file"]
+    return item
+
+
+def lint_project(project_path: str, workers: int = 4, use_cache: bool = True) -> LintReport:
+    """Проверяет все .sql файлы проекта параллельно, с кэшем по хэшу файла.
+
+    Args:
+        project_path: Путь к проекту.
+        workers: Сколько файлов читать и анализировать одновременно.
+        use_cache: Использовать ли кэш результатов.
+
+    Returns:
+        LintReport.
+    """
+    paths = sorted(get_project_files(project_path, [".sql"]))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        contents = dict(zip(paths, pool.map(_read, paths)))
+    sources = {os.path.relpath(p, project_path): c for p, c in contents.items() if c is not None}
+
+    # Индексы объявляются в одних файлах, а используются в других: каталог общий для проекта
+    catalog = build_index_catalog(sources)
+    index_names = _index_names(sources)
+    catalog_key = hashlib.sha1(json.dumps(catalog, sort_keys=True).encode("utf-8")).hexdigest()
+
+    real_path = os.path.realpath(project_path)
+    digest = hashlib.sha1(real_path.encode("utf-8")).hexdigest()[:12]
+    store = JsonStore(os.path.join(cache_dir("sql_lint"), f"{slugify(os.path.basename(real_path))}-{digest}.json"))
+    cached: Dict[str, List[Dict]] = store.get("files", {}) if use_cache else {}
+    keys = {
+        rel_path: hashlib.sha1(f"{git_blob_hash(content.encode('utf-8'))}:{catalog_key}".encode("ascii")).hexdigest()
+        for rel_path, content in sources.items()
+    }
+    todo = [rel_path for rel_path in sources if keys[rel_path] not in cached]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        fresh = dict(zip(todo, pool.map(lambda r: lint_sql(r, sources[r], catalog, index_names), todo)))
+
+    # Одинаковые файлы в разных каталогах делят ключ: путь в кэш не пишется и подставляется при чтении
+    results = {keys[r]: [_without_file(f) for f in findings] for r, findings in fresh.items()}
+    results.update({keys[r]: cached[keys[r]] for r in sources if r not in fresh})
+    store.set("files", results)
+    store.set("updated_at", time.time())
+    store.save()
+
+    findings = [LintFinding(**{**item, "file": r}) for r in sorted(sources) for item in results[keys[r]]]
+    return LintReport(
+        findings=findings,
+        files=sorted(sources),
+        cached=sorted(r for r in sources if r not in fresh),
+        indexes={table: [", ".join(cols) for cols in indexes] for table, indexes in catalog.items()},
+    )
+
+
+def format_lint_report(report: LintReport, title: str) -> str:
+    """Собирает markdown отчёт по замечаниям, сгруппированным по файлам."""
+    counts = {s: sum(1 for f in report.findings if f.severity == s) for s in SEVERITY_ORDER}
+    lines = [
+        f"## ⚡ SQL анализ: {title}",
+        f"Файлов: {len(report.files)} (из кэша: {len(report.cached)}), замечаний: {len(report.findings)} "
+        f"(🔴 {counts['error']}, 🟠 {counts['warning']}, 🔵 {counts['info']})",
+    ]
+    for rel_path in report.files:
+        findings = sorted(report.for_file(rel_path), key=lambda f: (SEVERITY_ORDER[f.severity], f.line))
+        if not findings:
+            continue
+        lines.append(f"\n#### `{rel_path}`")
+        lines.extend(f"- {SEVERITY_ICONS[f.severity]} строка {f.line} [{f.rule}]: {f.message}" for f in findings)
+    if not report.findings:
+        lines.append("\nПроблем производительности не найдено.")
+    return "\n".join(lines)
@@ -0,0 +1,259 @@
+"""Встроенная SQLite песочница для проверки планов SQL запросов проекта.
+
+Песочница в памяти загружает DDL проекта (CREATE TABLE/INDEX/VIEW из .sql
+файлов) и, при наличии, выборку данных из CSV. Запросы выполняются только
+на чтение: EXPLAIN QUERY PLAN возвращает план, использованные индексы и
+полные сканирования, а режим analyze выполняет запрос на выборке с лимитом
+времени.
+
+DDL в диалекте PostgreSQL приводится к SQLite упрощённо (SERIAL, касты,
+схемы); выражения, которые не удалось загрузить, возвращаются в skipped.
+"""
+
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.file_utils import get_project_files
+from utils.sql_utils import split_sql_statements
+
+DEFAULT_SAMPLE_ROWS = 10_000
+QUERY_TIMEOUT_MS = 2_000
+MAX_RESULT_ROWS = 20
+
+_DDL_RE = re.compile(r"^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:UNIQUE\s+)?(TABLE|INDEX|VIEW)\b", re.IGNORECASE)
+_READ_ONLY_RE = re.compile(r"^\s*(?:SELECT|WITH|VALUES)\b", re.IGNORECASE)
+_UNKNOWN_SCHEMA_RE = re.compile(r"unknown database (\w+)")
+_INDEX_USE_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)|USING (INTEGER PRIMARY KEY)")
+_SCAN_RE = re.compile(r"^SCAN (\w+)")
+
+# Упрощённый перевод типов и конструкций PostgreSQL в понятные SQLite
+_PG_REWRITES = [
+    (re.compile(r"\b(?:BIG|SMALL)?SERIAL\b", re.IGNORECASE), "INTEGER"),
+    (re.compile(r"::\s*\w+(?:\s*\(\s*\d+(?:\s*,\s*\d+)?\s*\))?"), ""),
+    (re.compile(r"\bWITH(?:OUT)?\s+TIME\s+ZONE\b", re.IGNORECASE), ""),
+    (re.compile(r"\bGENERATED\s+(?:ALWAYS|BY\s+DEFAULT)\s+AS\s+IDENTITY\b", re.IGNORECASE), ""),
+    (re.compile(r"\bUSING\s+(?:btree|hash|gin|gist|brin)\b", re.IGNORECASE), ""),
+    (re.compile(r"\bCONCURRENTLY\b", re.IGNORECASE), ""),
+    (re.compile(r"\bOR\s+REPLACE\b", re.IGNORECASE), ""),
+    (re.compile(r"\bDEFAULT\s+(?:now\(\)|CURRENT_TIMESTAMP\(\))", re.IGNORECASE), "DEFAULT CURRENT_TIMESTAMP"),
+    # В SQLite схема указывается у имени индекса, а не у таблицы
+    (re.compile(r"\b(INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?)(\w+)\s+ON\s+(\w+)\.(\w+)", re.IGNORECASE), r"\1\3.\2 ON \4"),
+]
+
+
+def adapt_to_sqlite(statement: str) -> str:
+    """Приводит выражение из диалекта PostgreSQL к SQLite (best effort)."""
+    for pattern, replacement in _PG_REWRITES:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
+
+class SqlSandbox:
+    """SQLite в памяти со схемой проекта; потокобезопасна, только чтение после загрузки."""
+
+    def __init__(self, ddl: List[Tuple[str, str]], data: Optional[Dict[str, str]] = None,
+                 sample_rows: int = DEFAULT_SAMPLE_ROWS):
+        """
+        Args:
+            ddl: Пары (источник, выражение CREATE ...).
+            data: Таблица -> путь к CSV с выборкой данных (первая строка - заголовок).
+            sample_rows: Максимум строк, загружаемых в каждую таблицу.
+        """
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self.loaded: List[str] = []
+        self.skipped: List[Dict[str, str]] = []
+        self.tables: Dict[str, int] = {}
+
+        # Сначала таблицы, затем индексы и представления
+        order = {"TABLE": 0, "INDEX": 1, "VIEW": 2}
+        for source, statement in sorted(ddl, key=lambda item: order[_DDL_RE.match(item[1]).group(1).upper()]):
+            self._load(source, statement)
+        for table, path in (data or {}).items():
+            self._load_csv(table, path, sample_rows)
+        # Статистика для планировщика по загруженной выборке
+        self._conn.execute("ANALYZE")
+        for _, schema, _ in self._conn.execute("PRAGMA database_list").fetchall():
+            query = f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            for (name,) in self._conn.execute(query).fetchall():
+                qualified = name if schema == "main" else f"{schema}.{name}"
+                self.tables[qualified] = self._conn.execute(f'SELECT COUNT(*) FROM {schema}."{name}"').fetchone()[0]
+        self._conn.execute("PRAGMA query_only = ON")
+
+    def _load(self, source: str, statement: str):
+        sql = adapt_to_sqlite(statement)
+        for _ in range(3):
+            try:
+                self._conn.execute(sql)
+                self.loaded.append(f"{source}: {' '.join(statement.split())[:80]}")
+                return
+            except sqlite3.OperationalError as e:
+                # schema.table: схема становится подключённой базой в памяти
+                missing = _UNKNOWN_SCHEMA_RE.search(str(e))
+                if not missing:
+                    self.skipped.append({"source": source, "statement": statement[:200], "error": str(e)})
+                    return
+                self._conn.execute(f"ATTACH DATABASE ':memory:' AS {missing.group(1)}")
+            except sqlite3.Error as e:
+                self.skipped.append({"source": source, "statement": statement[:200], "error": str(e)})
+                return
+
+    def _load_csv(self, table: str, path: str, sample_rows: int):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if not header:
+                    return
+                placeholders = ", ".join("?" for _ in header)
+                columns = ", ".join(f'"{c}"' for c in header)
+                rows = (row for row, _ in zip(reader, range(sample_rows)) if len(row) == len(header))
+                self._conn.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+        except (OSError, sqlite3.Error) as e:
+            self.skipped.append({"source": path, "statement": f"данные {table}", "error": str(e)})
+
+    def explain(self, query: str, analyze: bool = False, timeout_ms: int = QUERY_TIMEOUT_MS) -> Dict:
+        """Возвращает план запроса и (в режиме analyze) результат выполнения на выборке.
+
+        Args:
+            query: SELECT/WITH запрос.
+            analyze: Выполнить запрос и замерить время.
+            timeout_ms: Лимит времени выполнения в режиме analyze.
+
+        Returns:
+            {"plan", "indexes_used", "full_scans", "temp_btree", "estimated_cost", ...}.
+
+        Raises:
+            ValueError: Если запрос не только на чтение или не разбирается SQLite.
+        """
+        statements = split_sql_statements(query)
+        if len(statements) != 1 or not _READ_ONLY_RE.match(statements[0]):
+            raise ValueError("Поддерживается ровно один запрос SELECT/WITH")
+        sql = adapt_to_sqlite(statements[0])
+        with self._lock:
+            try:
+                rows = self._conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            except sqlite3.Error as e:
+                raise ValueError(f"SQLite не смог разобрать запрос: {e}")
+            result = self._describe_plan(rows)
+            if analyze:
+                result["analyze"] = self._run(sql, timeout_ms)
+        return result
+
+    def _describe_plan(self, rows: List[Tuple]) -> Dict:
+        depth: Dict[int, int] = {0: -1}
+        lines = []
+        indexes, scans = [], []
+        temp_btree = False
+        cost = 0
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+            index = _INDEX_USE_RE.search(detail)
+            if index:
+                indexes.append(index.group(1) or index.group(2))
+            scan = _SCAN_RE.match(detail)
+            if scan and not index:
+                scans.append(scan.group(1))
+                # Грубая оценка стоимости: полное сканирование = число строк таблицы
+                cost += max(self.tables.get(scan.group(1), 0), 1)
+            elif index:
+                cost += 1
+            if "TEMP B-TREE" in detail:
+                temp_btree = True
+        return {
+            "plan": "\n".join(lines),
+            "indexes_used": sorted(set(indexes)),
+            "full_scans": sorted(set(scans)),
+            "temp_btree": temp_btree,
+            "estimated_cost": cost,
+        }
+
+    def _run(self, sql: str, timeout_ms: int) -> Dict:
+        deadline = time.perf_counter() + timeout_ms / 1000
+        # Прерываем запрос, если он не укладывается в лимит времени
+        self._conn.set_progress_handler(lambda: 1 if time.perf_counter() > deadline else 0, 10_000)
+        started = time.perf_counter()
+        try:
+            cursor = self._conn.execute(sql)
+            columns = [d[0] for d in cursor.description or []]
+            sample = cursor.fetchmany(MAX_RESULT_ROWS)
+            total = len(sample) + sum(1 for _ in cursor)
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                return {"error": f"Превышен лимит {timeout_ms} мс"}
+            return {"error": str(e)}
+        finally:
+            self._conn.set_progress_handler(None, 0)
+        return {
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "rows": total,
+            "columns": columns,
+            "sample": [list(map(str, row)) for row in sample],
+        }
+
+    def summary(self) -> Dict:
+        """Что загружено в песочницу: таблицы с числом строк, индексы, пропущенные выражения."""
+        with self._lock:
+            indexes = [
+                name for (name,) in self._conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+                )
+            ]
+        return {"tables": dict(self.tables), "indexes": indexes, "skipped": self.skipped}
+
+
+def collect_project_ddl(project_path: str) -> List[Tuple[str, str]]:
+    """Собирает выражения CREATE TABLE/INDEX/VIEW из всех .sql файлов проекта.
+
+    Args:
+        project_path: Путь к проекту.
+
+    Returns:
+        Пары (относительный путь файла, выражение) в порядке файлов.
+    """
+    ddl = []
+    for path in sorted(get_project_files(project_path, [".sql"])):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                statements = split_sql_statements(f.read())
+        except OSError:
+            continue
+        rel_path = os.path.relpath(path, project_path)
+        ddl.extend((rel_path, s) for s in statements if _DDL_RE.match(s))
+    return ddl
+
+
+_sandboxes: Dict[str, Tuple[Tuple, SqlSandbox]] = {}
+_sandboxes_lock = threading.Lock()
+
+
+def get_project_sandbox(project_path: str, data: Optional[Dict[str, str]] = None,
+                        sample_rows: int = DEFAULT_SAMPLE_ROWS) -> SqlSandbox:
+    """Возвращает песочницу проекта, пересобирая её при изменении .sql файлов или данных.
+
+    Args:
+        project_path: Путь к проекту.
+        data: Таблица -> CSV с выборкой (пути относительно проекта).
+        sample_rows: Максимум строк на таблицу.
+
+    Returns:
+        SqlSandbox.
+    """
+    data_paths = {table: os.path.join(project_path, path) for table, path in (data or {}).items()}
+    files = sorted(get_project_files(project_path, [".sql"])) + sorted(data_paths.values())
+    signature = tuple((path, os.path.getmtime(path)) for path in files if os.path.exists(path)) + (sample_rows,)
+    key = os.path.realpath(project_path)
+    with _sandboxes_lock:
+        cached = _sandboxes.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+    sandbox = SqlSandbox(collect_project_ddl(project_path), data_paths, sample_rows)
+    with _sandboxes_lock:
+        _sandboxes[key] = (signature, sandbox)
+    return sandbox
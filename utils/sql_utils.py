@@ -0,0 +1,76 @@
+import re
+from typing import List, Tuple
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+# Литералы и комментарии в одной альтернативе: что встретилось раньше, то и разбирается
+_TOKEN_RE = re.compile(
+    rf"(?P<literal>{_STRING_RE.pattern})|(?P<comment>--[^\n]*|/\*.*?\*/|^[ \t]*#[^\n]*)",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+def strip_sql_comments(sql: str) -> str:
+    """Удаляет комментарии (`--`, `/* */`, строки с `#`), не трогая строковые литералы.
+
+    Args:
+        sql: Текст SQL.
+
+    Returns:
+        SQL без комментариев; переводы строк сохраняются, чтобы номера строк не сдвигались.
+    """
+    def replace(match: re.Match) -> str:
+        if match.group("literal"):
+            return match.group(0)
+        return re.sub(r"[^\n]", " ", match.group(0))
+
+    return _TOKEN_RE.sub(replace, sql)
+
+
+def split_sql_statements_with_lines(sql: str) -> List[Tuple[int, str]]:
+    """Делит SQL скрипт на выражения по `;` вне строковых литералов, с номерами строк.
+
+    Args:
+        sql: Текст SQL скрипта.
+
+    Returns:
+        Пары (номер строки начала выражения с 1, выражение без завершающей `;`).
+    """
+    statements = []
+    current = []
+    offset = 0
+    start = 0
+    # Нечётные элементы - строковые литералы, `;` в них не делит выражение
+    for i, piece in enumerate(re.split(f"({_STRING_RE.pattern})", strip_sql_comments(sql))):
+        if i % 2:
+            current.append(piece)
+            offset += len(piece)
+            continue
+        parts = piece.split(";")
+        for part in parts[:-1]:
+            statements.append((start, "".join(current) + part))
+            offset += len(part) + 1
+            start = offset
+            current = []
+        current.append(parts[-1])
+        offset += len(parts[-1])
+    statements.append((start, "".join(current)))
+
+    result = []
+    for start, statement in statements:
+        stripped = statement.strip()
+        if stripped:
+            leading = len(statement) - len(statement.lstrip())
+            result.append((sql.count("\n", 0, start + leading) + 1, stripped))
+    return result
+
+
+def split_sql_statements(sql: str) -> List[str]:
+    """Делит SQL скрипт на отдельные выражения по `;` вне строковых литералов.
+
+    Args:
+        sql: Текст SQL скрипта.
+
+    Returns:
+        Непустые выражения без завершающей `;`.
+    """
+    return [statement for _, statement in split_sql_statements_with_lines(sql)]
@@ -0,0 +1,183 @@
+import json
+import re
+from typing import Any, Dict, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+M = TypeVar("M", bound=BaseModel)
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n(.*?)```", re.DOTALL)
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# Типографские кавычки, которыми модель может открыть и закрыть строку JSON
+_SMART_OPEN = "“„«"
+_SMART_CLOSE = "”“»"
+
+
+def schema_for(model: Type[BaseModel]) -> Dict[str, Any]:
+    """Возвращает JSON Schema pydantic модели для constrained decoding."""
+    return model.model_json_schema()
+
+
+def schema_prompt(model: Type[BaseModel]) -> str:
+    """Компактная JSON Schema для вставки в описание задачи."""
+    return json.dumps(schema_for(model), ensure_ascii=False, separators=(",", ":"))
+
+
+def guided_decoding_params(provider: str, model: Type[BaseModel]) -> Dict[str, Any]:
+    """Параметры LLM для ограниченного декодирования по схеме модели.
+
+    - vllm: `guided_json` в extra_body (OpenAI-совместимый сервер vLLM);
+    - ollama: `response_format` json_schema - OpenAI-совместимый endpoint
+      Ollama (/v1) транслирует его в нативный `format`;
+    - остальные провайдеры не поддерживают схему, остаётся локальный ремонт JSON.
+
+    Args:
+        provider: Провайдер LLM.
+        model: Pydantic модель ответа.
+
+    Returns:
+        Дополнительные kwargs для LLM.
+    """
+    schema = schema_for(model)
+    if provider == "vllm":
+        return {"extra_body": {"guided_json": schema}}
+    if provider == "ollama":
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": model.__name__, "schema": schema},
+            }
+        }
+    return {}
+
+
+def _extract_json_block(text: str) -> Optional[str]:
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+    # Обрезанный ответ: закрывающих скобок нет, допишем их в _close_brackets
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def _close_brackets(text: str) -> str:
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def _fix_outside_strings(text: str) -> str:
+    """Чинит типографские кавычки, висячие запятые и Python-литералы вне строк.
+
+    Содержимое строковых значений не меняется: «ёлочки» в русском тексте или
+    "None of" внутри значения остаются как есть.
+    """
+    out = []
+    closing = None  # Символы, закрывающие текущую строку (None - вне строки)
+    escaped = False
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if closing is not None:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch in closing:
+                closing = None
+                ch = '"'
+            elif ch == '"':
+                # Прямая кавычка внутри строки в типографских кавычках
+                ch = '\\"'
+            out.append(ch)
+            i += 1
+            continue
+        if ch == '"':
+            closing = '"'
+        elif ch in _SMART_OPEN:
+            closing = _SMART_CLOSE
+            ch = '"'
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] in "}]":
+                i = j
+                continue
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def repair_json(text: str) -> Optional[str]:
+    """Быстрый локальный ремонт JSON из ответа модели без обращения к LLM.
+
+    Исправляет: обёртку в ```json```, текст вокруг объекта, типографские
+    кавычки, висячие запятые, Python-литералы и незакрытые скобки.
+
+    Args:
+        text: Сырой ответ модели.
+
+    Returns:
+        Валидная JSON строка или None, если починить не удалось.
+    """
+    candidate = _extract_json_block(text)
+    if candidate is None:
+        return None
+    attempts = [candidate]
+    attempts.append(_close_brackets(_fix_outside_strings(candidate)))
+    for attempt in attempts:
+        try:
+            return json.dumps(json.loads(attempt, strict=False), ensure_ascii=False)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_structured(text: str, model: Type[M]) -> Optional[M]:
+    """Разбирает ответ модели в pydantic модель с локальным ремонтом JSON.
+
+    Args:
+        text: Сырой ответ модели.
+        model: Pydantic модель.
+
+    Returns:
+        Экземпляр модели или None, если JSON не чинится или не проходит валидацию.
+    """
+    repaired = repair_json(text)
+    if repaired is None:
+        return None
+    try:
+        return model.model_validate_json(repaired)
+    except ValidationError:
+        return None